@@ -0,0 +1,183 @@
+"""Move animations, drawn over a board that already shows the move.
+
+A track starts every piece it touches where it was before the move and carries it to the square the board now has it on,
+so the board never waits on a frame and any number of tracks can run at once, like both halves of an engine's double move.
+Pieces are found by square through the board's position index, and everything advances by elapsed time rather than by frame.
+"""
+from collections import deque
+from math import sqrt
+from zigtypes import MOVE_KINDS
+
+SEGMENT_SECONDS = 1.0 #A single straight move, each segment of a longer path plays faster
+MAX_STEP = 0.1 #Longest step one frame can advance, so a stall does not skip an animation
+STEPS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+def Smooth(x: float):
+    if x > .5: return 1-Smooth(1-x)
+    return 2*x*x
+
+def Pointed(x: float):
+    if x > .5: return Pointed(1-x)
+    return 4*x*x
+
+def SmoothInto(x: float):
+    return 1-(1-x)*(1-x)
+
+def Lerp(a: tuple, b: tuple, t: float) -> tuple:
+    return tuple(a_*(1-t) + b_*t for a_, b_ in zip(a, b))
+
+def FindPath(occupied, orig: tuple[int, int], dest: tuple[int, int]) -> list[tuple[int, int]]:
+    """Turning points of a shortest path from `orig` to `dest` over squares not in `occupied`, keeping straight where it can.
+    A straight line when `dest` cannot be reached."""
+    if orig == dest: return [orig]
+    heading = {orig: None} #Step into each reached square, doubles as the visited set
+    frontier = deque([orig])
+    while frontier:
+        pos = frontier.popleft()
+        if pos == dest: break
+        prev = heading[pos]
+        for step in ([prev] if prev else []) + [step for step in STEPS if step != prev]:
+            npos = (pos[0]+step[0], pos[1]+step[1])
+            if npos in heading or not (0 <= npos[0] < 9 and 0 <= npos[1] < 9): continue
+            if npos in occupied and npos != dest: continue
+            heading[npos] = step
+            frontier.append(npos)
+    else:
+        return [orig, dest]
+
+    path = [dest]
+    while path[-1] != orig:
+        step = heading[path[-1]]
+        path.append((path[-1][0]-step[0], path[-1][1]-step[1]))
+    path.reverse()
+    return [pos for i, pos in enumerate(path) if i in (0, len(path)-1) or heading[pos] != heading[path[i+1]]]
+
+class Track:
+    """One move's animation, segments played back to back. Pieces are keyed by the square the board shows them on."""
+    def __init__(self, speed: float = 1.):
+        self.speed = speed
+        self.segments = deque() #(seconds, parts)
+        self.at = {} #Square -> where that piece is drawn for now
+        self.ghosts = [] #[sprite name, pos, alpha] drawn by the track, made into sprites of its own by `Animator.Play`
+        self.hiddenDeco = set() #Deco positions not drawn until the track ends
+        self.hiddenCrowns = set() #Squares whose crown is not drawn until the track ends
+        self.elapsed = 0.
+        self.fresh = True
+
+    def Ghost(self, name: str, pos: tuple, alpha: int) -> int:
+        self.ghosts.append([name, pos, alpha])
+        return len(self.ghosts) - 1
+
+    def Add(self, seconds: float, *parts):
+        """Parts are ('slide' | 'bump', square, a, b), a piece moving from a to b, or toward b and back,
+        and ('fade', ghost, alpha0, alpha1, start), the ghost fading over the part of the segment after `start`"""
+        self.segments.append((seconds, parts))
+
+    @property
+    def done(self) -> bool:
+        return not self.segments
+
+    def Advance(self, seconds: float):
+        if self.fresh: seconds, self.fresh = 0., False #The first frame after a start is drawn at its start
+        self.elapsed += seconds * self.speed
+        while self.segments and self.elapsed >= self.segments[0][0]:
+            length, parts = self.segments.popleft()
+            self.elapsed -= length
+            self._Apply(parts, 1.)
+        if self.segments:
+            length, parts = self.segments[0]
+            self._Apply(parts, self.elapsed / length)
+
+    def _Apply(self, parts, t: float):
+        for kind, key, a, b, *rest in parts:
+            if kind == 'slide': self.at[key] = Lerp(a, b, Smooth(t))
+            elif kind == 'bump': self.at[key] = Lerp(a, b, .25 * Pointed(t))
+            elif kind == 'fade':
+                start ,= rest
+                ghost = self.ghosts[key]
+                ghost[2] = 0 if t < start else int(a + (b - a) * SmoothInto((t - start) / (1 - start)))
+                ghost[0].set_alpha(ghost[2])
+            else: assert False
+
+def PlanMove(pieceAt: dict, fields: dict, speed: float = 1.) -> Track:
+    """Track for the engine2 single move `fields`, from the board's render entries by square as they were before it"""
+    kind = MOVE_KINDS[fields['kind']]
+    orig = tuple(divmod(fields['orig'], 11)[::-1])
+    dest = tuple(divmod(fields['dest'], 11)[::-1])
+    track = Track(speed)
+    if fields['doRet']:
+        track.Add(SEGMENT_SECONDS, ('fade', track.Ghost('crown', orig, 255), 255, 0, 0.))
+    if kind == 'train':
+        track.hiddenCrowns.add(orig)
+        track.Add(SEGMENT_SECONDS, ('fade', track.Ghost('crown', orig, 50), 50, 255, 0.))
+        return track
+    if kind == 'sacrifice': #The piece gives itself up where it stands
+        track.Add(SEGMENT_SECONDS, ('fade', track.Ghost(pieceAt[orig][0], orig, 255), 255, 0, 0.))
+        return track
+
+    path = FindPath(pieceAt, orig, dest)
+    seconds = SEGMENT_SECONDS / sqrt(len(path))
+    track.at[dest] = orig
+    segments = [[('slide', dest, a, b)] for a, b in zip(path, path[1:])]
+    if kind == 'swap': #The other piece slides back over the last segment
+        track.at[orig] = dest
+        segments[-1].append(('slide', orig, dest, orig))
+    elif kind == 'capture':
+        segments[-1].append(('fade', track.Ghost(pieceAt[dest][0], dest, 255), 255, 0, .5))
+    for parts in segments: track.Add(seconds, *parts)
+
+    if kind in ('attack', 'kingweaken'): #Locks the edge toward `atkdir`
+        step = STEPS[fields['atkdir']]
+        edge = (dest[0] + step[0]/2, dest[1] + step[1]/2)
+        target = (dest[0] + step[0], dest[1] + step[1])
+        track.hiddenDeco.add(edge)
+        parts = [('bump', dest, dest, target), ('fade', track.Ghost('hl' if step[0] == 0 else 'vl', edge, 0), 50, 255, .5)]
+        if kind == 'kingweaken':
+            parts.append(('fade', track.Ghost('crown', target, 255), 255, 0, .5))
+        track.Add(SEGMENT_SECONDS / 2, *parts)
+    return track
+
+class Animator:
+    """Plays tracks concurrently and merges them into what a frame should draw differently from the board"""
+    def __init__(self, sprites: dict):
+        self.sprites = sprites #By name, what the ghosts are copied from
+        self.tracks = []
+        self.positions = {} #Square -> drawn position of the piece the board has there
+        self.hiddenDeco = set()
+        self.hiddenCrowns = set()
+        self.effects = [] #(sprite, pos) of every ghost, redrawn every frame since their alpha changes
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.tracks)
+
+    def Play(self, *tracks: Track):
+        for track in tracks:
+            for ghost in track.ghosts:
+                ghost[0] = self.sprites[ghost[0]].copy()
+                ghost[0].set_alpha(ghost[2])
+            if track.segments: track._Apply(track.segments[0][1], 0.)
+            self.tracks.append(track)
+        self._Merge()
+
+    def Finish(self):
+        """Drops every track, the board is already in its final state"""
+        self.tracks.clear()
+        self._Merge()
+
+    def Update(self, seconds: float):
+        step = min(seconds, MAX_STEP)
+        for track in self.tracks: track.Advance(step)
+        self.tracks = [track for track in self.tracks if not track.done]
+        self._Merge()
+
+    def _Merge(self):
+        self.positions = {}
+        self.hiddenDeco = set()
+        self.hiddenCrowns = set()
+        self.effects = []
+        for track in self.tracks:
+            self.positions.update(track.at)
+            self.hiddenDeco |= track.hiddenDeco
+            self.hiddenCrowns |= track.hiddenCrowns
+            self.effects += [(sprite, pos) for sprite, pos, alpha in track.ghosts if alpha]
@@ -0,0 +1,132 @@
+"""Append-only store of engine2 games, read through `mmap` so any game or ply is a seek away however many there are.
+
+`<path>` holds each game as its start position then its packed full moves, `<path>.idx` one fixed size entry per game
+pointing at its first move. A game is only visible once its index entry is written, so a crash mid append leaves
+unindexed bytes at the end of the data file and nothing worse.
+"""
+import mmap
+import os
+import struct
+from zigwrap import ZigBoardApplyFullMove, ZigBoardToPlay, ZigGenInitStr2, ZigInitBoardFromStr2, PyPtr
+
+DATA_HEADER = struct.Struct('<4sH10x')
+INDEX_HEADER = struct.Struct('<4sH10x')
+DATA_MAGIC = b'RGGA'
+INDEX_MAGIC = b'RGGI'
+VERSION = 1
+
+START_SIZE = 168 #`PyInitBoardFromStr` string, 162 cells and the side to play, zero padded to keep the moves 8 byte aligned
+MOVE = struct.Struct('<Q')
+ENTRY = struct.Struct('<QIbB2x') #Byte offset of the first move, turns, result, reason
+REASONS = ('unfinished', 'king', 'nomoves', 'turns')
+RESULTS = {'1-0': 1, '0-1': -1, '1/2-1/2': 0} #Tournament record results as results for white
+
+def StartOf(handle: PyPtr) -> bytes:
+    """The board behind `handle` as an archive start position"""
+    return (ZigGenInitStr2(handle) + 'wb'[ZigBoardToPlay(handle)]).encode()
+
+class _Mapped:
+    """Read only map of a file that only grows, remapped when it has"""
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.map = None
+        self.size = 0
+
+    def View(self) -> mmap.mmap | bytes:
+        size = os.fstat(self.file.fileno()).st_size
+        if size != self.size:
+            if self.map: self.map.close()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+            self.size = size
+        return self.map if self.map is not None else b''
+
+    def Close(self):
+        if self.map: self.map.close()
+        self.file.close()
+
+class GameArchive:
+    """Games by index, each a start position, its full moves, the result for white (1, 0, -1) and why it ended"""
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        self.indexPath = path + '.idx'
+        if writable:
+            for name, header in ((path, DATA_HEADER.pack(DATA_MAGIC, VERSION)), (self.indexPath, INDEX_HEADER.pack(INDEX_MAGIC, VERSION))):
+                if not os.path.exists(name) or os.path.getsize(name) == 0:
+                    with open(name, 'wb') as file: file.write(header)
+        self._data = _Mapped(path)
+        self._index = _Mapped(self.indexPath)
+        for mapped, header, magic in ((self._data, DATA_HEADER, DATA_MAGIC), (self._index, INDEX_HEADER, INDEX_MAGIC)):
+            view = mapped.View()
+            if len(view) < header.size or header.unpack_from(view)[:2] != (magic, VERSION):
+                self.Close()
+                raise ValueError(f'{mapped.file.name} is not a v{VERSION} game archive')
+        self._writer = (open(path, 'ab'), open(self.indexPath, 'ab')) if writable else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+
+    def Close(self):
+        if self._writer:
+            for file in self._writer: file.close()
+            self._writer = None
+        self._data.Close()
+        self._index.Close()
+
+    def __len__(self) -> int:
+        return (len(self._index.View()) - INDEX_HEADER.size) // ENTRY.size
+
+    def Append(self, start: bytes, moves, result: int = 0, reason: str = 'unfinished') -> int:
+        """Adds a game and returns its index. `start` is as `StartOf` gives it, empty for the default board."""
+        if self._writer is None: raise ValueError(f'{self.path} was opened read only')
+        data, index = self._writer
+        offset = data.seek(0, os.SEEK_END) + START_SIZE
+        data.write(start.ljust(START_SIZE, b'\0'))
+        data.write(struct.pack(f'<{len(moves)}Q', *moves))
+        data.flush()
+        index.write(ENTRY.pack(offset, len(moves), result, REASONS.index(reason)))
+        index.flush()
+        return len(self) - 1
+
+    def _Entry(self, game: int) -> tuple[int, int, int, int]:
+        if not 0 <= game < len(self): raise IndexError(f'game {game} of {len(self)}')
+        return ENTRY.unpack_from(self._index.View(), INDEX_HEADER.size + game * ENTRY.size)
+
+    def Game(self, game: int) -> dict:
+        _, turns, result, reason = self._Entry(game)
+        return {'start': self.Start(game), 'moves': self.Moves(game), 'turns': turns, 'result': result, 'reason': REASONS[reason]}
+
+    def Outcome(self, game: int) -> tuple[int, str]:
+        """Result for white and why the game ended, without reading its moves"""
+        _, _, result, reason = self._Entry(game)
+        return result, REASONS[reason]
+
+    def Start(self, game: int) -> bytes:
+        offset = self._Entry(game)[0]
+        return bytes(self._data.View()[offset - START_SIZE:offset]).rstrip(b'\0')
+
+    def Moves(self, game: int) -> tuple[int, ...]:
+        offset, turns, _, _ = self._Entry(game)
+        return struct.unpack_from(f'<{turns}Q', self._data.View(), offset)
+
+    def Move(self, game: int, turn: int) -> int:
+        offset, turns, _, _ = self._Entry(game)
+        if not 0 <= turn < turns: raise IndexError(f'turn {turn} of {turns} in game {game}')
+        return MOVE.unpack_from(self._data.View(), offset + turn * MOVE.size)[0]
+
+    def LoadBoard(self, handle: PyPtr, game: int, turn: int | None = None):
+        """Sets the board behind `handle` to game `game` before full move `turn`, after its last move if None"""
+        moves = self.Moves(game)
+        ZigInitBoardFromStr2(handle, self.Start(game))
+        for move in moves[:turn]: ZigBoardApplyFullMove(handle, move)
+
+    def Positions(self, handle: PyPtr, maxTurns: int | None = None):
+        """(game, turn, move) of every archived move, the board behind `handle` set to the position it was played in.
+        Reads one game at a time, so memory does not grow with the archive."""
+        for game in range(len(self)):
+            ZigInitBoardFromStr2(handle, self.Start(game))
+            for turn, move in enumerate(self.Moves(game)[:maxTurns]):
+                yield game, turn, move
+                ZigBoardApplyFullMove(handle, move)
@@ -0,0 +1,70 @@
+"""All sprites packed into one surface in the display's pixel format, cached on disk so a restart skips decoding every PNG.
+
+The cache is raw RGBA next to a json layout, keyed on the size and mtime of every source file, so editing a sprite rebuilds it.
+"""
+import json
+import os
+import pygame
+
+ATLAS_WIDTH = 1024
+CACHE_VERSION = 1
+
+def _SourceKey(paths: dict[str, str]) -> list:
+    key = [CACHE_VERSION, pygame.version.ver]
+    for name, path in sorted(paths.items()):
+        stat = os.stat(path)
+        key.append([name, stat.st_size, stat.st_mtime_ns])
+    return key
+
+def _Pack(images: dict[str, pygame.Surface]) -> tuple[tuple[int, int], dict[str, tuple[int, int, int, int]]]:
+    """Shelf packing, tallest first. Returns the atlas size and the rect of each image."""
+    rects = {}
+    x = y = shelf = width = 0
+    for name, image in sorted(images.items(), key=lambda item: -item[1].get_height()):
+        w, h = image.get_size()
+        if x + w > ATLAS_WIDTH and x != 0:
+            x, y, shelf = 0, y + shelf, 0
+        rects[name] = (x, y, w, h)
+        x += w
+        shelf = max(shelf, h)
+        width = max(width, x)
+    return (width, y + shelf), rects
+
+def _Build(paths: dict[str, str]) -> tuple[pygame.Surface, dict]:
+    images = {name: pygame.image.load(path) for name, path in paths.items()}
+    size, rects = _Pack(images)
+    atlas = pygame.Surface(size, pygame.SRCALPHA, 32)
+    for name, image in images.items():
+        atlas.blit(image, rects[name][:2])
+    return atlas, rects
+
+def _ReadCache(cacheDir: str, key: list) -> tuple[pygame.Surface, dict] | None:
+    try:
+        with open(os.path.join(cacheDir, 'atlas.json')) as file: layout = json.load(file)
+        if layout['key'] != key: return None
+        with open(os.path.join(cacheDir, 'atlas.rgba'), 'rb') as file: raw = file.read()
+        atlas = pygame.image.frombytes(raw, tuple(layout['size']), 'RGBA')
+    except (OSError, ValueError, KeyError):
+        return None
+    return atlas, {name: tuple(rect) for name, rect in layout['rects'].items()}
+
+def _WriteCache(cacheDir: str, key: list, atlas: pygame.Surface, rects: dict):
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+        with open(os.path.join(cacheDir, 'atlas.rgba'), 'wb') as file: file.write(pygame.image.tobytes(atlas, 'RGBA'))
+        with open(os.path.join(cacheDir, 'atlas.json'), 'w') as file: json.dump({'key': key, 'size': atlas.get_size(), 'rects': rects}, file)
+    except OSError:
+        pass #A read only install just rebuilds every start
+
+def LoadAtlas(spriteDir: str, names: list[str], cacheDir: str | None = None) -> dict[str, pygame.Surface]:
+    """Subsurface views by name of `<spriteDir>/<name>.png`, all sharing one converted atlas. Needs a display mode to be set."""
+    cacheDir = cacheDir or os.path.join(spriteDir, '__pycache__')
+    paths = {name: os.path.join(spriteDir, f'{name}.png') for name in names}
+    key = _SourceKey(paths)
+    cached = _ReadCache(cacheDir, key)
+    if cached: atlas, rects = cached
+    else:
+        atlas, rects = _Build(paths)
+        _WriteCache(cacheDir, key, atlas, rects)
+    atlas = atlas.convert_alpha()
+    return {name: atlas.subsurface(rect) for name, rect in rects.items()}
@@ -0,0 +1,36 @@
+import ctypes
+import numpy as np
+from zigwrap import BatchResult, BoardState, ZigBoardStore, ZigAnalyzeBatchInto, ZigBatchFullMovesInto
+
+# NumPy front end to the engine's batch calls. Boards are rows of `RECORD_SIZE` bytes as `ZigBoardStore` writes them,
+# and every call below is one trip into the engine however many rows there are.
+
+RESULT_DTYPE = np.dtype(BatchResult)
+RECORD_SIZE = ctypes.sizeof(BoardState)
+
+def StackBoards(handles) -> np.ndarray:
+    """(n, RECORD_SIZE) uint8 records of the boards behind `handles`"""
+    return np.frombuffer(b''.join(ZigBoardStore(handle) for handle in handles), dtype=np.uint8).reshape(-1, RECORD_SIZE)
+
+def _Records(boards) -> np.ndarray:
+    boards = np.ascontiguousarray(boards)
+    if boards.nbytes % RECORD_SIZE: raise ValueError(f'{boards.nbytes} bytes is not a whole number of {RECORD_SIZE} byte board records')
+    return boards
+
+def AnalyzeBoards(boards, threads: int = 1) -> np.ndarray:
+    """Structured array with the eval, full move count, winner and terminal flag of every board, and `invalid` set for broken records"""
+    boards = _Records(boards)
+    out = np.empty(boards.nbytes // RECORD_SIZE, dtype=RESULT_DTYPE)
+    ZigAnalyzeBatchInto(boards, out, threads)
+    return out
+
+def BoardMoves(boards, results: np.ndarray | None = None, threads: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """(moves, offsets): the full moves of board `i` are rows `offsets[i]:offsets[i + 1]` of `moves`, each a (first, second) pair of packed moves.
+    Pass the `AnalyzeBoards` results if they are at hand, otherwise they are computed first to size the buffer."""
+    boards = _Records(boards)
+    if results is None: results = AnalyzeBoards(boards, threads)
+    offsets = np.zeros(len(results) + 1, dtype=np.uint64)
+    np.cumsum(results['fullMoves'], out=offsets[1:])
+    moves = np.empty((int(offsets[-1]), 2), dtype=np.uint32)
+    ZigBatchFullMovesInto(boards, offsets, moves, threads)
+    return moves, offsets
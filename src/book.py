@@ -0,0 +1,170 @@
+"""Opening book for engine2: fixed size records sorted by position hash, probed by binary search over an `mmap`.
+
+    python src/book.py import games.jsonl --archive games.rga
+    python src/book.py build games.rga --out book.bin --turns 16
+
+`import` appends tournament JSON lines to a game archive, `build` counts how often each archived move was played in
+each of the first `--turns` positions and how it scored. Only the pages a probe touches are read, however big the book.
+"""
+import argparse
+import collections
+import json
+import mmap
+import os
+import random
+import struct
+from archive import GameArchive, RESULTS
+from zigwrap import ZigBoardHash, ZigBoardToPlay, ZigGenFullMoves, ZigInitAlloc2, ZigInitBoardFromStr2, ZigNewBoardHandle2, ZigFreeBoardHandle2
+
+HEADER = struct.Struct('<4sHHQQ') #Magic, version, record size, records, hash of the default board
+RECORD = struct.Struct('<QQIi') #Position hash, packed full move, times played, mean result for the mover x1000
+MAGIC = b'RGBK'
+VERSION = 1
+
+def DefaultHash() -> int:
+    """Hash of the default board. Books are keyed by hash, so one built with other Zobrist keys is useless and this tells them apart."""
+    handle = ZigNewBoardHandle2()
+    ZigInitBoardFromStr2(handle, b'')
+    hash = ZigBoardHash(handle)
+    ZigFreeBoardHandle2(handle)
+    return hash
+
+class OpeningBook:
+    """Read only view of a book file. Entries are (move, visits, score) with score the mover's mean result x1000."""
+    def __init__(self, path: str, keyCheck: int | None = None):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if size < HEADER.size:
+            self.Close()
+            raise ValueError(f'{path} is not an opening book')
+        magic, version, recordSize, self.count, self.keyCheck = HEADER.unpack_from(self._map)
+        if (magic, version, recordSize) != (MAGIC, VERSION, RECORD.size) or size < HEADER.size + self.count * RECORD.size:
+            self.Close()
+            raise ValueError(f'{path} is not a v{VERSION} opening book')
+        if keyCheck is not None and keyCheck != self.keyCheck:
+            self.Close()
+            raise ValueError(f'{path} was built with different hash keys')
+
+    @classmethod
+    def Open(cls, path: str) -> 'OpeningBook | None':
+        """The book at `path` if it matches this engine's hashes, None if there is no file"""
+        if not os.path.exists(path): return None
+        return cls(path, DefaultHash())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def Close(self):
+        if isinstance(self._map, mmap.mmap): self._map.close()
+        self._file.close()
+
+    def _Hash(self, idx: int) -> int:
+        return RECORD.unpack_from(self._map, HEADER.size + idx * RECORD.size)[0]
+
+    def Probe(self, hash: int) -> list[tuple[int, int, int]]:
+        """Entries for the position with `hash`, most played first"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._Hash(mid) < hash: lo = mid + 1
+            else: hi = mid
+        entries = []
+        for idx in range(lo, self.count):
+            key, move, visits, score = RECORD.unpack_from(self._map, HEADER.size + idx * RECORD.size)
+            if key != hash: break
+            entries.append((move, visits, score))
+        return entries
+
+    def Best(self, hash: int) -> int:
+        """Most played move for `hash`, 0 if the book has none"""
+        entries = self.Probe(hash)
+        return entries[0][0] if entries else 0
+
+    def Pick(self, hash: int, rng: random.Random | None = None) -> int:
+        """Book move for `hash` drawn in proportion to how often it was played, 0 if the book has none"""
+        return _Choose(self.Probe(hash), rng)
+
+    def PickFor(self, handle, rng: random.Random | None = None) -> int:
+        """`Pick` for the board behind `handle`, among only the book moves legal there, so a hash collision or a book
+        built by another engine version can't play an illegal move. 0 if none is left."""
+        entries = self.Probe(ZigBoardHash(handle))
+        if not entries: return 0
+        buf = ZigGenFullMoves(handle)
+        legal = {first | second << 32 for first, second in zip(buf[::2], buf[1::2])}
+        return _Choose([entry for entry in entries if entry[0] in legal], rng)
+
+def _Choose(entries: list[tuple[int, int, int]], rng: random.Random | None) -> int:
+    if not entries: return 0
+    return (rng or random).choices([move for move, _, _ in entries], [visits for _, visits, _ in entries])[0]
+
+def BuildBook(archive: GameArchive, path: str, turns: int = 16, minVisits: int = 1) -> int:
+    """Writes the book of `archive`'s first `turns` moves to `path` and returns the number of records.
+    Counts are kept per (position, move), so memory grows with the distinct openings, not with the games."""
+    keyCheck = DefaultHash()
+    handle = ZigNewBoardHandle2()
+    try:
+        stats = collections.defaultdict(lambda: [0, 0])
+        lastGame = None
+        for game, turn, move in archive.Positions(handle, turns):
+            if game != lastGame:
+                result, reason = archive.Outcome(game)
+                lastGame = game
+            if reason == 'unfinished': continue
+            entry = stats[(ZigBoardHash(handle), move)]
+            entry[0] += 1
+            entry[1] += result if ZigBoardToPlay(handle) == 0 else -result
+    finally:
+        ZigFreeBoardHandle2(handle)
+
+    records = sorted(((key, move, visits, round(1000 * total / visits)) for (key, move), (visits, total) in stats.items() if visits >= minVisits),
+                     key=lambda rec: (rec[0], -rec[2], rec[1]))
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, len(records), keyCheck))
+        for rec in records: file.write(RECORD.pack(*rec))
+    os.replace(tmp, path)
+    return len(records)
+
+def ImportJsonl(path: str, archive: GameArchive) -> int:
+    """Appends the games of a tournament `--out` file, all from the default board, and returns how many"""
+    count = 0
+    with open(path) as file:
+        for line in file:
+            if not line.strip(): continue
+            rec = json.loads(line)
+            archive.Append(b'', rec['moves'], RESULTS[rec['result']], rec['reason'])
+            count += 1
+    return count
+
+def Main():
+    parser = argparse.ArgumentParser(description='Build and inspect engine2 opening books')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='build a book from a game archive')
+    build.add_argument('archive')
+    build.add_argument('--out', default='book.bin')
+    build.add_argument('--turns', type=int, default=16, help='full moves from the start of each game that go in the book')
+    build.add_argument('--min-visits', type=int, default=1, help='leave out moves played fewer times than this')
+    imp = sub.add_parser('import', help='append tournament JSON lines to a game archive')
+    imp.add_argument('jsonl')
+    imp.add_argument('--archive', default='games.rga')
+    args = parser.parse_args()
+    ZigInitAlloc2()
+    if args.command == 'build':
+        with GameArchive(args.archive) as archive:
+            count = BuildBook(archive, args.out, args.turns, args.min_visits)
+            print(f'{count} records from {len(archive)} games written to {args.out}')
+    else:
+        with GameArchive(args.archive, writable=True) as archive:
+            count = ImportJsonl(args.jsonl, archive)
+            print(f'{count} games imported, {len(archive)} in {args.archive}')
+
+if __name__ == '__main__':
+    Main()
@@ -4,6 +4,7 @@ var Random: std.Random.Xoroshiro128 = undefined;
 
 const Board = RegaliaLib.Board;
 const Move = RegaliaLib.Move;
+const DoubleMoveBuffer = RegaliaLib.DoubleMoveBuffer;
 const Vec = std.ArrayList;
 
 var gAllocator: std.mem.Allocator = undefined;
@@ -28,17 +29,21 @@ pub fn PlayOutGame(board: Board) i2 {
 
 pub fn CompMove(board: Board) [2]Move {
     var timer = std.time.Timer.start() catch unreachable;
-    var moves = Vec([2]Move).init(gAllocator);
-    defer moves.deinit();
+    var buffer = DoubleMoveBuffer{};
+    buffer.Init(gAllocator) catch unreachable;
+    defer buffer.DeInit(gAllocator);
 
     var mutboard = board;
-    mutboard.GenerateAllColorMoves(&moves, board.toPlay) catch unreachable;
-    var vals = gAllocator.alloc(i16, moves.items.len) catch unreachable;
+    mutboard.GenerateAllColorMoves(&buffer, board.toPlay) catch unreachable;
+    const moves = buffer.GetBuffer();
+    var vals = gAllocator.alloc(i16, moves.len) catch unreachable;
+    defer gAllocator.free(vals);
+    @memset(vals, 0);
     
     compute: 
     while (true) for (0..vals.len) |idx| {
         mutboard = board;
-        mutboard.ApplyDoubleMove(moves.items[idx]);
+        mutboard.ApplyDoubleMove(moves[idx]);
         vals[idx] += PlayOutGame(mutboard);
         
 
@@ -53,7 +58,7 @@ pub fn CompMove(board: Board) [2]Move {
     var bestVal: i32 = -10000;
     for (0..vals.len) |idx| {
         if (vals[idx] > bestVal) {
-            bestMove = moves.items[idx];
+            bestMove = moves[idx];
             bestVal = vals[idx];
         }
     }
@@ -67,16 +72,20 @@ pub fn PlayOutGameOld(board: Board) i2 {
 
     var mutboard = board;
     var winval: i2 = 0;
+    var moves = DoubleMoveBuffer{};
+    moves.Init(gAllocator) catch unreachable;
+    defer moves.DeInit(gAllocator);
     while (winval == 0) : (winval = mutboard.WinVal()) {
-        var moves = Vec([2]Move).init(gAllocator);
+        moves.Clear();
         mutboard.GenerateAllColorMoves(&moves, mutboard.toPlay) catch unreachable;
-        var moveidx: u32 = rand.uintLessThanBiased(u32, @intCast(moves.items.len));
-        const secidx: u32 = rand.uintLessThanBiased(u32, @intCast(moves.items.len));
-        const val1 = @intFromEnum(moves.items[moveidx][0].kind) + @intFromEnum(moves.items[moveidx][1].kind);
-        const val2 = @intFromEnum(moves.items[secidx][0].kind) + @intFromEnum(moves.items[secidx][1].kind);
+        const items = moves.GetBuffer();
+        var moveidx: u32 = rand.uintLessThanBiased(u32, @intCast(items.len));
+        const secidx: u32 = rand.uintLessThanBiased(u32, @intCast(items.len));
+        const val1 = @intFromEnum(items[moveidx][0].kind) + @intFromEnum(items[moveidx][1].kind);
+        const val2 = @intFromEnum(items[secidx][0].kind) + @intFromEnum(items[secidx][1].kind);
         
         if (val2 > val1) moveidx = secidx;
-        const move = moves.items[moveidx];
+        const move = items[moveidx];
         mutboard.ApplyDoubleMove(move);
     }
     return winval;
@@ -72,18 +72,10 @@ pub const Move = packed struct(u32) {
 
 pub const SingleMoveBuffer = struct {
     const Self = @This();
-    const MaxMoves = 128; //Maximum moves a single piece can make, 128 is our conservative estimate but if it fails we'll know
+    const MaxMoves = 256; //Maximum single moves for a side, the start position alone has more than 128
 
-    buffer: *[MaxMoves] Move = undefined,
-    count: u7 = 0,
-
-    pub fn Init(self: *Self) !void {
-        self.buffer = try gAllocator.create([MaxMoves]Move);
-    }
-
-    pub fn DeInit(self: Self) void {
-        gAllocator.destroy(self.buffer);
-    }
+    buffer: [MaxMoves] Move = undefined, //Inline so it lives on the stack
+    count: u16 = 0, //Wide enough to hold MaxMoves itself
 
     pub fn Append(self: *Self, item: Move) void {
         self.buffer[self.count] = item;
@@ -94,7 +86,7 @@ pub const SingleMoveBuffer = struct {
         self.count = 0;
     }
     
-    pub fn GetBuffer(self: Self) [] const Move {
+    pub fn GetBuffer(self: *const Self) [] const Move {
         return self.buffer[0..self.count];
     }
 };
@@ -104,14 +96,15 @@ pub const DoubleMoveBuffer = struct {
     const MaxMoves = 128*128; //Based on crude guess that we can up to 128 moves once and two moves gives the square
 
     buffer: *[MaxMoves][2]Move = undefined,
-    count: u14 = 0,
+    count: u15 = 0,
 
-    pub fn Init(self: *Self) !void {
-        self.buffer = try gAllocator.create([MaxMoves][2]Move);
+    /// Too big for the stack, searches allocate one per ply up front instead of one per node
+    pub fn Init(self: *Self, allocator: std.mem.Allocator) !void {
+        self.buffer = try allocator.create([MaxMoves][2]Move);
     }
 
-    pub fn DeInit(self: Self) void {
-        gAllocator.destroy(self.buffer);
+    pub fn DeInit(self: Self, allocator: std.mem.Allocator) void {
+        allocator.destroy(self.buffer);
     }
 
     pub fn Append(self: *Self, item: [2]Move) void {
@@ -691,11 +684,7 @@ pub const Board = struct {
 
     pub fn GenerateAllColorMoves(self: *Self, buffer: *DoubleMoveBuffer, color: u1) !void {
         var singlemoves = SingleMoveBuffer{};
-        try singlemoves.Init();
-        defer singlemoves.DeInit();
         var secmoves = SingleMoveBuffer{};
-        try secmoves.Init();
-        defer secmoves.DeInit();
         try self.BufferedGenerateAllColorSingleMoves(&singlemoves, color);
         for (singlemoves.GetBuffer()) |_initmove| {
             var initmove = _initmove;
@@ -716,12 +705,14 @@ pub const Board = struct {
 
     pub fn GenerateRandomMove(self: *Self, rand: *std.Random, color: u1) ![2]Move {
         var singlemoves = Vec(Move).init(gAllocator);
+        defer singlemoves.deinit();
         try self.GenerateAllColorSingleMoves(&singlemoves, color);
         const firstidx = rand.uintLessThanBiased(u32, @intCast(singlemoves.items.len));
         const _initmove = singlemoves.items[firstidx];
 
 
         var secmoves = Vec(Move).init(gAllocator);
+        defer secmoves.deinit();
         var initmove = _initmove;
 
         const copy = self.*;
@@ -731,7 +722,7 @@ pub const Board = struct {
 
         try self.GenerateAllColorSingleMoves(&secmoves, color);
         const secidx = rand.uintLessThanBiased(u32, @intCast(secmoves.items.len));
-        const secmove = singlemoves.items[secidx];
+        const secmove = secmoves.items[secidx];
 
         return [2]Move{_initmove, secmove};
     }
@@ -831,9 +822,14 @@ fn ImportPtr(ptr: PYPTR) *Board {
     return @as(*Board, @ptrFromInt(ptr));
 }
 
+/// Board handles are recycled through a pool so short lived boards don't churn the allocator. Locked since handles are made from any thread.
+var gBoardPool: std.heap.MemoryPool(Board) = undefined;
+var gBoardPoolLock: std.Thread.Mutex = .{};
+
 pub export fn PyInitAlloc() void {
     gGpa = std.heap.GeneralPurposeAllocator(.{}).init;
     gAllocator = gGpa.allocator();
+    gBoardPool = std.heap.MemoryPool(Board).init(gAllocator);
     MoveLib.Init();
     //Bot.Init();
 }
@@ -844,10 +840,30 @@ pub export fn PyNewBoardHandle() PYPTR {
     return ExportPtr(handle);
 }
 fn _NewBoardHandle() !*Board {
-    const boardPtr = try gAllocator.create(Board);
+    gBoardPoolLock.lock();
+    defer gBoardPoolLock.unlock();
+    const boardPtr = try gBoardPool.create();
     return boardPtr;
 }
 
+/// Returns the handle to the pool, it must not be used afterwards
+pub export fn PyFreeBoardHandle(ptr: PYPTR) void {
+    gBoardPoolLock.lock();
+    defer gBoardPoolLock.unlock();
+    gBoardPool.destroy(ImportPtr(ptr));
+}
+
+/// New handle holding a copy of the board
+pub export fn PyCloneBoardHandle(ptr: PYPTR) PYPTR {
+    const handle = _NewBoardHandle() catch unreachable;
+    handle.* = ImportPtr(ptr).*;
+    return ExportPtr(handle);
+}
+
+pub export fn PyCopyBoardInto(dst: PYPTR, src: PYPTR) void {
+    ImportPtr(dst).* = ImportPtr(src).*;
+}
+
 pub export fn PyInitBoardFromStr(ptr: PYPTR, str: [*c]u8) void {
     ImportPtr(ptr).InitFromStr(str[0..162].*);
 }
@@ -861,8 +877,8 @@ pub export fn PyGenAllMoves(ptr: PYPTR, color: u8) PYPTR {
     const bptr: *Board = ImportPtr(ptr);
     //var array = Vec([2]Move).init(gAllocator);
     var buffer = DoubleMoveBuffer{};
-    buffer.Init() catch unreachable;
-    defer buffer.DeInit();
+    buffer.Init(gAllocator) catch unreachable;
+    defer buffer.DeInit(gAllocator);
     var timer = std.time.Timer.start() catch unreachable;
     for (0..1000) |_| {
         buffer.Clear();
@@ -1,4 +1,12 @@
 const std = @import("std");
+const TT = @import("ttable.zig");
+const Search = @import("search.zig");
+const Mcts = @import("mcts.zig");
+const Playout = @import("playout.zig");
+const Perft = @import("perft.zig");
+const History = @import("history.zig");
+const Stats = @import("stats.zig");
+const Reach = @import("reach.zig");
 pub var gAllocator: std.mem.Allocator = undefined;
 var gGpa: std.heap.DebugAllocator(.{}) = undefined;
 const AssertEql = std.testing.expectEqual;
@@ -72,10 +80,13 @@ pub const Move = struct {
     kind: MoveKind,
     orig: u7,
     dest: u7,
-    atkdir: u2 = undefined, //Undefined if kind does not attack
+    atkdir: u2 = 0, //Meaningless if kind does not attack
     doRet: bool,
 };
-const SingleMoveBuffer = std.BoundedArray(Move, 128);
+pub const EMPTYCELL = 0x10; //`CellCode` of an empty square
+const NOPIECE = 0xFF; //`Board.mailbox` entry of an empty square
+pub const MAXSINGLEMOVES = 256; //Random play reaches ~160
+const SingleMoveBuffer = std.BoundedArray(Move, MAXSINGLEMOVES);
 
 pub const PackedMove = packed struct (u32) {
     kind: MoveKind,
@@ -83,29 +94,165 @@ pub const PackedMove = packed struct (u32) {
     dest: u7,
     atkdir: u2,
     doRet: bool,
-    _: u12 = undefined,
+    _: u12 = 0,
+
+    pub fn FromMove(move: Move) PackedMove {
+        return .{
+            .kind = move.kind,
+            .orig = move.orig,
+            .dest = move.dest,
+            .atkdir = move.atkdir,
+            .doRet = move.doRet,
+        };
+    }
+
+    pub fn ToMove(self: PackedMove) Move {
+        return .{
+            .kind = self.kind,
+            .orig = self.orig,
+            .dest = self.dest,
+            .atkdir = self.atkdir,
+            .doRet = self.doRet,
+        };
+    }
 };
 
 pub const FullMove = struct {
     moves: [2]Move,
+
+    /// First move in the low half
+    pub fn Pack(self: FullMove) u64 {
+        const first: u32 = @bitCast(PackedMove.FromMove(self.moves[0]));
+        const second: u32 = @bitCast(PackedMove.FromMove(self.moves[1]));
+        return @as(u64, second) << 32 | first;
+    }
+
+    pub fn Unpack(val: u64) FullMove {
+        const first: PackedMove = @bitCast(@as(u32, @truncate(val)));
+        const second: PackedMove = @bitCast(@as(u32, @truncate(val >> 32)));
+        return .{ .moves = .{ first.ToMove(), second.ToMove() } };
+    }
+};
+
+/// Full move counts of one `StreamUniqueFullMoves` call, mirrored by `zigwrap.DedupCounts`
+pub const DedupCounts = extern struct {
+    raw: u64 = 0, //Pairs `StreamAllFullMoves` gives
+    unique: u64 = 0, //Pairs given, one per resulting position
+    commuting: u64 = 0, //Duplicates dropped by `Board.Commute` alone, the rest were found by hash
+};
+
+///////////////////////////////////////////////////////////////////////////
+
+/// Random keys for incremental position hashing, generated at comptime with SplitMix64
+const Zobrist = struct {
+    const Keys = [128]u64;
+
+    const pieces: [16]Keys = b: {
+        var keys: [16]Keys = undefined;
+        for (0..16) |piece| keys[piece] = GenKeys(1 + piece);
+        break :b keys;
+    };
+    const lockright: Keys = GenKeys(17);
+    const lockup: Keys = GenKeys(18);
+    const toPlay: u64 = GenKeys(19)[0];
+
+    fn GenKeys(comptime stream: u64) Keys {
+        @setEvalBranchQuota(10000);
+        var state: u64 = 0x52656761_6C696132 *% stream;
+        var keys: Keys = undefined;
+        for (&keys) |*key| {
+            state +%= 0x9E3779B97F4A7C15;
+            var z = state;
+            z = (z ^ (z >> 30)) *% 0xBF58476D1CE4E5B9;
+            z = (z ^ (z >> 27)) *% 0x94D049BB133111EB;
+            key.* = z ^ (z >> 31);
+        }
+        return keys;
+    }
 };
 
 test "Default board" {
-    const truedefault = @as(Board, .{ .lockright = 0, .lockup = 0, .pieces = .{ 167804996, 82050, 40, 0, 0, 0, 0, 16, 21047401470969745725162782720, 40239095905872932080095068160, 12379400392853802748991242240, 0, 0, 0, 0, 4951760157141521099596496896 }, .toPlay = 0 });
+    var truedefault = @as(Board, .{ .lockright = 0, .lockup = 0, .pieces = .{ 167804996, 82050, 40, 0, 0, 0, 0, 16, 21047401470969745725162782720, 40239095905872932080095068160, 12379400392853802748991242240, 0, 0, 0, 0, 4951760157141521099596496896 }, .toPlay = 0, .hash = 0 });
+    truedefault.hash = truedefault.ComputeHash();
+    truedefault.mailbox = truedefault.ComputeMailbox();
+    truedefault.terms = truedefault.ComputeTerms();
     try AssertEql(truedefault, Board.default);
 }
 
-pub const Board = struct {
+/// Evaluation terms of a board, each white minus black. Kept in step by `ApplyMove` so a leaf costs no board scan.
+pub const EvalTerms = extern struct {
+    material: i16 = 0, //Pieces weighted by `ATKPOW`
+    regalia: i8 = 0, //Crowned pieces
+    locked: i8 = 0, //Lock targets, black's for white, see `Board.IsLockTarget`
+    zones: [9]i8 = [1]i8{0} ** 9, //Pieces in each zone, the side with more controls it
+
+    /// Zones controlled by white minus those controlled by black
+    pub fn ZoneControl(self: EvalTerms) i32 {
+        var control: i32 = 0;
+        for (self.zones) |zone| control += std.math.sign(@as(i32, zone));
+        return control;
+    }
+
+    /// Weighted terms and their total, mirrored by `zigwrap.EvalBreakdown`
+    pub fn Breakdown(self: EvalTerms) EvalBreakdown {
+        var breakdown = EvalBreakdown{
+            .material = EVALMATERIAL * @as(i32, self.material),
+            .regalia = EVALREGALIA * @as(i32, self.regalia),
+            .zones = EVALZONE * self.ZoneControl(),
+            .locked = EVALLOCKED * @as(i32, self.locked),
+        };
+        breakdown.total = breakdown.material + breakdown.regalia + breakdown.zones + breakdown.locked;
+        return breakdown;
+    }
+
+    fn Add(self: *EvalTerms, other: EvalTerms, comptime sign: comptime_int) void {
+        self.material += sign * other.material;
+        self.regalia += sign * other.regalia;
+        self.locked += sign * other.locked;
+        for (&self.zones, other.zones) |*zone, delta| zone.* += sign * delta;
+    }
+};
+
+pub const EvalBreakdown = extern struct {
+    material: i32 = 0,
+    regalia: i32 = 0,
+    zones: i32 = 0,
+    locked: i32 = 0,
+    total: i32 = 0,
+};
+
+//Eval weights, one ATKPOW point of material is worth 100
+const EVALMATERIAL = 100;
+const EVALREGALIA = 30;
+const EVALZONE = 25;
+const EVALLOCKED = 40;
+
+/// C layout so Python can map a handle directly, mirrored by `zigwrap.BoardState`. Bump `LAYOUTVERSION` on any change.
+pub const Board = extern struct {
     const Self = @This();
     const cwhite = 0;
     const cblack = 1;
 
+    pieces: [16]BitBoard, //{color}{regalia}{pieceID}2 //00 -> Inf, 01 -> Cav, 10 -> Art, 11 -> Kng //Color: 0 -> white, 1 -> black
     lockright: BitBoard,
     lockup: BitBoard,
-    pieces: [16]BitBoard, //{color}{regalia}{pieceID}2 //00 -> Inf, 01 -> Cav, 10 -> Art, 11 -> Kng //Color: 0 -> white, 1 -> black
-    toPlay: u1,
+    hash: u64, //Zobrist key, maintained incrementally by the mutation helpers
+    toPlay: u8, //0 or 1, a whole byte to keep the C layout
+    terms: EvalTerms = .{}, //Maintained incrementally by `ApplyMove`
+    mailbox: [PADDEDBOARDLEN * PADDEDBOARDLEN]u8 = [1]u8{NOPIECE} ** (PADDEDBOARDLEN * PADDEDBOARDLEN), //Piece index on each square orelse `NOPIECE`, kept by the mutation helpers
+
+    pub const LAYOUTVERSION: u32 = 3;
+
+    pub const default: Self = b: {
+        @setEvalBranchQuota(20000);
+        var board = defaultNoHash;
+        board.hash = board.ComputeHash();
+        board.mailbox = board.ComputeMailbox();
+        board.terms = board.ComputeTerms();
+        break :b board;
+    };
 
-    const default: Self = .{
+    const defaultNoHash: Self = .{
         .lockright = 0,
         .lockup = 0,
         .pieces = b: {
@@ -135,6 +282,7 @@ pub const Board = struct {
             break :b board;
         },
         .toPlay = 0,
+        .hash = 0,
     };
 
     const zoneMasks: [9]BitBoard = b: {
@@ -146,30 +294,87 @@ pub const Board = struct {
         break :b masks;
     };
 
+    /// Zone of each playable square
+    const zoneOf: [121]u8 = b: {
+        var zones = [1]u8{0} ** 121;
+        for (0..9) |x| for (0..9) |y| {
+            zones[x + PADDEDBOARDLEN * y] = 3 * (y / 3) + x / 3;
+        };
+        break :b zones;
+    };
+
     /////////////////////////////////////////////
     
-    fn GenInitStr(self: Self, buf: *[162]u8) void {
-        for (0..81) |idx_| {
-            const x = idx_ % 9;
-            const y = (idx_ / 9);
-            const idx = 11 * y + x;
-            for (0..16) |piece| {
-                if (Has(self.pieces[piece], BB_ONE << @intCast(idx))) {
-                    const hasReg: u8 = @intCast(piece>>2 & 1);
-                    buf[idx_] = 'a' + @as(u8, @intCast(hasReg << 3 | (piece & 8)>>1 | (piece % 4)));
-                    break;
-                }
-            } else buf[idx_] = 'z';
+    /// Inverse of `GenInitStr`: 81 piece characters then 81 lock characters, row by row from white's side
+    pub fn InitFromStr(self: *Self, initStr: [162]u8, toPlay: u1) void {
+        self.SetFromStr(initStr, toPlay);
+        self.hash = self.ComputeHash();
+        self.mailbox = self.ComputeMailbox();
+        self.terms = self.ComputeTerms();
+        self.Validate();
+    }
+
+    /// `InitFromStr` for strings from outside, which may hold any byte. Rejects characters that are neither a piece, a lock nor `z`
+    /// and boards `_ValidateLayout` finds broken, such as a lock to an empty square.
+    pub fn CheckedFromStr(initStr: [162]u8, toPlay: u1) !Self {
+        for (initStr[0..81]) |c| if (c != 'z' and (c < 'a' or c > 'p')) return error.Bad_Piece_Char;
+        for (initStr[81..162]) |c| if (c != 'z' and (c < 'a' or c > 'd')) return error.Bad_Lock_Char;
+        var board: Self = undefined;
+        board.SetFromStr(initStr, toPlay);
+        try board.Restore();
+        return board;
+    }
+
+    /// Pieces, locks and side to play of an init string, the derived fields are left for the caller
+    fn SetFromStr(self: *Self, initStr: [162]u8, toPlay: u1) void {
+        self.* = .{ .lockright = 0, .lockup = 0, .pieces = [1]BitBoard{0} ** 16, .toPlay = toPlay, .hash = 0 };
+        for (0.., initStr[0..81]) |idx_, c| {
+            if (c == 'z') continue;
+            const val = c - 'a';
+            const idx: u7 = @intCast(11 * (idx_ / 9) + idx_ % 9);
+            const piece = (val & 4) << 1 | (val & 8) >> 1 | (val & 3); //{hasReg}{color}{piece} to {color}{regalia}{piece}
+            self.pieces[piece] |= BB_ONE << idx;
         }
+        for (0.., initStr[81..162]) |idx_, c| {
+            if (c == 'z') continue;
+            const conn = c - 'a';
+            const idx: u7 = @intCast(11 * (idx_ / 9) + idx_ % 9);
+            self.lockright |= @as(BitBoard, conn & 1) << idx;
+            self.lockup |= @as(BitBoard, (conn >> 1) & 1) << idx;
+        }
+    }
+
+    pub fn GenInitStr(self: Self, buf: *[162]u8) void {
         for (0..81) |idx_| {
-            const x = idx_ % 9;
-            const y = (idx_ / 9);
-            const idx: u7 = @intCast(11 * y + x);
-            const coml: u8 = @truncate(((self.lockright >> idx) & 1) + (((self.lockup >> idx) & 1) << 1) + (((self.lockright >> 1 >> idx) & 1) << 2));
-            //std.debug.print("{}", .{coml});
-            buf[idx_ + 81] = 'a' + coml;
+            const idx: u7 = @intCast(11 * (idx_ / 9) + idx_ % 9);
+            const cell = self.CellCode(idx);
+            buf[idx_] = if (cell == EMPTYCELL) 'z' else 'a' + cell;
+            buf[idx_ + 81] = 'a' + @as(u8, self.LocksAt(idx));
         }
-        std.debug.print("\n", .{});
+    }
+
+    /// Piece at `pos` as {hasReg}{color}{piece} like `GenInitStr`, `EMPTYCELL` for none
+    pub fn CellCode(self: Self, pos: u7) u8 {
+        const piece: u8 = self.PieceAt(pos) orelse return EMPTYCELL;
+        return (piece & 4) << 1 | (piece & 8) >> 1 | (piece & 3);
+    }
+
+    /// Locks at `pos` as a connection mask like the old engine: 1 right, 2 up, 4 left, 8 down
+    pub fn LocksAt(self: Self, pos: u7) u4 {
+        const right = Bit(self.lockright, pos);
+        const up = Bit(self.lockup, pos);
+        const left = if (pos >= SHR) Bit(self.lockright, pos - SHR) else 0;
+        const down = if (pos >= SHU) Bit(self.lockup, pos - SHU) else 0;
+        return @as(u4, right) | @as(u4, up) << 1 | @as(u4, left) << 2 | @as(u4, down) << 3;
+    }
+
+    /// Squares whose piece or locks differ from `old`
+    pub fn ChangedSquares(self: Self, old: Self) BitBoard {
+        var changed: BitBoard = 0;
+        for (self.pieces, old.pieces) |new, prev| changed |= new ^ prev;
+        const right = self.lockright ^ old.lockright;
+        const up = self.lockup ^ old.lockup;
+        return changed | right | right << SHR | up | up << SHU;
     }
 
     /////////////////////////////////////////////
@@ -217,33 +422,43 @@ pub const Board = struct {
         return 1 << (x + PADDEDBOARDLEN * y);
     }
     /// Piece at a given position orelse null
-    fn PieceAt(self: Self, pos: u7) ?u4 {
+    fn PieceAt(self: *const Self, pos: u7) ?u4 {
+        const piece = self.mailbox[pos];
+        if (DoValidation and @as(?u4, if (piece == NOPIECE) null else @intCast(piece)) != self.ScanPieceAt(pos)) std.debug.panic("Mailbox has `{}` at `{}`, the bitboards `{?}`", .{ piece, pos, self.ScanPieceAt(pos) });
+        return if (piece == NOPIECE) null else @intCast(piece);
+    }
+
+    /// `PieceAt(...).?`
+    fn AssumedPieceAt(self: *const Self, pos: u7) u4 {
+        return self.PieceAt(pos) orelse {
+            if (DoValidation) std.debug.panic("Pos `{}` has no piece", .{pos});
+            unreachable;
+        };
+    }
+
+    /// Piece at `pos` from the bitboards alone, what the mailbox is rebuilt and checked from
+    fn ScanPieceAt(self: Self, pos: u7) ?u4 {
         for (0..16) |piece|
             if (Bit(self.pieces[piece], pos) != 0)
                 return @intCast(piece);
         return null;
     }
 
-    /// Slower, dont use
-    fn SimdAssumedPieceAt(self: Self, pos: u7) u4 {
-        var piecevec: @Vector(16, BitBoard) = self.pieces;
-        piecevec >>= @splat(pos);
-        piecevec &= @splat(1);
-        piecevec *= @TypeOf(piecevec) {0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15};
-        return @intCast(@reduce(.Or, piecevec));
+    /// 1 if only white has a king, -1 if only black does, 0 otherwise
+    pub fn WinVal(self: Self) i2 {
+        const whiteHasKing: i2 = @intFromBool((self.GetBoard("king", false, cwhite) | self.GetBoard("king", true, cwhite)) != 0);
+        const blackHasKing: i2 = @intFromBool((self.GetBoard("king", false, cblack) | self.GetBoard("king", true, cblack)) != 0);
+        return whiteHasKing - blackHasKing;
     }
 
-    /// Maybe faster than `PieceAt(...).?`
-    fn AssumedPieceAt(self: Self, pos: u7) u4 {
-        for (0..16) |piece|
-            if (Bit(self.pieces[piece], pos) != 0)
-                return @intCast(piece);
-        if (DoValidation) std.debug.panic("Pos `{}` has no piece", .{pos});
-        unreachable;
+    pub fn IsTerminal(self: Self) bool {
+        const whiteKings = self.GetBoard("king", false, cwhite) | self.GetBoard("king", true, cwhite);
+        const blackKings = self.GetBoard("king", false, cblack) | self.GetBoard("king", true, cblack);
+        return whiteKings == 0 or blackKings == 0;
     }
 
     /// Get the power of the piece at position. Assumes there is a piece there.
-    fn PowerAt(self: Self, pos: u7) u8 {
+    fn PowerAt(self: *const Self, pos: u7) u8 {
         if (DoValidation and self.PieceAt(pos) == null) std.debug.panic("Self ({}) is null, cannot get power\n", .{pos});
 
         const piece = self.AssumedPieceAt(pos);
@@ -251,7 +466,7 @@ pub const Board = struct {
     }
 
     /// Sum of strength of combat lockers
-    fn AttackersOn(self: Self, pos: u7) u8 {
+    fn AttackersOn(self: *const Self, pos: u7) u8 {
         var sum: u8 = 0;
         //std.debug.print("pos: {} vs SHU: {}\n", .{pos, SHU});
         const right = Bit(self.lockright, pos);
@@ -272,8 +487,100 @@ pub const Board = struct {
     }
 
     fn _Validate(self: *Self) !void {
-        _ = self;
-        return;
+        try self._ValidateLayout();
+        if (self.hash != self.ComputeHash()) return error.Hash_Mismatch;
+        if (!std.mem.eql(u8, &self.mailbox, &self.ComputeMailbox())) return error.Mailbox_Mismatch;
+        if (!std.meta.eql(self.terms, self.ComputeTerms())) return error.Eval_Mismatch; //Reads the mailbox
+    }
+
+    /// The checks on the bitboards, locks and side to play that everything derived from them relies on
+    fn _ValidateLayout(self: *const Self) !void {
+        var occupied: BitBoard = 0;
+        for (self.pieces) |pieces| {
+            if (Has(occupied, pieces)) return error.Overlapping_Pieces;
+            occupied |= pieces;
+        }
+        if (Has(occupied, ~PLAYABLE)) return error.Piece_Off_Board;
+        if (Has(self.lockright, ~(occupied & occupied >> SHR))) return error.Right_Lock_to_Blank;
+        if (Has(self.lockup, ~(occupied & occupied >> SHU))) return error.Up_Lock_to_Blank;
+        if (self.toPlay > 1) return error.Bad_To_Play;
+    }
+
+    /// Checks a board copied in from outside and rebuilds its hash, eval terms and mailbox. Runs whatever `DoValidation` is,
+    /// as a broken record would otherwise reach code that assumes a well formed board.
+    pub fn Restore(self: *Self) !void {
+        try self._ValidateLayout();
+        self.hash = self.ComputeHash();
+        self.mailbox = self.ComputeMailbox();
+        self.terms = self.ComputeTerms();
+    }
+
+    /// Full recomputation of the zobrist key, the incremental one should always match it
+    pub fn ComputeHash(self: Self) u64 {
+        var hash: u64 = if (self.toPlay == 1) Zobrist.toPlay else 0;
+        for (0..16) |piece| hash ^= XorKeys(&Zobrist.pieces[piece], self.pieces[piece]);
+        hash ^= XorKeys(&Zobrist.lockright, self.lockright);
+        hash ^= XorKeys(&Zobrist.lockup, self.lockup);
+        return hash;
+    }
+
+    /// Full rebuild of `mailbox` from the bitboards
+    pub fn ComputeMailbox(self: Self) [PADDEDBOARDLEN * PADDEDBOARDLEN]u8 {
+        var mailbox = [1]u8{NOPIECE} ** (PADDEDBOARDLEN * PADDEDBOARDLEN);
+        for (self.pieces, 0..) |pieces, piece| {
+            var bits = pieces;
+            while (bits != 0) : (bits &= bits - 1) mailbox[@ctz(bits)] = @intCast(piece);
+        }
+        return mailbox;
+    }
+
+    /// Full recomputation of `terms`, the incremental ones should always match it. Reads `mailbox`, so rebuild that first.
+    pub fn ComputeTerms(self: Self) EvalTerms {
+        return self.TermsUnder(PLAYABLE);
+    }
+
+    /// What the pieces on `mask` contribute to `terms`. A piece counts as locked if it is the target of a lock, see `IsLockTarget`.
+    fn TermsUnder(self: Self, mask: BitBoard) EvalTerms {
+        var terms = EvalTerms{};
+        for (self.pieces, 0..) |pieces, piece| {
+            const sign: i8 = if (piece >> 3 == 0) 1 else -1;
+            var bits = pieces & mask;
+            while (bits != 0) : (bits &= bits - 1) {
+                const pos: u7 = @intCast(@ctz(bits));
+                terms.material += sign * @as(i16, ATKPOW[piece & 7]);
+                if (piece & OH_REGBIT != 0) terms.regalia += sign;
+                if (self.IsLockTarget(pos)) terms.locked -= sign;
+                terms.zones[zoneOf[pos]] += sign;
+            }
+        }
+        return terms;
+    }
+
+    /// Which end of a lock is its target is not stored, but attacks only lock pieces too strong to capture,
+    /// so the target is the stronger end. Equal ends are both targets and cancel out.
+    fn IsLockTarget(self: Self, pos: u7) bool {
+        const locks = self.LocksAt(pos);
+        if (locks == 0) return false;
+        const piece = self.AssumedPieceAt(pos);
+        const others = [4]u7{ pos +% SHR, pos +% SHU, pos -% SHR, pos -% SHU };
+        for (others, 0..) |other, dir| {
+            if (locks >> @intCast(dir) & 1 == 0) continue;
+            const enemy = self.AssumedPieceAt(other);
+            if (enemy >> 3 != piece >> 3 and ATKPOW[enemy % 8] <= ATKPOW[piece % 8]) return true;
+        }
+        return false;
+    }
+
+    /// Squares whose terms `move` can change: its own and their neighbours, whose locks it can make or break.
+    /// A king weaken also uncrowns the piece it locks, which changes which ends of that piece's locks are targets.
+    fn EvalArea(move: Move) BitBoard {
+        const area = Reach.plus[move.orig] | Reach.plus[move.dest];
+        return if (move.kind == .kingweaken) area | Reach.plus[Offset(move.dest, move.atkdir)] else area;
+    }
+
+    /// Static score for white, see `EvalTerms.Breakdown`
+    pub fn Evaluate(self: Self) i32 {
+        return self.terms.Breakdown().total;
     }
 
     /// Not exaughstive but should catch most cases
@@ -283,7 +590,7 @@ pub const Board = struct {
     }
 
     fn _ValidateMove(self: Self, move: Move) !void {
-        errdefer std.debug.print("Errored move is {}\n", .{move});
+        errdefer Stats.Log(.err, "Errored move is {}\n", .{move});
         const moveKind: MoveKind = move.kind;
         if (moveKind == .null) return; //Always legal
 
@@ -331,13 +638,16 @@ pub const Board = struct {
         }
     }
 
-    fn ApplyMove(self: *Self, move: Move) void {
+    pub fn ApplyMove(self: *Self, move: Move) void {
         ValidateMove(self.*, move);
+        Stats.Add(.applies, 1);
 
         const moveKind: MoveKind = move.kind;
         if (moveKind == .null) return;
 
         var ownPiece = self.PieceAt(move.orig).?; //Checked by validate
+        const evalArea = EvalArea(move);
+        self.terms.Add(self.TermsUnder(evalArea), -1);
 
         if (move.doRet) {
             self._RemoveRegalia(move.orig, ownPiece);
@@ -349,6 +659,7 @@ pub const Board = struct {
         switch (moveKind) {
             .capture => {
                 self._RemovePiece(move.dest, destPiece.?); //Checked by validate
+                self._RemoveLocksAt(move.orig); //A locked piece capturing leaves its other locks behind
                 self._MovePiece(move.orig, move.dest, ownPiece);
                 self._AddRegalia(move.dest, ownPiece);
                 //Note to self, can optimize these former two into a single fused operation
@@ -378,54 +689,144 @@ pub const Board = struct {
             },
             else => if (DoValidation) @panic("Shouldnt get Here ApplyMove") else unreachable,
         }
+        self.terms.Add(self.TermsUnder(evalArea), 1);
+        self.Validate();
+    }
+
+    /// What `ApplyMove` can change: the pieces on its squares, the locks on their edges, the hash and the side to play
+    pub const Undo = struct {
+        squares: [3]u7,
+        cells: [3]?u4,
+        rightMask: BitBoard,
+        upMask: BitBoard,
+        lockright: BitBoard,
+        lockup: BitBoard,
+        hash: u64,
+        toPlay: u8,
+        terms: EvalTerms,
+    };
+
+    /// Taken before `ApplyMove(move)` and any `EndTurn`, `Unmake` then restores this board in O(1)
+    pub fn MakeUndo(self: Self, move: Move) Undo {
+        const third = if (move.kind == .kingweaken) Offset(move.dest, move.atkdir) else move.dest;
+        const squares = [3]u7{ move.orig, move.dest, third };
+        var undo = Undo{
+            .squares = squares,
+            .cells = undefined,
+            .rightMask = EdgeMask(move.orig, SHR) | EdgeMask(move.dest, SHR),
+            .upMask = EdgeMask(move.orig, SHU) | EdgeMask(move.dest, SHU),
+            .lockright = undefined,
+            .lockup = undefined,
+            .hash = self.hash,
+            .toPlay = self.toPlay,
+            .terms = self.terms,
+        };
+        for (squares, &undo.cells) |pos, *cell| cell.* = self.PieceAt(pos);
+        undo.lockright = self.lockright & undo.rightMask;
+        undo.lockup = self.lockup & undo.upMask;
+        return undo;
+    }
+
+    pub fn Unmake(self: *Self, undo: Undo) void {
+        for (undo.squares, undo.cells) |pos, cell| {
+            const bit = BB_ONE << pos;
+            for (&self.pieces) |*pieces| pieces.* &= ~bit;
+            if (cell) |piece| self.pieces[piece] |= bit;
+            self.mailbox[pos] = cell orelse NOPIECE;
+        }
+        self.lockright = (self.lockright & ~undo.rightMask) | undo.lockright;
+        self.lockup = (self.lockup & ~undo.upMask) | undo.lockup;
+        self.hash = undo.hash;
+        self.toPlay = undo.toPlay;
+        self.terms = undo.terms;
         self.Validate();
     }
 
+    /// The two lock edges `step` apart through `pos`, as `_RemoveLocksAt` clears them
+    fn EdgeMask(pos: u7, comptime step: comptime_int) BitBoard {
+        return std.math.shl(BitBoard, 1 << step | 1, @as(i8, pos) - step);
+    }
+
     pub fn ApplyFullMove(self: *Self, move: FullMove) void {
         self.ApplyMove(move.moves[0]);
         self.ApplyMove(move.moves[1]);
-        self.toPlay = ~self.toPlay;
+        self.EndTurn();
+    }
+
+    /// Hands the turn over, for callers applying the two halves of a full move themselves
+    pub fn EndTurn(self: *Self) void {
+        self.toPlay ^= 1;
+        self.hash ^= Zobrist.toPlay;
     }
 
     fn _RemoveLocksAt(self: *Self, pos: u7) void {
-        self.lockright &= ~std.math.shl(BitBoard, 1 << 1 | 1, pos - 1);
-        self.lockup &= ~std.math.shl(BitBoard, 1 << 11 | 1, pos - 11);
+        const oldright = self.lockright;
+        const oldup = self.lockup;
+        self.lockright &= ~std.math.shl(BitBoard, 1 << 1 | 1, @as(i8, pos) - 1);
+        self.lockup &= ~std.math.shl(BitBoard, 1 << 11 | 1, @as(i8, pos) - 11);
+        self.hash ^= XorKeys(&Zobrist.lockright, oldright ^ self.lockright);
+        self.hash ^= XorKeys(&Zobrist.lockup, oldup ^ self.lockup);
     }
 
     fn _SwapPieces(self: *Self, a: u7, b: u7, pieceA: u4, pieceB: u4) void {
         if (DoValidation and a == b) @panic("Destination was Origin for swap");
         self._MovePiece(a, b, pieceA);
         self._MovePiece(b, a, pieceB);
+        self.mailbox[b] = pieceA; //Emptied by the second move
     }
 
     fn _MovePiece(self: *Self, orig: u7, dest: u7, piece: u4) void {
         self.pieces[piece] ^= BB_ONE << orig;
         self.pieces[piece] ^= BB_ONE << dest;
+        self.hash ^= Zobrist.pieces[piece][orig] ^ Zobrist.pieces[piece][dest];
+        self.mailbox[orig] = NOPIECE;
+        self.mailbox[dest] = piece;
     }
 
     fn _RemovePiece(self: *Self, pos: u7, piece: u4) void {
+        self.hash ^= XorKeys(&Zobrist.pieces[piece], self.pieces[piece] & (BB_ONE << pos));
         self.pieces[piece] &= ~(BB_ONE << pos);
+        if (self.mailbox[pos] == piece) self.mailbox[pos] = NOPIECE;
+    }
+
+    /// Sets bits of `pieces[piece]` under `mask` to `value`, keeping the hash in step
+    fn _SetPieceBits(self: *Self, piece: usize, mask: BitBoard, value: BitBoard) void {
+        const old = self.pieces[piece];
+        self.pieces[piece] = (old & ~mask) | (value & mask);
+        self.hash ^= XorKeys(&Zobrist.pieces[piece], old ^ self.pieces[piece]);
     }
 
     const OH_REGBIT = 1 << REGBITPOS;
     const INV_REGBUT = ~@as(usize, OH_REGBIT);
 
     fn _AddRegalia(self: *Self, pos: u7, piece: u4) void {
-        self.pieces[piece & INV_REGBUT] &= ~(BB_ONE << pos); //Toggle off origin
-        self.pieces[piece | OH_REGBIT] |= (BB_ONE << pos); //Toggle on
+        const bit = BB_ONE << pos;
+        self._SetPieceBits(piece & INV_REGBUT, bit, 0); //Toggle off origin
+        self._SetPieceBits(piece | OH_REGBIT, bit, bit); //Toggle on
+        self.mailbox[pos] = piece | OH_REGBIT;
     }
 
     fn _RemoveRegalia(self: *Self, pos: u7, piece: u4) void {
-        self.pieces[piece | OH_REGBIT] &= ~(BB_ONE << pos); //Toggle off
-        self.pieces[piece & INV_REGBUT] |= (BB_ONE << pos); //Toggle on
+        const bit = BB_ONE << pos;
+        self._SetPieceBits(piece | OH_REGBIT, bit, 0); //Toggle off
+        self._SetPieceBits(piece & INV_REGBUT, bit, bit); //Toggle on
+        self.mailbox[pos] = piece & ~@as(u4, OH_REGBIT);
     }
 
     fn _ToggleRegalia(self: *Self, pos: u7, piece: u4) void {
         self.pieces[piece] ^= (BB_ONE << pos); //Toggle off origin
-        self.pieces[(1 << 4) ^ piece] ^= (BB_ONE << pos); //Toggle on
+        self.pieces[OH_REGBIT ^ piece] ^= (BB_ONE << pos); //Toggle on
+        self.hash ^= Zobrist.pieces[piece][pos] ^ Zobrist.pieces[OH_REGBIT ^ piece][pos];
+        self.mailbox[pos] = OH_REGBIT ^ piece;
     }
 
     fn _AddLockInDir(self: *Self, pos: u7, dir: u2) void {
+        switch (dir) {
+            0 => self.hash ^= XorKeys(&Zobrist.lockright, ~self.lockright & BB_ONE << (pos)),
+            1 => self.hash ^= XorKeys(&Zobrist.lockup, ~self.lockup & BB_ONE << (pos)),
+            2 => self.hash ^= XorKeys(&Zobrist.lockright, ~self.lockright & BB_ONE << (pos - SHR)),
+            3 => self.hash ^= XorKeys(&Zobrist.lockup, ~self.lockup & BB_ONE << (pos - SHU)),
+        }
         switch (dir) {
             0 => self.lockright |= BB_ONE << (pos),
             1 => self.lockup |= BB_ONE << (pos),
@@ -443,7 +844,26 @@ pub const Board = struct {
 
     ///////////////////////////////////////////////////////////////////////
 
-    fn StreamAllSingleMoves(self: Self, comptime color: comptime_int, context: anytype, comptime Handle: fn (@TypeOf(context), Move) void) !void {
+    pub fn StreamAllSingleMoves(self: Self, comptime color: comptime_int, context: anytype, comptime Handle: fn (@TypeOf(context), Move) void) !void {
+        if (!Stats.Enabled()) return self.GenerateSingleMoves(color, context, Handle);
+
+        //Counted by the piece that moves, flushed once per call
+        const Counting = struct {
+            board: *const Board,
+            inner: @TypeOf(context),
+            counts: [4]u64 = .{ 0, 0, 0, 0 },
+
+            fn Count(counting: *@This(), move: Move) void {
+                counting.counts[counting.board.AssumedPieceAt(move.orig) & 3] += 1;
+                Handle(counting.inner, move);
+            }
+        };
+        var counting = Counting{ .board = &self, .inner = context };
+        try self.GenerateSingleMoves(color, &counting, Counting.Count);
+        for (counting.counts, 0..) |count, kind| Stats.AddMoves(@intCast(kind), count);
+    }
+
+    fn GenerateSingleMoves(self: Self, comptime color: comptime_int, context: anytype, comptime Handle: fn (@TypeOf(context), Move) void) !void {
         const precalc = b: {
             var _precalc: Moves.PreCalc = undefined;
             _precalc.allies = BlockersForColor(self, color);
@@ -474,7 +894,7 @@ pub const Board = struct {
         try Moves.King(self, precalc, context, Handle, self.GetBoard("king", false, color), 0, false);
     }
 
-    fn StreamAllFullMoves(self: Self, comptime color: comptime_int, context: anytype, comptime Handle: fn (@TypeOf(context), FullMove) void) !void {
+    pub fn StreamAllFullMoves(self: Self, comptime color: comptime_int, context: anytype, comptime Handle: fn (@TypeOf(context), FullMove) void) !void {
         var buffer = SingleMoveBuffer.init(0) catch unreachable;
         const Locals = struct {
             buffptr: *SingleMoveBuffer,
@@ -504,6 +924,131 @@ pub const Board = struct {
         }
     }
 
+    /// `StreamAllFullMoves` giving each resulting position once. Commuting pairs are only given in one order, found by `Commute` from the
+    /// squares each root move reads and writes without applying the second. Every other pair is dropped if the position it reaches hashes
+    /// like one already given.
+    pub fn StreamUniqueFullMoves(self: Self, allocator: std.mem.Allocator, comptime color: comptime_int, context: anytype, comptime Handle: fn (@TypeOf(context), FullMove) void) !DedupCounts {
+        var firsts = SingleMoveBuffer.init(0) catch unreachable;
+        const Buffer = struct {
+            fn Append(buffer: *SingleMoveBuffer, move: Move) void {
+                buffer.appendAssumeCapacity(move);
+            }
+        };
+        try self.StreamAllSingleMoves(color, &firsts, Buffer.Append);
+
+        //Hash change of each first move, a commuting second changes the hash the same way after any first
+        var deltas: [MAXSINGLEMOVES]u64 = undefined;
+        var footprints: [MAXSINGLEMOVES]Footprint = undefined;
+        var byMove: std.AutoHashMapUnmanaged(u32, u8) = .empty;
+        defer byMove.deinit(allocator);
+        try byMove.ensureTotalCapacity(allocator, @intCast(firsts.len));
+        for (firsts.slice(), 0..) |move, idx| {
+            var child = self;
+            child.ApplyMove(move);
+            deltas[idx] = child.hash ^ self.hash;
+            footprints[idx] = Footprint.Of(self, move);
+            byMove.putAssumeCapacity(@bitCast(PackedMove.FromMove(move)), @intCast(idx));
+        }
+
+        var seen: std.AutoHashMapUnmanaged(u64, void) = .empty;
+        defer seen.deinit(allocator);
+        var counts = DedupCounts{};
+        var failure: ?std.mem.Allocator.Error = null;
+        const Second = struct {
+            state: *const Board, //After the first move
+            first: Move,
+            firstIdx: usize,
+            hash: u64, //Of the root with the first move's delta
+            deltas: *const [MAXSINGLEMOVES]u64,
+            footprints: *const [MAXSINGLEMOVES]Footprint,
+            byMove: *const std.AutoHashMapUnmanaged(u32, u8),
+            seen: *std.AutoHashMapUnmanaged(u64, void),
+            allocator: std.mem.Allocator,
+            counts: *DedupCounts,
+            failure: *?std.mem.Allocator.Error,
+            context: @TypeOf(context),
+
+            fn Handle_(ctx: @This(), second: Move) void {
+                if (second.orig == ctx.first.dest) return;
+                ctx.counts.raw += 1;
+                const key: u32 = @bitCast(PackedMove.FromMove(second));
+                //A second that commutes with the first was also a first move at the root
+                const commuting = if (ctx.byMove.get(key)) |idx| (if (Commute(ctx.footprints[ctx.firstIdx], ctx.footprints[idx])) idx else null) else null;
+                if (commuting != null and key < @as(u32, @bitCast(PackedMove.FromMove(ctx.first)))) {
+                    ctx.counts.commuting += 1; //Given with the moves the other way round
+                    return;
+                }
+                const hash = if (commuting) |idx| ctx.hash ^ ctx.deltas[idx] else b: {
+                    var child = ctx.state.*;
+                    child.ApplyMove(second);
+                    break :b child.hash;
+                };
+                const entry = ctx.seen.getOrPut(ctx.allocator, hash) catch |err| {
+                    ctx.failure.* = err;
+                    return;
+                };
+                if (entry.found_existing) return;
+                ctx.counts.unique += 1;
+                Handle(ctx.context, FullMove{ .moves = .{ ctx.first, second } });
+            }
+        };
+
+        for (firsts.slice(), 0..) |first, idx| {
+            var state = self;
+            state.ApplyMove(first);
+            try state.StreamAllSingleMoves(color, Second{
+                .state = &state,
+                .first = first,
+                .firstIdx = idx,
+                .hash = self.hash ^ deltas[idx],
+                .deltas = &deltas,
+                .footprints = &footprints,
+                .byMove = &byMove,
+                .seen = &seen,
+                .allocator = allocator,
+                .counts = &counts,
+                .failure = &failure,
+                .context = context,
+            }, Second.Handle_);
+            if (failure) |err| return err;
+        }
+        return counts;
+    }
+
+    /// What a single move changes and what its generation and effect depend on, for `Commute`. A square's state is its piece and the lock edges
+    /// touching it. Zones count apart from squares, as infantry read whether their zone holds both colors and a move between zones can change that.
+    const Footprint = struct {
+        writes: BitBoard,
+        reads: BitBoard,
+        zoneWrites: u9 = 0,
+        zoneReads: u9 = 0,
+        removes: bool, //Takes a piece off the board, which can end the game
+
+        fn Of(board: Self, move: Move) Footprint {
+            const target = if (move.kind == .attack or move.kind == .kingweaken) Offset(move.dest, move.atkdir) else move.dest;
+            const squares = BB_ONE << move.orig | BB_ONE << move.dest | BB_ONE << target;
+            //Dropping the locks on a square changes the squares at their other ends too
+            const unlocks = move.doRet or move.kind == .capture or move.kind == .sacrifice;
+            var footprint = Footprint{
+                .writes = if (unlocks) squares | Reach.plus[move.orig] | Reach.plus[move.dest] else squares,
+                //The blockers a speed 2 piece steps around, then what decides whether the dest or target can be taken or attacked: its piece, its locks and the power of the pieces locking it
+                .reads = MoveConvolve(MoveConvolve(BB_ONE << move.orig)) | Reach.plus[move.dest] | Reach.plus[target],
+                .removes = move.kind == .capture or move.kind == .sacrifice,
+            };
+            //A swap keeps both pieces' color on both squares
+            if (move.kind != .swap and zoneOf[move.orig] != zoneOf[move.dest]) footprint.zoneWrites = @as(u9, 1) << @intCast(zoneOf[move.orig]) | @as(u9, 1) << @intCast(zoneOf[move.dest]);
+            if (board.AssumedPieceAt(move.orig) & 3 == 0) footprint.zoneReads = @as(u9, 1) << @intCast(zoneOf[move.orig]);
+            return footprint;
+        }
+    };
+
+    /// Whether the moves behind `a` and `b` reach the same position in either order, both orders being legal. Neither may remove a piece,
+    /// and neither may change a square or zone the other reads, so each is generated and applied the same before or after the other.
+    fn Commute(a: Footprint, b: Footprint) bool {
+        if (a.removes or b.removes) return false;
+        return a.writes & b.reads == 0 and b.writes & a.reads == 0 and a.zoneWrites & b.zoneReads == 0 and b.zoneWrites & a.zoneReads == 0;
+    }
+
     const Moves = struct {
         const PreCalc = struct {
             allies: BitBoard,
@@ -553,9 +1098,7 @@ pub const Board = struct {
                 const capturable = (killable & ~locker) | instakillable; //You can capture any target thats either killable or instakillable if its locking you
                 //std.debug.print("lockers: {x}\nkillable: {x}\ninsta: {x}\ncapable: {x}\n", .{locker, killable, instakillable, capturable});
 
-                var dests_ = bit;
-                if (lockbit == 0) dests_ = MoveConvolve(dests_) & ~precalc.blockers;
-                if (lockbit == 0) dests_ = MoveConvolve(dests_) & ~precalc.blockers | bit;
+                const dests_ = if (lockbit == 0) Reach.Reach2(hsb, precalc.blockers) else bit;
                 const move3 = MoveConvolve(dests_);
 
                 const movedests = move3 & ~precalc.blockers;
@@ -669,9 +1212,7 @@ pub const Board = struct {
                 const capturable = (killable & ~locker) | instakillable; //You can capture any target thats either killable or instakillable if its locking you
                 //std.debug.print("lockers: {x}\nkillable: {x}\ninsta: {x}\ncapable: {x}\n", .{locker, killable, instakillable, capturable});
 
-                var dests_ = bit;
-                if (lockbit == 0) dests_ = MoveConvolve(dests_) & ~precalc.blockers | bit;
-                if (zoneExc and lockbit == 0) dests_ = MoveConvolve(dests_) & ~precalc.blockers | bit;
+                const dests_ = if (lockbit != 0) bit else if (zoneExc) Reach.Reach2(hsb, precalc.blockers) else Reach.plus[hsb] & ~precalc.blockers | bit;
                 const move3 = MoveConvolve(dests_);
 
                 const movedests = move3 & ~precalc.blockers;
@@ -799,10 +1340,10 @@ pub const Board = struct {
                 //std.debug.print("lockers: {x}\nkillable: {x}\ninsta: {x}\ncapable: {x}\n", .{locker, killable, instakillable, capturable});
 
                 const dests_ = bit;
-                const move3 = MoveConvolve(dests_);
+                const move3 = Reach.plus[hsb];
 
                 const movedests = move3 & ~precalc.blockers;
-                const captars = MoveWideConvolve(dests_) & capturable;
+                const captars = Reach.square[hsb] & capturable;
 
                 
                 //Do captures
@@ -912,7 +1453,7 @@ pub const Board = struct {
                 //std.debug.print("lockers: {x}\nkillable: {x}\ninsta: {x}\ncapable: {x}\n", .{locker, killable, instakillable, capturable});
 
                 const dests_ = bit;
-                const move3 = MoveConvolve(dests_);
+                const move3 = Reach.plus[hsb];
 
                 const movedests = move3 & ~precalc.blockers;
                 const captars = move3 & capturable;
@@ -991,12 +1532,6 @@ inline fn MoveConvolve(x: BitBoard) BitBoard {
     return x | x << SHR | x << SHU | x >> SHR | x >> SHU;
 }
 
-inline fn MoveWideConvolve(x: BitBoard) BitBoard {
-    var ret = x | x << SHR | x >> SHR;
-    ret = ret | ret << SHU | ret >> SHU;
-    return ret;
-}
-
 fn BlockersForColor(self: Board, comptime color: comptime_int) BitBoard {
     var sum: BitBoard = 0;
     inline for (0..8) |i| {
@@ -1005,6 +1540,18 @@ fn BlockersForColor(self: Board, comptime color: comptime_int) BitBoard {
     return sum;
 }
 
+/// Xor of the keys of every set bit in `bits`
+fn XorKeys(keys: *const Zobrist.Keys, bits: BitBoard) u64 {
+    var hash: u64 = 0;
+    var bitset = bits;
+    while (bitset != 0) {
+        const hsb = LogHSB(bitset);
+        bitset ^= BB_ONE << hsb;
+        hash ^= keys[hsb];
+    }
+    return hash;
+}
+
 inline fn LogHSB(val: BitBoard) u7 {
     const bitSize = @bitSizeOf(BitBoard);
     return @intCast((bitSize - 1) - @clz(val));
@@ -1095,49 +1642,76 @@ fn ImportPtr(ptr: PYPTR) *Board {
     return @as(*Board, @ptrFromInt(ptr));
 }
 
+/// Board handles are recycled through a pool so short lived boards don't churn the allocator. Locked since handles are made from any thread.
+var gBoardPool: std.heap.MemoryPool(Board) = undefined;
+var gBoardPoolLock: std.Thread.Mutex = .{};
+
 pub export fn PyInitAlloc() void {
     gGpa = std.heap.GeneralPurposeAllocator(.{}).init;
     gAllocator = gGpa.allocator();
+    gBoardPool = std.heap.MemoryPool(Board).init(gAllocator);
     //Bot.Init();
 }
 
+/// The board is left uninitialized, see `PyInitBoardFromStr`
 pub export fn PyNewBoardHandle() PYPTR {
     const handle = _NewBoardHandle() catch if (DoValidation) @panic("New Board Handle failed.\n") else unreachable;
     //std.debug.print("Exporting {*} as {x}\n", .{handle, ExportPtr(handle)});
     return ExportPtr(handle);
 }
 fn _NewBoardHandle() !*Board {
-    const boardPtr = try gAllocator.create(Board);
+    gBoardPoolLock.lock();
+    defer gBoardPoolLock.unlock();
+    const boardPtr = try gBoardPool.create();
     return boardPtr;
 }
 
- pub export fn PyInitBoardFromStr(ptr: PYPTR, str: [*c]u8) void {
-    _ = str;
+/// Returns the handle to the pool, it must not be used afterwards
+pub export fn PyFreeBoardHandle(ptr: PYPTR) void {
+    gBoardPoolLock.lock();
+    defer gBoardPoolLock.unlock();
+    gBoardPool.destroy(ImportPtr(ptr));
+}
+
+/// New handle holding a copy of the board
+pub export fn PyCloneBoardHandle(ptr: PYPTR) PYPTR {
+    const handle = _NewBoardHandle() catch if (DoValidation) @panic("New Board Handle failed.\n") else unreachable;
+    handle.* = ImportPtr(ptr).*;
+    return ExportPtr(handle);
+}
+
+pub export fn PyCopyBoardInto(dst: PYPTR, src: PYPTR) void {
+    ImportPtr(dst).* = ImportPtr(src).*;
+}
+
+/// Sets the board from the 162 characters of `GenInitStr` with an optional `w` or `b` after them for the side to play, or the default board for an empty string.
+/// Returns 0 and leaves the board alone for any other length, a character out of place or a board `Board.CheckedFromStr` rejects.
+pub export fn PyInitBoardFromStr(ptr: PYPTR, str: [*c]u8) u8 {
     const iptr = ImportPtr(ptr);
-    iptr.* = Board.default;
- }
+    const len = std.mem.len(str);
+    if (len == 0) {
+        iptr.* = Board.default;
+        return 1;
+    }
+    if (len != 162 and !(len == 163 and (str[162] == 'w' or str[162] == 'b'))) return 0;
+    iptr.* = Board.CheckedFromStr(str[0..162].*, @intFromBool(len == 163 and str[162] == 'b')) catch return 0;
+    return 1;
+}
 
 pub export fn PyGenMoves(ptr: PYPTR, pos: u8) PYPTR {
-    std.debug.print("Called.\n", .{});
+    Stats.Log(.debug, "PyGenMoves at {}\n", .{pos});
     const bptr: *Board = ImportPtr(ptr);
-    var buffer = std.BoundedArray(PackedMove, 128).init(0) catch if (DoValidation) @panic("Buffer Init failed.\n") else unreachable;
+    var buffer = std.BoundedArray(PackedMove, MAXSINGLEMOVES).init(0) catch if (DoValidation) @panic("Buffer Init failed.\n") else unreachable;
 
     const Locals = struct {
         const Self = @This();
-        buffptr: *std.BoundedArray(PackedMove, 128),
+        buffptr: *std.BoundedArray(PackedMove, MAXSINGLEMOVES),
         pos: u7,
 
         fn BufferAppend(locals: Self, item: Move) void {
             // std.debug.print("Found move: {}\n", .{item});
-            const pi = PackedMove {
-                .orig = item.orig,
-                .atkdir = item.atkdir,
-                .dest = item.dest,
-                .doRet = item.doRet,
-                .kind = item.kind,
-            };
             if (item.orig == locals.pos)
-                locals.buffptr.appendAssumeCapacity(pi);
+                locals.buffptr.appendAssumeCapacity(PackedMove.FromMove(item));
         }
     };
 
@@ -1181,8 +1755,8 @@ pub export fn PyGenAllMoves(ptr: PYPTR, color: u8) void {
 
     const passed_ns = timer.read();
     //if (buffer.count != 3635) std.debug.panic("Array length was wrong, {} not 3635\n", .{buffer.count});
-    std.debug.print("Total double moves is: {}\n", .{context.count});
-    std.debug.print("Time took was {d:.6}ms each\n", .{@as(f64, @floatFromInt(passed_ns))/1000/std.time.ns_per_ms});
+    Stats.Log(.info, "Total double moves is: {}\n", .{context.count});
+    Stats.Log(.info, "Time took was {d:.6}ms each\n", .{@as(f64, @floatFromInt(passed_ns))/1000/std.time.ns_per_ms});
     return;
 }
 
@@ -1194,17 +1768,729 @@ pub export fn PyGenAllMoves(ptr: PYPTR, color: u8) void {
 
 pub export fn PyBoardApplyMove(ptr: PYPTR, mov: u32) void {
     const imove: PackedMove = @bitCast(mov);
-    const move = Move {
-        .orig = imove.orig,
-        .atkdir = imove.atkdir,
-        .dest = imove.dest,
-        .doRet = imove.doRet,
-        .kind = imove.kind,
+    ImportPtr(ptr).ApplyMove(imove.ToMove());
+}
+
+/// Applies `mov` and writes one entry per changed square to `buf` (121 u32 slots): pos | cell << 8 | locks << 16, coded as `CellCode` and `LocksAt` give them after the move. Returns the entry count.
+pub export fn PyBoardApplyMoveDelta(ptr: PYPTR, mov: u32, buf: PYPTR) u32 {
+    const bptr = ImportPtr(ptr);
+    const old = bptr.*;
+    const imove: PackedMove = @bitCast(mov);
+    bptr.ApplyMove(imove.ToMove());
+    return WriteDelta(bptr, old, buf);
+}
+
+/// Delta entries of every square that differs from `old`, nothing when `buf` is 0
+fn WriteDelta(board: *const Board, old: Board, buf: PYPTR) u32 {
+    if (buf == 0) return 0;
+    const out: [*]u32 = @ptrFromInt(buf);
+    var changed = board.ChangedSquares(old);
+    var count: u32 = 0;
+    while (changed != 0) : (changed &= changed - 1) {
+        const pos: u7 = @intCast(@ctz(changed));
+        out[count] = pos | @as(u32, board.CellCode(pos)) << 8 | @as(u32, board.LocksAt(pos)) << 16;
+        count += 1;
+    }
+    return count;
+}
+
+pub export fn PyBoardApplyFullMove(ptr: PYPTR, mov: u64) void {
+    ImportPtr(ptr).ApplyFullMove(FullMove.Unpack(mov));
+}
+
+/// 1 if only white has a king, -1 if only black does, 0 otherwise
+pub export fn PyBoardWinVal(ptr: PYPTR) i8 {
+    return ImportPtr(ptr).WinVal();
+}
+
+/// Uniformly random packed full move for the side to play, 0 if there is none
+pub export fn PyRandomFullMove(ptr: PYPTR, seed: u64) u64 {
+    var prng = std.Random.Xoroshiro128.init(seed);
+    const move = Playout.RandomFullMove(ImportPtr(ptr), prng.random()) orelse return 0;
+    return move.Pack();
+}
+
+pub export fn PyBoardLayoutVersion() u32 {
+    return Board.LAYOUTVERSION;
+}
+
+pub export fn PyBoardSize() u32 {
+    return @sizeOf(Board);
+}
+
+/// Copies the board's `PyBoardSize` bytes to `dst`
+pub export fn PyBoardStore(ptr: PYPTR, dst: PYPTR) void {
+    @as(*Board, @ptrFromInt(dst)).* = ImportPtr(ptr).*;
+}
+
+/// Loads `PyBoardSize` bytes from `src`. The hash, eval terms and mailbox are recomputed, so only the pieces, locks and side to play have to be right.
+/// Returns 0 and leaves the board alone if those are broken.
+pub export fn PyBoardLoad(ptr: PYPTR, src: PYPTR) u8 {
+    var board = @as(*const Board, @ptrFromInt(src)).*;
+    board.Restore() catch return 0;
+    ImportPtr(ptr).* = board;
+    return 1;
+}
+
+fn ImportHistory(hist: PYPTR) *History.History {
+    return @as(*History.History, @ptrFromInt(hist));
+}
+
+/// Empty move history, the board it records is passed to each call
+pub export fn PyNewHistory() PYPTR {
+    const hist = gAllocator.create(History.History) catch if (DoValidation) @panic("New History failed.\n") else unreachable;
+    hist.* = .{};
+    return @intFromPtr(hist);
+}
+
+pub export fn PyFreeHistory(hist: PYPTR) void {
+    const hptr = ImportHistory(hist);
+    hptr.deinit(gAllocator);
+    gAllocator.destroy(hptr);
+}
+
+pub export fn PyHistoryClear(hist: PYPTR) void {
+    ImportHistory(hist).Clear();
+}
+
+/// Applies `mov` to the board and records it, ending the turn after it if `endTurn`. Writes a delta to `buf` like `PyBoardApplyMoveDelta`.
+pub export fn PyHistoryPush(hist: PYPTR, ptr: PYPTR, mov: u32, endTurn: u8, buf: PYPTR) u32 {
+    const bptr = ImportPtr(ptr);
+    const old = bptr.*;
+    const imove: PackedMove = @bitCast(mov);
+    ImportHistory(hist).Push(gAllocator, bptr, imove.ToMove(), endTurn != 0) catch if (DoValidation) @panic("History push failed.\n") else unreachable;
+    return WriteDelta(bptr, old, buf);
+}
+
+pub export fn PyHistoryPushFull(hist: PYPTR, ptr: PYPTR, mov: u64) void {
+    ImportHistory(hist).PushFull(gAllocator, ImportPtr(ptr), FullMove.Unpack(mov)) catch if (DoValidation) @panic("History push failed.\n") else unreachable;
+}
+
+pub export fn PyHistoryUndo(hist: PYPTR, ptr: PYPTR, buf: PYPTR) u32 {
+    const bptr = ImportPtr(ptr);
+    const old = bptr.*;
+    _ = ImportHistory(hist).Undo(bptr);
+    return WriteDelta(bptr, old, buf);
+}
+
+pub export fn PyHistoryRedo(hist: PYPTR, ptr: PYPTR, buf: PYPTR) u32 {
+    const bptr = ImportPtr(ptr);
+    const old = bptr.*;
+    _ = ImportHistory(hist).Redo(bptr);
+    return WriteDelta(bptr, old, buf);
+}
+
+/// Undoes or redoes to `ply` and writes the delta from where it was
+pub export fn PyHistorySeek(hist: PYPTR, ptr: PYPTR, ply: u32, buf: PYPTR) u32 {
+    const bptr = ImportPtr(ptr);
+    const old = bptr.*;
+    ImportHistory(hist).Seek(bptr, ply);
+    return WriteDelta(bptr, old, buf);
+}
+
+pub export fn PyHistoryPly(hist: PYPTR) u32 {
+    return @intCast(ImportHistory(hist).ply);
+}
+
+pub export fn PyHistoryLen(hist: PYPTR) u32 {
+    return @intCast(ImportHistory(hist).entries.items.len);
+}
+
+/// 1 when the last applied ply is the first half of a turn
+pub export fn PyHistoryMidTurn(hist: PYPTR) u8 {
+    return @intFromBool(ImportHistory(hist).MidTurn());
+}
+
+/// Packed move of ply `idx`, which must be below `PyHistoryLen`
+pub export fn PyHistoryMove(hist: PYPTR, idx: u32) u32 {
+    return @bitCast(PackedMove.FromMove(ImportHistory(hist).entries.items[idx].move));
+}
+
+/// Static score for white, cheap enough to call every frame
+pub export fn PyBoardEval(ptr: PYPTR) i32 {
+    return ImportPtr(ptr).Evaluate();
+}
+
+/// Writes the weighted terms as an `EvalBreakdown` to `out`
+pub export fn PyBoardEvalBreakdown(ptr: PYPTR, out: PYPTR) void {
+    @as(*EvalBreakdown, @ptrFromInt(out)).* = ImportPtr(ptr).terms.Breakdown();
+}
+
+pub export fn PyBoardToPlay(ptr: PYPTR) u8 {
+    return ImportPtr(ptr).toPlay;
+}
+
+pub export fn PyBoardHash(ptr: PYPTR) u64 {
+    return ImportPtr(ptr).hash;
+}
+
+/// Shared transposition table, sized by `PyTTInit`
+pub var gTT: TT.TransTable = .{};
+
+/// Allocates `1 << sizeLog2` buckets. Returns 0, keeping the old table, if `sizeLog2` is above `TT.MAXSIZELOG2` or the table does not fit in memory.
+pub export fn PyTTInit(sizeLog2: u8) u8 {
+    if (sizeLog2 > TT.MAXSIZELOG2) return 0;
+    gTT.Init(gAllocator, @intCast(sizeLog2)) catch return 0;
+    return 1;
+}
+
+pub export fn PyTTClear() void {
+    gTT.Clear();
+}
+
+pub export fn PyTTStats(buf: PYPTR) void {
+    const out: *TT.Stats = @ptrFromInt(buf);
+    out.* = gTT.stats;
+}
+
+/// Turns the engine counters and phase timers on or off, they are off until enabled
+pub export fn PyStatsEnable(enabled: u8) void {
+    @atomicStore(bool, &Stats.gEnabled, enabled != 0, .monotonic);
+}
+
+/// Zeroes the engine counters, including the transposition table's
+pub export fn PyStatsReset() void {
+    Stats.Reset();
+    gTT.stats = .{ .buckets = gTT.buckets.len };
+}
+
+/// Writes a `Stats.Stats` to `buf`
+pub export fn PyStatsRead(buf: PYPTR) void {
+    const out: *Stats.Stats = @ptrFromInt(buf);
+    out.* = Stats.gStats;
+    out.ttProbes = gTT.stats.probes;
+    out.ttHits = gTT.stats.hits;
+}
+
+/// 0 off, 1 errors, 2 warnings, 3 info, 4 debug
+pub export fn PySetLogLevel(level: u8) void {
+    @atomicStore(Stats.LogLevel, &Stats.gLogLevel, @enumFromInt(@min(level, @intFromEnum(Stats.LogLevel.debug))), .monotonic);
+}
+
+/// Searches the side to play for up to `ms` milliseconds and `nodes` nodes (0 for no node limit), writing a `Search.Result` to `out`
+pub export fn PySearch(ptr: PYPTR, ms: u32, nodes: u64, out: PYPTR) void {
+    PySearchEx(ptr, ms, nodes, 0, out);
+}
+
+/// `PySearch` reporting to the `Search.Progress` at `progress` (0 for none), which another thread can watch and stop it through
+pub export fn PySearchEx(ptr: PYPTR, ms: u32, nodes: u64, progress: PYPTR, out: PYPTR) void {
+    if (gTT.buckets.len == 0 and PyTTInit(18) == 0) std.debug.panic("Transposition table init failed.\n", .{});
+    const result: *Search.Result = @ptrFromInt(out);
+    const limits = Search.Limits{
+        .ns = @as(u64, ms) * std.time.ns_per_ms,
+        .nodes = nodes,
+        .progress = if (progress == 0) null else @ptrFromInt(progress),
+    };
+    result.* = Search.Search(gAllocator, ImportPtr(ptr).*, &gTT, limits) catch |err| std.debug.panic("Search failed `{}`.\n", .{err});
+}
+
+/// Runs `n` random playouts from the board seeded by `seed`, writing a `Playout.BatchStats` to `out`
+pub export fn PyBatchPlayouts(ptr: PYPTR, n: u64, seed: u64, out: PYPTR) void {
+    const stats: *Playout.BatchStats = @ptrFromInt(out);
+    stats.* = Playout.Batch(ImportPtr(ptr).*, n, seed, Playout.MAXTURNS);
+}
+
+/// Leaf count `depth` plies below the board, `mode` 0 counting single moves and 1 full moves
+pub export fn PyPerft(ptr: PYPTR, depth: u32, mode: u8) u64 {
+    const perftMode = std.meta.intToEnum(Perft.Mode, mode) catch return 0;
+    return Perft.Perft(gAllocator, ImportPtr(ptr).*, depth, perftMode) catch |err| std.debug.panic("Perft failed `{}`.\n", .{err});
+}
+
+/// Perft below each root move, written to `moves` and `nodes` (`cap` u64 slots each). Returns the number of root moves, which may exceed `cap`.
+/// An unknown `mode` has no root moves.
+pub export fn PyPerftDivide(ptr: PYPTR, depth: u32, mode: u8, moves: PYPTR, nodes: PYPTR, cap: u32) u32 {
+    const perftMode = std.meta.intToEnum(Perft.Mode, mode) catch return 0;
+    const entries = Perft.Divide(gAllocator, ImportPtr(ptr).*, depth, perftMode) catch |err| std.debug.panic("Divide failed `{}`.\n", .{err});
+    defer gAllocator.free(entries);
+    for (entries[0..@min(cap, entries.len)], 0..) |entry, idx| {
+        @as([*]u64, @ptrFromInt(moves))[idx] = entry.move;
+        @as([*]u64, @ptrFromInt(nodes))[idx] = entry.nodes;
+    }
+    return @intCast(entries.len);
+}
+
+/// Writes packed moves into a caller owned buffer. Keeps counting once full so the caller can resize and retry.
+const MoveSink = struct {
+    buf: []u32,
+    count: usize = 0,
+
+    fn Init(buf: PYPTR, cap: u32) MoveSink {
+        if (cap == 0) return .{ .buf = &.{} };
+        const many: [*]u32 = @ptrFromInt(buf);
+        return .{ .buf = many[0..cap] };
+    }
+
+    fn PushSingle(sink: *MoveSink, move: Move) void {
+        if (sink.count < sink.buf.len) sink.buf[sink.count] = @bitCast(PackedMove.FromMove(move));
+        sink.count += 1;
+    }
+
+    /// Full moves take two consecutive slots, first move then second
+    fn PushFull(sink: *MoveSink, move: FullMove) void {
+        if (2 * sink.count + 1 < sink.buf.len) {
+            sink.buf[2 * sink.count] = @bitCast(PackedMove.FromMove(move.moves[0]));
+            sink.buf[2 * sink.count + 1] = @bitCast(PackedMove.FromMove(move.moves[1]));
+        }
+        sink.count += 1;
+    }
+};
+
+/// Runs MCTS on `threads` threads (0 for one per core). Writes up to `cap` root moves and their visit counts and returns the number of root moves.
+pub export fn PyMCTS(ptr: PYPTR, ms: u32, threads: u32, seed: u64, moves: PYPTR, visits: PYPTR, cap: u32) u32 {
+    const stats = Mcts.Run(gAllocator, ImportPtr(ptr).*, .{ .ns = @as(u64, ms) * std.time.ns_per_ms, .threads = threads, .seed = seed }) catch |err| std.debug.panic("MCTS failed `{}`.\n", .{err});
+    defer stats.deinit(gAllocator);
+    const count = @min(cap, stats.moves.len);
+    if (count != 0) {
+        @memcpy(@as([*]u64, @ptrFromInt(moves))[0..count], stats.moves[0..count]);
+        @memcpy(@as([*]u32, @ptrFromInt(visits))[0..count], stats.visits[0..count]);
+    }
+    return @intCast(stats.moves.len);
+}
+
+/// Fills `buf` (`cap` u32 slots) with every single move for `color`. Returns the total number of moves, which may exceed `cap`, or 0 for a color other than 0 or 1.
+pub export fn PyGenSingleMovesInto(ptr: PYPTR, color: u8, buf: PYPTR, cap: u32) u32 {
+    const timer = Stats.Start();
+    defer Stats.Stop(.generate, timer);
+    const bptr: *Board = ImportPtr(ptr);
+    var sink = MoveSink.Init(buf, cap);
+    switch (color) {
+        inline 0, 1 => |compColor| bptr.StreamAllSingleMoves(compColor, &sink, MoveSink.PushSingle) catch |err| if (DoValidation) std.debug.panic("Stream Single Moves threw `{}`.\n", .{err}) else unreachable,
+        else => return 0,
+    }
+    return @intCast(sink.count);
+}
+
+/// Fills `buf` (`cap` u32 slots) with every full move for `color` as pairs of packed moves. Returns the number of full moves, which may exceed `cap / 2`, or 0 for a color other than 0 or 1.
+pub export fn PyGenFullMovesInto(ptr: PYPTR, color: u8, buf: PYPTR, cap: u32) u32 {
+    const timer = Stats.Start();
+    defer Stats.Stop(.generate, timer);
+    const bptr: *Board = ImportPtr(ptr);
+    var sink = MoveSink.Init(buf, cap);
+    switch (color) {
+        inline 0, 1 => |compColor| bptr.StreamAllFullMoves(compColor, &sink, MoveSink.PushFull) catch |err| if (DoValidation) std.debug.panic("Stream Full Moves threw `{}`.\n", .{err}) else unreachable,
+        else => return 0,
+    }
+    return @intCast(sink.count);
+}
+
+/// `PyGenFullMovesInto` giving each resulting position once. Writes the raw and unique counts to `counts` (a `DedupCounts`) unless it is 0 or the color is bad.
+pub export fn PyGenUniqueFullMovesInto(ptr: PYPTR, color: u8, buf: PYPTR, cap: u32, counts: PYPTR) u32 {
+    const timer = Stats.Start();
+    defer Stats.Stop(.generate, timer);
+    const bptr: *Board = ImportPtr(ptr);
+    var sink = MoveSink.Init(buf, cap);
+    const dedup = switch (color) {
+        inline 0, 1 => |compColor| bptr.StreamUniqueFullMoves(gAllocator, compColor, &sink, MoveSink.PushFull) catch |err| std.debug.panic("Stream Unique Full Moves threw `{}`.\n", .{err}),
+        else => return 0,
     };
-    ImportPtr(ptr).ApplyMove(move);
+    if (counts != 0) @as(*DedupCounts, @ptrFromInt(counts)).* = dedup;
+    return @intCast(sink.count);
+}
+
+test "Batched move generation" {
+    var board = Board.default;
+    var buf: [256]u32 = undefined;
+    const nsingle = PyGenSingleMovesInto(@intFromPtr(&board), 0, @intFromPtr(&buf), buf.len);
+    try AssertEql(nsingle, PyGenSingleMovesInto(@intFromPtr(&board), 0, 0, 0));
+    for (buf[0..nsingle]) |mov| try std.testing.expect(@as(PackedMove, @bitCast(mov)).kind != .null);
+
+    const nfull = PyGenFullMovesInto(@intFromPtr(&board), 0, @intFromPtr(&buf), buf.len);
+    try std.testing.expect(nfull > buf.len / 2);
+    try AssertEql(5053, nfull);
+    try AssertEql(0, PyGenFullMovesInto(@intFromPtr(&board), 2, @intFromPtr(&buf), buf.len)); //Not a color
+}
+
+test "Unique full moves" {
+    const Collect = struct {
+        board: *const Board,
+        hashes: *std.AutoHashMap(u64, void),
+        count: *u64,
+
+        fn Add(ctx: @This(), move: FullMove) void {
+            var child = ctx.board.*;
+            child.ApplyFullMove(move);
+            ctx.hashes.put(child.hash, {}) catch unreachable;
+            ctx.count.* += 1;
+        }
+    };
+    var prng = std.Random.Xoroshiro128.init(5);
+    var board = Board.default;
+    for (0..4) |_| {
+        var all = std.AutoHashMap(u64, void).init(std.testing.allocator);
+        defer all.deinit();
+        var given = std.AutoHashMap(u64, void).init(std.testing.allocator);
+        defer given.deinit();
+        var raw: u64 = 0;
+        var unique: u64 = 0;
+        const counts = switch (board.toPlay) {
+            inline 0, 1 => |color| b: {
+                try board.StreamAllFullMoves(color, Collect{ .board = &board, .hashes = &all, .count = &raw }, Collect.Add);
+                break :b try board.StreamUniqueFullMoves(std.testing.allocator, color, Collect{ .board = &board, .hashes = &given, .count = &unique }, Collect.Add);
+            },
+            else => unreachable,
+        };
+        try AssertEql(raw, counts.raw);
+        try AssertEql(unique, counts.unique);
+        try AssertEql(all.count(), unique);
+        try AssertEql(unique, given.count());
+        try std.testing.expect(counts.commuting != 0 and unique < raw);
+        if (std.meta.eql(board, Board.default)) try AssertEql(1068, counts.commuting); //Of 2318 duplicates, these skip applying their second move
+        _ = Playout.Run(&board, prng.random(), 9);
+    }
+}
+
+test "Stats count moves by piece" {
+    var board = Board.default;
+    PyStatsEnable(1);
+    defer PyStatsEnable(0);
+    PyStatsReset();
+    defer PyStatsReset();
+    const nsingle = PyGenSingleMovesInto(@intFromPtr(&board), 0, 0, 0);
+    var stats: Stats.Stats = undefined;
+    PyStatsRead(@intFromPtr(&stats));
+    var total: u64 = 0;
+    for (stats.moves) |count| total += count;
+    try AssertEql(nsingle, total);
+    try std.testing.expect(stats.moves[0] != 0 and stats.ns[@intFromEnum(Stats.Phase.generate)] != 0);
+}
+
+/// What `PyAnalyzeBatch` finds for each board, mirrored by `zigwrap.BatchResult`
+pub const BatchResult = extern struct {
+    eval: i32, //Static score for white
+    fullMoves: u32, //Legal full moves for the side to play, 0 once the game is over
+    winner: i8, //1 white, -1 black, 0 while both kings stand
+    terminal: u8, //A king has fallen or the side to play has no move
+    invalid: u8 = 0, //The record's pieces, locks or side to play are broken, the other fields are left 0
+    _pad: [1]u8 = .{0},
+};
+
+const MAXBATCHTHREADS = 64;
+
+/// Record `idx` of back to back `PyBoardStore` records, which need not be aligned. Checked and rebuilt like `PyBoardLoad`, null if broken.
+fn BatchBoard(boards: PYPTR, idx: usize) ?Board {
+    const record: *align(1) const Board = @ptrFromInt(boards + idx * @sizeOf(Board));
+    var board = record.*;
+    board.Restore() catch return null;
+    return board;
+}
+
+/// Runs `Work(context, start, end)` over `0..count` split into one range per thread, 1 thread runs it on the caller's and 0 is one per core
+fn BatchFor(count: usize, threads: u32, context: anytype, comptime Work: fn (@TypeOf(context), usize, usize) void) void {
+    const wanted: usize = if (threads != 0) threads else std.Thread.getCpuCount() catch 1;
+    const threadCount = @max(1, @min(wanted, MAXBATCHTHREADS, count));
+    var spawned: [MAXBATCHTHREADS]std.Thread = undefined;
+    var started: usize = 0;
+    const chunk = count / threadCount;
+    var start = chunk + count % threadCount; //The caller's thread takes the first range and the remainder
+    for (1..threadCount) |_| {
+        spawned[started] = std.Thread.spawn(.{}, Work, .{ context, start, start + chunk }) catch break;
+        started += 1;
+        start += chunk;
+    }
+    Work(context, 0, chunk + count % threadCount);
+    if (start < count) Work(context, start, count); //Ranges whose thread did not spawn
+    for (spawned[0..started]) |thread| thread.join();
+}
+
+/// Evaluates `count` boards stored back to back at `boards` in one call, writing a `BatchResult` for each to `out`
+pub export fn PyAnalyzeBatch(boards: PYPTR, count: u64, out: PYPTR, threads: u32) void {
+    const Context = struct {
+        boards: PYPTR,
+        out: [*]BatchResult,
+
+        fn Work(ctx: @This(), start: usize, end: usize) void {
+            for (start..end) |idx| {
+                const board = BatchBoard(ctx.boards, idx) orelse {
+                    ctx.out[idx] = .{ .eval = 0, .fullMoves = 0, .winner = 0, .terminal = 0, .invalid = 1 };
+                    continue;
+                };
+                var sink = MoveSink.Init(0, 0);
+                const over = board.IsTerminal();
+                if (!over) switch (board.toPlay) {
+                    inline 0, 1 => |color| board.StreamAllFullMoves(color, &sink, MoveSink.PushFull) catch |err| if (DoValidation) std.debug.panic("Stream Full Moves threw `{}`.\n", .{err}) else unreachable,
+                    else => unreachable,
+                };
+                ctx.out[idx] = .{
+                    .eval = board.Evaluate(),
+                    .fullMoves = @intCast(sink.count),
+                    .winner = if (over) board.WinVal() else 0,
+                    .terminal = @intFromBool(over or sink.count == 0),
+                };
+            }
+        }
+    };
+    BatchFor(count, threads, Context{ .boards = boards, .out = @ptrFromInt(out) }, Context.Work);
+}
+
+/// Writes the full moves of each of `count` boards as pairs of packed moves into `buf`, those of board `i` from full move `offsets[i]` up to `offsets[i + 1]`.
+/// Size the ranges with `BatchResult.fullMoves`, a board with more moves than its range only has the first ones written.
+pub export fn PyBatchFullMoves(boards: PYPTR, count: u64, offsets: PYPTR, buf: PYPTR, threads: u32) void {
+    const Context = struct {
+        boards: PYPTR,
+        offsets: [*]const u64,
+        buf: PYPTR,
+
+        fn Work(ctx: @This(), start: usize, end: usize) void {
+            for (start..end) |idx| {
+                const board = BatchBoard(ctx.boards, idx) orelse continue;
+                if (board.IsTerminal()) continue;
+                const first = ctx.offsets[idx];
+                var sink = MoveSink.Init(ctx.buf + 8 * first, @intCast(2 * (ctx.offsets[idx + 1] - first)));
+                switch (board.toPlay) {
+                    inline 0, 1 => |color| board.StreamAllFullMoves(color, &sink, MoveSink.PushFull) catch |err| if (DoValidation) std.debug.panic("Stream Full Moves threw `{}`.\n", .{err}) else unreachable,
+                    else => unreachable,
+                }
+            }
+        }
+    };
+    BatchFor(count, threads, Context{ .boards = boards, .offsets = @ptrFromInt(offsets), .buf = buf }, Context.Work);
+}
+
+test "Batch analysis" {
+    var prng = std.Random.Xoroshiro128.init(9);
+    var boards: [12]Board = undefined;
+    for (&boards, 0..) |*board, idx| {
+        board.* = Board.default;
+        _ = Playout.Run(board, prng.random(), @intCast(idx * 7));
+    }
+    var single: [boards.len]BatchResult = undefined;
+    var threaded: [boards.len]BatchResult = undefined;
+    PyAnalyzeBatch(@intFromPtr(&boards), boards.len, @intFromPtr(&single), 1);
+    PyAnalyzeBatch(@intFromPtr(&boards), boards.len, @intFromPtr(&threaded), 4);
+    try AssertEql(single, threaded);
+    for (single) |result| try AssertEql(0, result.invalid);
+
+    var offsets: [boards.len + 1]u64 = undefined;
+    offsets[0] = 0;
+    for (single, 0..) |result, idx| {
+        var board = boards[idx];
+        try AssertEql(board.Evaluate(), result.eval);
+        const expected = if (board.IsTerminal()) 0 else PyGenFullMovesInto(@intFromPtr(&board), board.toPlay, 0, 0);
+        try AssertEql(expected, result.fullMoves);
+        offsets[idx + 1] = offsets[idx] + result.fullMoves;
+    }
+    const moves = try std.testing.allocator.alloc(u32, 2 * offsets[boards.len]);
+    defer std.testing.allocator.free(moves);
+    PyBatchFullMoves(@intFromPtr(&boards), boards.len, @intFromPtr(&offsets), @intFromPtr(moves.ptr), 3);
+    const last = boards.len - 1;
+    if (single[last].fullMoves != 0) {
+        var own: [2]u32 = undefined;
+        _ = PyGenFullMovesInto(@intFromPtr(&boards[last]), boards[last].toPlay, @intFromPtr(&own), own.len);
+        try AssertEql(own, moves[2 * offsets[last] ..][0..2].*);
+    }
+}
+
+test "Batch flags broken records" {
+    var boards = [3]Board{ Board.default, Board.default, Board.default };
+    boards[1].toPlay = 2;
+    var results: [boards.len]BatchResult = undefined;
+    PyAnalyzeBatch(@intFromPtr(&boards), boards.len, @intFromPtr(&results), 1);
+    try AssertEql([3]u8{ 0, 1, 0 }, [3]u8{ results[0].invalid, results[1].invalid, results[2].invalid });
+    try AssertEql(0, results[1].fullMoves);
+    try AssertEql(results[0], results[2]);
+
+    //The broken board's range is empty, the boards around it still get their moves
+    const offsets = [4]u64{ 0, results[0].fullMoves, results[0].fullMoves, 2 * results[0].fullMoves };
+    const moves = try std.testing.allocator.alloc(u32, 2 * offsets[3]);
+    defer std.testing.allocator.free(moves);
+    PyBatchFullMoves(@intFromPtr(&boards), boards.len, @intFromPtr(&offsets), @intFromPtr(moves.ptr), 1);
+    try std.testing.expectEqualSlices(u32, moves[0 .. 2 * offsets[1]], moves[2 * offsets[2] ..]);
+}
+
+test "Init string roundtrip" {
+    var prng = std.Random.Xoroshiro128.init(3);
+    var board = Board.default;
+    _ = Playout.Run(&board, prng.random(), 31); //Black to play with locks on the board
+    var buf: [162]u8 = undefined;
+    board.GenInitStr(&buf);
+    var back = Board.default;
+    back.InitFromStr(buf, @intCast(board.toPlay));
+    try AssertEql(board, back);
+}
+
+test "Init strings from outside are checked" {
+    var buf: [162]u8 = undefined;
+    Board.default.GenInitStr(&buf);
+    try AssertEql(Board.default, try Board.CheckedFromStr(buf, 0));
+
+    try std.testing.expectError(error.Bad_Piece_Char, Board.CheckedFromStr([1]u8{'!'} ** 162, 0));
+    try std.testing.expectError(error.Right_Lock_to_Blank, Board.CheckedFromStr([1]u8{'z'} ** 81 ++ [1]u8{'d'} ** 81, 0));
+    var lock = buf;
+    lock[81] = 'e';
+    try std.testing.expectError(error.Bad_Lock_Char, Board.CheckedFromStr(lock, 0));
+
+    var handle = Board.default;
+    var long = buf ++ "bx\x00".*;
+    try AssertEql(0, PyInitBoardFromStr(@intFromPtr(&handle), &long));
+    try AssertEql(0, handle.toPlay);
+    long[163] = 0;
+    try AssertEql(1, PyInitBoardFromStr(@intFromPtr(&handle), &long));
+    try AssertEql(1, handle.toPlay);
+}
+
+test "Board layout" {
+    try AssertEql(448, @sizeOf(Board));
+    try AssertEql(256, @offsetOf(Board, "lockright"));
+    try AssertEql(288, @offsetOf(Board, "hash"));
+    try AssertEql(296, @offsetOf(Board, "toPlay"));
+    try AssertEql(298, @offsetOf(Board, "terms"));
+    try AssertEql(14, @sizeOf(EvalTerms));
+    try AssertEql(312, @offsetOf(Board, "mailbox"));
+}
+
+test "Loading checks the record" {
+    var handle = Board.default;
+    var record = Board.default;
+    record.hash = 0;
+    record.mailbox = undefined; //Derived fields come back from the pieces
+    try AssertEql(1, PyBoardLoad(@intFromPtr(&handle), @intFromPtr(&record)));
+    try AssertEql(Board.default, handle);
+
+    var occupied: BitBoard = 0;
+    for (Board.default.pieces) |pieces| occupied |= pieces;
+    const bad = [_]Board{
+        b: {
+            var board = Board.default;
+            board.toPlay = 2;
+            break :b board;
+        },
+        b: {
+            var board = Board.default;
+            board.pieces[1] |= board.pieces[0];
+            break :b board;
+        },
+        b: {
+            var board = Board.default;
+            board.pieces[0] |= @as(BitBoard, 1) << 127; //Past the mailbox too
+            break :b board;
+        },
+        b: {
+            var board = Board.default;
+            board.lockright |= @as(BitBoard, 1) << @intCast(@ctz(PLAYABLE & ~occupied));
+            break :b board;
+        },
+    };
+    handle.toPlay = 1;
+    for (bad) |board| {
+        try AssertEql(0, PyBoardLoad(@intFromPtr(&handle), @intFromPtr(&board)));
+        try AssertEql(1, handle.toPlay); //Left alone
+    }
+}
+
+test "Changed squares" {
+    const Locals = struct {
+        fn Check(board: *const Board, move: Move) void {
+            var newstate = board.*;
+            newstate.ApplyMove(move);
+            const changed = newstate.ChangedSquares(board.*);
+            for (0..121) |pos_| {
+                const pos: u7 = @intCast(pos_);
+                const differs = board.CellCode(pos) != newstate.CellCode(pos) or board.LocksAt(pos) != newstate.LocksAt(pos);
+                if (differs != (Bit(changed, pos) == 1)) std.debug.panic("Square {} misreported after {}\n", .{ pos, move });
+            }
+        }
+    };
+    var prng = std.Random.Xoroshiro128.init(7);
+    var board = Board.default;
+    for (0..20) |_| {
+        switch (board.toPlay) {
+            inline 0, 1 => |color| try board.StreamAllSingleMoves(color, &board, Locals.Check),
+            else => unreachable,
+        }
+        _ = Playout.Run(&board, prng.random(), 1);
+    }
+}
+
+test "Incremental hash" {
+    const Locals = struct {
+        fn Check(board: *const Board, move: Move) void {
+            var newstate = board.*;
+            newstate.ApplyMove(move);
+            if (newstate.hash != newstate.ComputeHash()) std.debug.panic("Hash drifted after {}\n", .{move});
+            if (newstate.hash == board.hash) std.debug.panic("Hash unchanged after {}\n", .{move});
+        }
+    };
+    const board = Board.default;
+    try board.StreamAllSingleMoves(0, &board, Locals.Check);
+    try board.StreamAllSingleMoves(1, &board, Locals.Check);
+
+    const fullmove = FullMove{ .moves = .{ .{ .kind = .train, .orig = 4, .dest = 4, .doRet = false }, .{ .kind = .move, .orig = 1, .dest = 12, .doRet = false } } };
+    var turned = board;
+    turned.ApplyFullMove(fullmove);
+    try AssertEql(turned.ComputeHash(), turned.hash);
+    try AssertEql(fullmove, FullMove.Unpack(fullmove.Pack()));
+}
+
+test "Mailbox follows the bitboards" {
+    const Locals = struct {
+        fn Check(board: *const Board, move: Move) void {
+            var newstate = board.*;
+            const undo = newstate.MakeUndo(move);
+            newstate.ApplyMove(move);
+            if (!std.mem.eql(u8, &newstate.mailbox, &newstate.ComputeMailbox())) std.debug.panic("Mailbox drifted after {}\n", .{move});
+            newstate.Unmake(undo);
+            if (!std.mem.eql(u8, &newstate.mailbox, &board.mailbox)) std.debug.panic("Mailbox not restored after {}\n", .{move});
+        }
+    };
+    var prng = std.Random.Xoroshiro128.init(17);
+    for (0..4) |_| {
+        var board = Board.default;
+        for (0..40) |_| {
+            if (board.IsTerminal()) break;
+            switch (board.toPlay) {
+                inline 0, 1 => |color| try board.StreamAllSingleMoves(color, &board, Locals.Check),
+                else => unreachable,
+            }
+            const move = Playout.RandomFullMove(&board, prng.random()) orelse break;
+            board.ApplyFullMove(move);
+        }
+    }
+}
+
+test "Only the target of a lock counts as locked" {
+    const Locals = struct {
+        fn Locked(white: []const u8, black: []const u8, right: bool) !i8 {
+            var board = Board{ .lockright = 0, .lockup = 0, .pieces = [1]BitBoard{0} ** 16, .toPlay = 0, .hash = 0 };
+            board.pieces[Board.GetBoardIdx("king", false, 0)] |= BB_ONE << 0;
+            board.pieces[Board.GetBoardIdx("king", false, 1)] |= BB_ONE << (8 * SHU + 8);
+            const pos: u7 = 4 * SHU + 4;
+            const other: u7 = if (right) pos + SHR else pos + SHU;
+            inline for (.{ "inf", "cav", "art" }) |name| {
+                if (std.mem.eql(u8, white, name)) board.pieces[Board.GetBoardIdx(name, false, 0)] |= BB_ONE << pos;
+                if (std.mem.eql(u8, black, name)) board.pieces[Board.GetBoardIdx(name, false, 1)] |= BB_ONE << other;
+            }
+            if (right) board.lockright |= BB_ONE << pos else board.lockup |= BB_ONE << pos;
+            try board.Restore();
+            return board.terms.locked;
+        }
+    };
+    try AssertEql(1, try Locals.Locked("inf", "art", true)); //Black's artillery is held by white's infantry
+    try AssertEql(-1, try Locals.Locked("art", "cav", false));
+    try AssertEql(0, try Locals.Locked("cav", "cav", true));
+}
+
+test "Incremental eval" {
+    try AssertEql(0, Board.default.Evaluate());
+    var prng = std.Random.Xoroshiro128.init(13);
+    for (0..8) |_| {
+        var board = Board.default;
+        for (0..60) |_| {
+            if (board.IsTerminal()) break;
+            const move = Playout.RandomFullMove(&board, prng.random()) orelse break;
+            board.ApplyFullMove(move);
+            try AssertEql(board.ComputeTerms(), board.terms);
+        }
+    }
 }
 
 test "Test all" {
+    _ = TT;
+    _ = Search;
+    _ = Mcts;
+    _ = Playout;
+    _ = Perft;
+    _ = History;
+    _ = Stats;
     std.testing.refAllDeclsRecursive(@This());
 }
 
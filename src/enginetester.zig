@@ -7,7 +7,7 @@ pub fn main() !void {
     EngineLib.PyInitAlloc();
     const handle = EngineLib.PyNewBoardHandle();
     var str  = "".*;
-    EngineLib.PyInitBoardFromStr(handle, &str);
+    _ = EngineLib.PyInitBoardFromStr(handle, &str);
     _ = EngineLib.PyGenMoves(handle, 1);
     var init: [182] u8 = @splat('\x01');
     _ = EngineLib.PyGenInitStr(handle, @intFromPtr(&init));
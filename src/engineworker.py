@@ -0,0 +1,110 @@
+"""Engine searches on a background thread, so a frame loop only has to poll.
+
+ctypes releases the GIL for the length of a foreign call, so while the worker sits in `ZigSearchEx`
+the caller's thread runs freely and can read the search's progress or stop it.
+"""
+import queue
+import threading
+from zigwrap import *
+
+PONDER_MS = 0xFFFFFFFF #Pondering runs until stopped
+
+class _Job:
+    def __init__(self, handle: PyPtr, ms: int, nodes: int, ponder: bool):
+        self.handle = handle #A clone, owned and freed by the worker
+        self.ms = ms
+        self.nodes = nodes
+        self.ponder = ponder
+        self.progress = SearchProgress()
+        self.cancelled = False
+
+    def Stop(self):
+        self.progress.stop = 1
+
+def BookResult(move: int) -> dict:
+    """A book move dressed as a `ZigSearch` result, nothing searched"""
+    result = {name: 0 for name, _ in SearchResult._fields_}
+    result |= {'move': move, 'moves': (move & 0xFFFFFFFF, move >> 32), 'book': True}
+    return result
+
+class EngineWorker:
+    """Runs one search at a time on its own copy of the board.
+
+    `Start` searches for a move, `Ponder` searches the position on the opponent's time until stopped, which fills the
+    shared transposition table for the search that follows. A new request supersedes whatever is running.
+    Given an `OpeningBook`, `Start` plays its move for positions in the book without searching, as long as the move is legal.
+    """
+    def __init__(self, book=None):
+        self.book = book
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._job = None #Latest requested job, the one `progress` reports on
+        self._thread = threading.Thread(target=self._Run, name='engine', daemon=True)
+        self._thread.start()
+
+    def Start(self, handle: PyPtr, ms: int, nodes: int = 0, history: PyPtr | None = None):
+        """Searches the side to play of the board behind `handle` as it is now, the board can change meanwhile.
+        Given the `history` the board is played through, raises ValueError if it stands between the two moves of a turn,
+        as the full move found would be played on top of the half already made."""
+        if history is not None and ZigHistoryMidTurn(history): raise ValueError('board is between the two moves of a turn')
+        move = self.book.PickFor(handle) if self.book is not None else 0 #Searched as usual when the book has no legal move
+        if move:
+            self.Cancel()
+            job = _Job(0, 0, 0, ponder=False)
+            self._job = job
+            self._results.put((job, BookResult(move)))
+            return
+        self._Submit(_Job(ZigCloneBoardHandle2(handle), ms, nodes, ponder=False))
+
+    def Ponder(self, handle: PyPtr):
+        self._Submit(_Job(ZigCloneBoardHandle2(handle), PONDER_MS, 0, ponder=True))
+
+    def Stop(self):
+        """Ends the current search early, its best move so far still comes out of `Poll`"""
+        if self._job: self._job.Stop()
+
+    def Cancel(self):
+        """Ends the current search and drops its result"""
+        if self._job:
+            self._job.cancelled = True
+            self._job.Stop()
+            self._job = None
+
+    @property
+    def thinking(self) -> bool:
+        return self._job is not None and not self._job.ponder
+
+    @property
+    def pondering(self) -> bool:
+        return self._job is not None and self._job.ponder
+
+    @property
+    def progress(self) -> SearchProgress | None:
+        return self._job.progress if self._job else None
+
+    def Poll(self) -> dict | None:
+        """Result of a finished search as `ZigSearch` gives it, None while there is none. Pondering never produces one."""
+        while True:
+            try: job, result = self._results.get_nowait()
+            except queue.Empty: return None
+            if job is self._job: self._job = None
+            if not job.cancelled and not job.ponder: return result
+
+    def Close(self):
+        self.Cancel()
+        if self.book is not None: self.book.Close()
+        self._jobs.put(None)
+        self._thread.join()
+
+    def _Submit(self, job: _Job):
+        self.Cancel()
+        self._job = job
+        self._jobs.put(job)
+
+    def _Run(self):
+        while (job := self._jobs.get()) is not None:
+            try:
+                result = None if job.cancelled else ZigSearchEx(job.handle, job.ms, job.progress, job.nodes)
+            finally:
+                ZigFreeBoardHandle2(job.handle)
+            self._results.put((job, result))
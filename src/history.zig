@@ -0,0 +1,137 @@
+const std = @import("std");
+const Engine = @import("engine2.zig");
+const AssertEql = std.testing.expectEqual;
+
+const Board = Engine.Board;
+const Move = Engine.Move;
+const FullMove = Engine.FullMove;
+
+///////////////////////////////////////////////////////////////////////////
+
+/// One applied single move and what it takes to unmake it
+pub const Entry = struct {
+    move: Move,
+    endTurn: bool, //Whether the turn was handed over after the move
+    undo: Board.Undo,
+};
+
+/// The single moves played on a board, with a cursor so takebacks can be redone.
+/// The board is passed to every call rather than owned, so one history can drive a board shared with the engine.
+pub const History = struct {
+    const Self = @This();
+
+    entries: std.ArrayListUnmanaged(Entry) = .empty,
+    ply: usize = 0, //Entries before this are applied to the board, the rest can be redone
+
+    pub fn deinit(self: *Self, allocator: std.mem.Allocator) void {
+        self.entries.deinit(allocator);
+    }
+
+    /// Forgets every move, for when the board is replaced
+    pub fn Clear(self: *Self) void {
+        self.entries.clearRetainingCapacity();
+        self.ply = 0;
+    }
+
+    /// Applies `move` and records it. Moves that were undone are dropped, like any editor's redo stack.
+    pub fn Push(self: *Self, allocator: std.mem.Allocator, board: *Board, move: Move, endTurn: bool) !void {
+        try self.entries.ensureTotalCapacity(allocator, self.ply + 1);
+        self.entries.shrinkRetainingCapacity(self.ply);
+        self.entries.appendAssumeCapacity(.{ .move = move, .endTurn = endTurn, .undo = board.MakeUndo(move) });
+        self.ply += 1;
+        board.ApplyMove(move);
+        if (endTurn) board.EndTurn();
+    }
+
+    /// Two plies, the turn ending after the second
+    pub fn PushFull(self: *Self, allocator: std.mem.Allocator, board: *Board, move: FullMove) !void {
+        try self.Push(allocator, board, move.moves[0], false);
+        try self.Push(allocator, board, move.moves[1], true);
+    }
+
+    /// Whether the last applied ply is the first half of a turn, so the next one ends it
+    pub fn MidTurn(self: Self) bool {
+        return self.ply != 0 and !self.entries.items[self.ply - 1].endTurn;
+    }
+
+    /// False when at the start
+    pub fn Undo(self: *Self, board: *Board) bool {
+        if (self.ply == 0) return false;
+        self.ply -= 1;
+        board.Unmake(self.entries.items[self.ply].undo);
+        return true;
+    }
+
+    /// False when at the end
+    pub fn Redo(self: *Self, board: *Board) bool {
+        if (self.ply == self.entries.items.len) return false;
+        const entry = self.entries.items[self.ply];
+        self.ply += 1;
+        board.ApplyMove(entry.move);
+        if (entry.endTurn) board.EndTurn();
+        return true;
+    }
+
+    /// Undoes or redoes to `ply`, clamped to the recorded moves. Costs one step per ply moved, never a replay from the start.
+    pub fn Seek(self: *Self, board: *Board, ply: usize) void {
+        const target = @min(ply, self.entries.items.len);
+        while (self.ply > target) _ = self.Undo(board);
+        while (self.ply < target) _ = self.Redo(board);
+    }
+};
+
+///////////////////////////////////////////////////////////////////////////
+
+test "Undo restores every ply" {
+    const Playout = @import("playout.zig");
+    const allocator = std.testing.allocator;
+    var prng = std.Random.Xoroshiro128.init(7);
+    var board = Board.default;
+    var history = History{};
+    defer history.deinit(allocator);
+
+    var states = std.ArrayList(Board).init(allocator);
+    defer states.deinit();
+    try states.append(board);
+    for (0..60) |_| {
+        if (board.IsTerminal()) break;
+        const move = Playout.RandomFullMove(&board, prng.random()) orelse break;
+        try history.Push(allocator, &board, move.moves[0], false);
+        try states.append(board);
+        try history.Push(allocator, &board, move.moves[1], true);
+        try states.append(board);
+    }
+
+    const end = history.ply;
+    while (history.Undo(&board)) try AssertEql(states.items[history.ply], board);
+    try AssertEql(0, history.ply);
+    history.Seek(&board, end);
+    try AssertEql(states.items[end], board);
+    history.Seek(&board, end / 2);
+    try AssertEql(states.items[end / 2], board);
+    try std.testing.expect(history.Redo(&board));
+    try AssertEql(states.items[end / 2 + 1], board);
+}
+
+test "Push after undo drops the redo moves" {
+    const allocator = std.testing.allocator;
+    var board = Board.default;
+    var history = History{};
+    defer history.deinit(allocator);
+    const Locals = struct {
+        fn Handle(first: *?FullMove, move: FullMove) void {
+            if (first.* == null) first.* = move;
+        }
+    };
+    var first: ?FullMove = null;
+    try board.StreamAllFullMoves(0, &first, Locals.Handle);
+    try history.PushFull(allocator, &board, first.?);
+    try AssertEql(1, board.toPlay);
+    try std.testing.expect(history.Undo(&board));
+    try history.Push(allocator, &board, first.?.moves[1], false);
+    try AssertEql(2, history.ply);
+    try AssertEql(2, history.entries.items.len);
+    try AssertEql(0, board.toPlay); //The replacement did not end the turn
+    try std.testing.expect(history.MidTurn());
+    try std.testing.expect(!history.Redo(&board));
+}
@@ -1,195 +1,129 @@
 import pygame
+import logging
+import os
 from math import sqrt, cos, pi
 from zigwrap import *
+from engineworker import EngineWorker
+from book import OpeningBook
+from archive import GameArchive, StartOf
+from atlas import LoadAtlas
+from animation import Animator, PlanMove
 
-type Num = int | float
-
-gInitTicksPerAnimMove = 60
-
-gTicksPerAnimMove = None #Set
-
-gAnimVars = {}
-gAnimQueue = []
+REPLAY_SPEED = 4 #Replaying the rest of the history plays every move this much faster
+BOOK_PATH = os.environ.get('REGALIA_BOOK', 'book.bin') #The engine plays from it while the position is in it
+ARCHIVE_PATH = os.environ.get('REGALIA_ARCHIVE', 'games.rga') #Games are appended on quit
 
 def DrawPiece(piece, x, y):
     screen.blit(piece, (latoff + 80*x, veroff + 80*y))
 
-def Smooth(x: float):
-    if x > .5: return 1-Smooth(1-x)
-    return 2*x*x
-
-def Pointed(x: float):
-    if x > .5: return Pointed(1-x)
-    return 4*x*x
-
-def SmoothInto(x: float):
-    return 1-(1-x)*(1-x)
-
-# Return the moves nesisary to get to the target. If the target is an edge, it moves to the free cell and makes `atk` the occupied cell
-# Turns multiple moves in the same direction into one
-def CalcAnimMove(origPos, movTar):
-    if movTar[0] % 1 == .5:
-        movTars = [(int(movTar[0]-.5), movTar[1]), (int(movTar[0]+.5), movTar[1])]
-    elif movTar[1] % 1 == .5:
-        movTars = [(movTar[0], int(movTar[1]-.5)), (movTar[0], int(movTar[1]+.5))]
-    else:
-        movTars = [movTar]
-
-    #print(movTars)
-
-    front = [(origPos, -1, ((origPos, -1),))]
-    while front != []:
-        nmov = front[0]
-        del front[0]
-        ndirs = [0, 1, 2, 3]
-        
-        if nmov[1] in ndirs:
-            ndirs.remove(nmov[1])
-            dir = nmov[1]
-            dx, dy = [(1, 0), (0, 1), (-1, 0), (0, -1)][dir]
-            npos = (nmov[0][0]+dx, nmov[0][1]+dy)
-            if npos not in board or npos in movTars:
-                nnmov = (npos, dir, nmov[2]+((npos, dir),))
-                if npos in movTars: break
-                front.append(nnmov)
-
-
-        for dir in ndirs:
-            dx, dy = [(1, 0), (0, 1), (-1, 0), (0, -1)][dir]
-            npos = (nmov[0][0]+dx, nmov[0][1]+dy)
-            if npos not in board or npos in movTars:
-                nnmov = (npos, dir, nmov[2]+((npos, dir),))
-                if npos in movTars: break
-                front.append(nnmov)
-        else: continue
-        break
-    else: assert False
-    movs = []
-    dir = None
-    atk = [x for x in movTars if x != nnmov[0]]
-    for (ndest, ndir) in nnmov[2]:
-        #if ndest in board and ndest in movTars: break
-        if dir == ndir:
-            del movs[-1]
-        movs.append(ndest)
-        dir = ndir
-    return movs, atk
-    #print(movs, atk)
-
-def SetupAnimMove(decrown: bool, origPos: tuple[Num, Num], movTar: tuple[Num, Num]):
-    global gTicksPerAnimMove, gAnimCounter
-    gIsAnimating = True
-
-    movs, atk = CalcAnimMove(origPos, movTar)
-    tScale = sqrt(len(movs))
-    gTicksPerAnimMove = int(gInitTicksPerAnimMove / tScale)
-
-    animQueue = []
-
-    if decrown:
-        animQueue.append(('dc', origPos))
-        assert movTar != origPos
-    if movTar == origPos: #Code for adding a crown
-        animQueue.append(('ac', origPos))
-    else:
-        pmov = movs[0]
-        for mov in movs[1:]:
-            animQueue.append(('mov', (pmov, mov)))
-            pmov = mov
-        if board.get(mov, '  ')[0] == board[origPos][0]: #Capturing own piece, aka combat swap
-            animQueue[-1] = ('swp', (origPos, mov))
-
-        if atk != []:
-            animQueue.append(('atk', (pmov, atk[0])))
-    return animQueue
-
-def DoAnimate():
-    global gAnimCounter, gIsAnimating, gTmpRep, deco
-    if len(gAnimQueue) > 0:
-        if not gIsAnimating: gAnimCounter = 0
-        gIsAnimating = True
-    
-    if not gIsAnimating: return
-    startOfAnim = gAnimCounter == 0
-    gAnimCounter += 1
-    endOfAnim = gAnimCounter == gTicksPerAnimMove
-    animProg = gAnimCounter / gTicksPerAnimMove
-    anim = gAnimQueue[0]
-    if anim[0] == 'mov':
-        animVal = Smooth(animProg)
-        if startOfAnim:
-            idx ,= [i for i,p in enumerate(pieces) if p[1] == anim[1][0]]
-            pieces.append(pieces[idx])
-            del pieces[idx]
-        pieces[-1][1] = Lerp(anim[1][0], anim[1][1], animVal)
-        if endOfAnim:
-            board[anim[1][1]] = board[anim[1][0]]
-            del board[anim[1][0]]
-    elif anim[0] == 'atk':
-        animVal = .25 * Pointed(animProg)
-        if startOfAnim:
-            gAnimVars['didHalf'] = False
-            idx ,= [i for i,p in enumerate(pieces) if p[1] == anim[1][0]]
-            pieces.append(pieces[idx])
-            del pieces[idx]
-        if animProg > .5:
-            if not gAnimVars['didHalf']:
-                gAnimVars['didHalf'] = True
-                gTmpRep = 'hl' if anim[1][0][0] == anim[1][1][0] else 'vl'
-                tmp = psprites['tmp'] = psprites[gTmpRep].copy()
-                deco.append(('tmp', Lerp(anim[1][0], anim[1][1], .5)))
-            psprites['tmp'].set_alpha(int(Lerp(50, 255, SmoothInto(2*(animProg-.5)))))
-        pieces[-1][1] = Lerp(anim[1][0], anim[1][1], animVal)
-    elif anim[0] == 'ac':
-        if startOfAnim:
-            psprites['tmp'] = regalia.copy()
-            deco.append(('tmp', anim[1]))
-        psprites['tmp'].set_alpha(int(Lerp(50, 255, SmoothInto(animProg))))
-        if endOfAnim:
-            del deco[-1]
-            idx ,= [i for i,p in enumerate(pieces) if p[1] == anim[1]]
-            pieces[idx][2] = True
-    elif anim[0] == 'dc':
-        if startOfAnim:
-            idx ,= [i for i,p in enumerate(pieces) if p[1] == anim[1]]
-            pieces[idx][2] = False
-            psprites['tmp'] = regalia.copy()
-            deco.append(('tmp', anim[1]))
-        psprites['tmp'].set_alpha(int(Lerp(255, 0, SmoothInto(animProg))))
-        if endOfAnim:
-            del deco[-1]
-    elif anim[0] == 'swp':
-        animVal = Smooth(animProg)
-        if startOfAnim:
-            idx0 ,= [i for i,p in enumerate(pieces) if p[1] == anim[1][0]]
-            pieces.append(pieces[idx0])
-            del pieces[idx0]
-            idx1 ,= [i for i,p in enumerate(pieces) if p[1] == anim[1][1]] 
-            pieces.append(pieces[idx1])
-            del pieces[idx1]
-        pieces[-1][1] = Lerp(anim[1][0], anim[1][1], 1-animVal)
-        pieces[-2][1] = Lerp(anim[1][0], anim[1][1], animVal)
-        if endOfAnim:
-            board[anim[1][1]], board[anim[1][0]] = board[anim[1][0]], board[anim[1][1]]
-    else: assert False
-    if endOfAnim:
-        gAnimCounter = 0
-        del gAnimQueue[0]
-        gIsAnimating = False
-        pieces[-1][1] = tuple([int(x) for x in pieces[-1][1]])
-        idxs = [i for i,x in enumerate(deco) if x[0] == 'tmp']
-        for idx in idxs:
-            deco[idx] = (gTmpRep, deco[idx][1])
-
-def Lerp(a, b, t):
-    assert type(a) == type(b)
-    isSingle = type(a) in [int, float]
-    r_ = [_Lerp(a_, b_, t) for a_, b_ in zip([a] if isSingle else a, [b] if isSingle else b)]
-    if isSingle: return r_[0]
-    return r_
-
-def _Lerp(a, b, t):
-    return a*(1-t) + b*t
+def RenderBackground() -> pygame.Surface:
+    """Cells and zone dividers, drawn once and blitted back under whatever moves"""
+    surf = pygame.Surface((screenwidth, screenheight)).convert()
+    surf.fill((0, 0, 0))
+    for col in range(9):
+        for row in range(9):
+            idx = (col ^ row) & 1
+            sprite = [light_cell, dark_cell][idx]
+            surf.blit(sprite, (latoff + 80*col, veroff + 80*row))
+
+    pygame.draw.rect(surf, [40]*3, (latoff+80*3-3, veroff, 6, 80*9))
+    pygame.draw.rect(surf, [40]*3, (latoff+80*6-3, veroff, 6, 80*9))
+    pygame.draw.rect(surf, [40]*3, (latoff, veroff+80*3-3, 80*9, 6))
+    pygame.draw.rect(surf, [40]*3, (latoff, veroff+80*6-3, 80*9, 6))
+    return surf
+
+def FrameItems() -> list:
+    """Everything drawn over the background this frame as (sprite, pos), in draw order"""
+    items = []
+    moving = [] #Drawn last, over whatever they pass
+    for piece, pos, crown in pieces:
+        drawn = gAnimator.positions.get(pos)
+        layer = items if drawn is None else moving
+        layer.append((psprites[piece], tuple(drawn or pos)))
+        if crown and pos not in gAnimator.hiddenCrowns:
+            layer.append((regalia, tuple(drawn or pos)))
+    for piece, pos in deco:
+        if pos not in gAnimator.hiddenDeco:
+            items.append((psprites[piece], tuple(pos)))
+    items.extend(gAnimator.effects)
+    items.extend(moving)
+    for pos, rp, _, _, _ in moveInfo:
+        items.append((rp, tuple(pos)))
+    overlay = EngineOverlay()
+    if overlay: items.append((overlay, ((10 - latoff)/80, (10 - veroff)/80)))
+    items.extend(EvalItems())
+    return items
+
+gEvalItems = (None, [])
+
+def EvalItems() -> list:
+    """Eval bar left of the board and a line with the term breakdown under it. Only rebuilt when the eval changes."""
+    global gEvalItems
+    breakdown = ZigEvalBreakdown(state.handle)
+    key = tuple(breakdown.values())
+    if gEvalItems[0] != key:
+        share = 1 / (1 + 10 ** (-breakdown['total'] / 800)) #White's expected share
+        bar = pygame.Surface((20, 80*9)).convert()
+        bar.fill((30, 30, 30))
+        bar.fill((235, 235, 235), (0, 0, 20, round(share * 80*9))) #White plays from the top
+        text = '   '.join(f'{name} {value:+}' for name, value in breakdown.items())
+        line = gFont.render(text, True, (230, 230, 230))
+        gEvalItems = (key, [(bar, ((50 - latoff)/80, 0)), (line, ((10 - latoff)/80, (80*9 + 12)/80))])
+    return gEvalItems[1]
+
+def FormatMove(move: int) -> str:
+    """Packed full move as `orig-dest` squares, column letter then row from white's side"""
+    halves = []
+    for half in (move & 0xFFFFFFFF, move >> 32):
+        fields = DecodeMove(half)
+        if fields['kind'] == 0: continue
+        halves.append('-'.join('abcdefghi'[sq % 11] + str(sq // 11 + 1) for sq in (fields['orig'], fields['dest'])))
+    return ' '.join(halves) or '--'
+
+gOverlay = (None, None)
+
+def EngineOverlay() -> pygame.Surface | None:
+    """Line describing the running search. The surface is kept while the text is unchanged, so the dirty rects skip it."""
+    global gOverlay
+    progress = gEngine.progress
+    if progress is None: return None
+    text = f'{"pondering" if gEngine.pondering else "thinking"}  depth {progress.depth}  {progress.nodes:,} nodes'
+    if progress.move: text += f'  best {FormatMove(progress.move)}  {progress.score:+}'
+    if gOverlay[0] != text: gOverlay = (text, gFont.render(text, True, (230, 230, 230)))
+    return gOverlay[1]
+
+def ItemRect(item) -> pygame.Rect:
+    sprite, (x, y) = item
+    return pygame.Rect(int(latoff + 80*x), int(veroff + 80*y), *sprite.get_size())
+
+def DirtyRects(prevItems: list, items: list) -> list:
+    """Rects of items that appeared, vanished or moved, plus fading animation sprites"""
+    prevKeys = {(id(sprite), pos) for sprite, pos in prevItems}
+    keys = {(id(sprite), pos) for sprite, pos in items}
+    fading = {id(sprite) for sprite, _ in gAnimator.effects}
+    rects = [ItemRect(item) for item in prevItems if (id(item[0]), item[1]) not in keys]
+    rects += [ItemRect(item) for item in items if (id(item[0]), item[1]) not in prevKeys or id(item[0]) in fading]
+    return rects
+
+def AnimateMove(move: int, speed: float = 1.):
+    """Applies a single move and animates it alongside whatever is already playing"""
+    gAnimator.Play(PlanMove(state.pieceAt, DecodeMove(move), speed))
+    state.ApplyMove(move)
+
+def AnimateRedo(speed: float = 1.):
+    if state.ply == state.plies: return
+    gAnimator.Play(PlanMove(state.pieceAt, DecodeMove(ZigHistoryMove(state.history, state.ply)), speed))
+    state.Redo()
+
+def Redraw(items: list, rects: list):
+    """Restores the background and redraws the overlapping items inside each rect only, so translucent sprites are not blended twice"""
+    for rect in rects:
+        screen.set_clip(rect)
+        screen.blit(background, rect, rect)
+        for item in items:
+            if rect.colliderect(ItemRect(item)):
+                DrawPiece(item[0], *item[1])
+    screen.set_clip(None)
 
 def InitStrFromSetup(board: str) -> str:
     initstr = ''
@@ -209,72 +143,101 @@ def InitStrFromSetup(board: str) -> str:
     initstr += 'z'*81
     return initstr
 
-def UpdatePotMoves(pos: int) -> list:
-    moves = []
+def ArchiveGame():
+    """Appends the game played so far to the archive at `ARCHIVE_PATH`, nothing if no full move was made"""
+    plies = [ZigHistoryMove(state.history, ply) for ply in range(state.plies - state.plies % 2)]
+    moves = [first | second << 32 for first, second in zip(plies[::2], plies[1::2])]
+    if not moves: return
+    state.Seek(len(plies)) #A half played turn is not kept
+    winVal = ZigBoardWinVal(state.handle)
+    reason = 'king' if winVal else 'nomoves' if not len(ZigGenFullMoves(state.handle)) else 'unfinished'
+    try:
+        with GameArchive(ARCHIVE_PATH, writable=True) as archive:
+            archive.Append(gStart, moves, winVal, reason)
+    except (OSError, ValueError) as err:
+        log.warning('Game not archived: %s', err)
+
+def UpdatePotMoves(pos: int, preview: bool = False) -> list:
+    """Targets of the piece on `pos` from the cached move index, faded when only hovered"""
     moveInfo = []
-    moves = ZigGenMoves(state.handle, pos)
-    for move, zm in moves:
-        pos = list(divmod(move['dest'], 11))[::-1]
-        rp = tarsqr
-        if move['kind'] in [2, 6]:
-            rp = (vatktar, hatktar)[move['atkDir'] % 2]
-            pos[0] += (1, 0, -1, 0)[move['atkDir']]/2
-            pos[1] += (0, 1, 0, -1)[move['atkDir']]/2
+    for target, move, zm in state.moveIndex.byOrig.get(pos, ()):
+        rp = gPreviewSprites[id(tarsqr)] if preview else tarsqr
+        if move['kind'] in ATTACK_KINDS:
+            rp = (vatktar, hatktar)[move['atkdir'] % 2]
+            if preview: rp = gPreviewSprites[id(rp)]
+        pos = [target[0]/2, target[1]/2]
         dc = move['doRet']
         orig = list(divmod(move['orig'], 11))[::-1]
-        print(zm, move)
         moveInfo.append((pos[:], rp, (dc, orig[:], pos[:]), move, zm))
     return moveInfo
 
-light_cell = pygame.image.load("src/sprites/light_cell.png")
-dark_cell = pygame.image.load("src/sprites/dark_cell.png")
-regalia = pygame.image.load("src/sprites/crown.png")
-hlock = pygame.image.load("src/sprites/Lock.png")
+def HoverSquare(screenPos) -> int | None:
+    col, row = [round((screenPos[0]-latoff-40)/80), round((screenPos[1]-veroff-40)/80)]
+    if not (0 <= col < 9 and 0 <= row < 9): return None
+    return 11*row + col
+
+cellwidth = 80
+screenwidth = 1000
+screenheight = 800
+
+latoff = (screenwidth - 9*cellwidth)//2
+veroff = (screenheight - 9*cellwidth)//2
+
+#Before any sprite, converting them needs the display format
+screen = pygame.display.set_mode([screenwidth, screenheight])
+
+PIECE_NAMES = [f'{color}{kind}' for color in 'wb' for kind in 'icak']
+sprites = LoadAtlas("src/sprites", ['light_cell', 'dark_cell', 'crown', 'Lock', 'AttackTarget', 'TargetSquare'] + PIECE_NAMES)
+
+light_cell = sprites['light_cell']
+dark_cell = sprites['dark_cell']
+regalia = sprites['crown']
+hlock = sprites['Lock']
 vlock = pygame.transform.rotate(hlock, 90)
-hatktar = pygame.image.load("src/sprites/AttackTarget.png")
+hatktar = sprites['AttackTarget']
 vatktar = pygame.transform.rotate(hatktar, 90)
-tarsqr = pygame.image.load("src/sprites/TargetSquare.png")
+tarsqr = sprites['TargetSquare']
 
 vatktar.set_alpha(220)
 hatktar.set_alpha(220)
 tarsqr.set_alpha(170)
 
+gPreviewSprites = {} #Fainter copies of the target sprites for hovered pieces, by id of the original
+for sprite in (vatktar, hatktar, tarsqr):
+    gPreviewSprites[id(sprite)] = sprite.copy()
+    gPreviewSprites[id(sprite)].set_alpha(sprite.get_alpha() // 3)
+
 
-psprites = {}
-for color in 'wb':
-    for kind in 'icak':
-        psprites[f'{color}{kind}'] = pygame.image.load(f"src/sprites/{color}{kind}.png")
+psprites = {name: sprites[name] for name in PIECE_NAMES}
 
 psprites['hl'] = hlock
 psprites['vl'] = vlock
 
-
-cellwidth = 80
-screenwidth = 1000
-screenheight = 800
-
-latoff = (screenwidth - 9*cellwidth)//2
-veroff = (screenheight - 9*cellwidth)//2
+gAnimator = Animator(psprites | {'crown': regalia})
+gReplay = False #Redoing the rest of the history, one move per animation
 
 board = {}
 pieces = []
 deco = []
-gIsAnimating = False
-gAnimCounter = None
 
 boardstr = \
 ' ci.aka.ic '       +'\n'+ \
 '   .cic.   '       +'\n'+ \
 '   .i i.   '
 
+logging.basicConfig(level=os.environ.get('REGALIA_LOG', 'WARNING').upper())
+log = logging.getLogger('main')
+
 #ZigInitAlloc()
 ZigInitAlloc2()
+ZigSetLogLevel(logging.getLogger().getEffectiveLevel())
 
-print(f'Init should be `{InitStrFromSetup(boardstr)}`')
+log.debug('Init should be `%s`', InitStrFromSetup(boardstr))
 
 state = Board()
 state.AddNewHandle()
 ZigInitBoardFromStr2(state.handle, InitStrFromSetup(boardstr).encode())
+gStart = StartOf(state.handle)
 
 #ZigGenAllMoves(state.handle, 1)
 #print("Computed move is :", ZigCompMove(state.handle))
@@ -285,94 +248,124 @@ ZigInitBoardFromStr2(state.handle, InitStrFromSetup(boardstr).encode())
 #state.ApplyMove(2 << 1 | 2 << 9)
 state.PullState()
 state.RegenRender()
-print('Moved')
 
 moveInfo = []
+gSelected = None #Square of the clicked piece, moveInfo shows a hover preview while None
+gHovered = None
 
 pieces, deco, board = state.RegenRender()
 
 #got = ZigGenInitStr(boardptr)
 #print(repr(got))
 
-screen = pygame.display.set_mode([screenwidth, screenheight])
 clock = pygame.time.Clock()
-
-#gAnimQueue = SetupAnimMove(False, (2, 5), (3, 5.5))
-
+background = RenderBackground()
+screenRect = screen.get_rect()
+
+gEngine = EngineWorker(OpeningBook.Open(BOOK_PATH))
+gEngineMs = 3000
+gPonder = False #Keep searching on the opponent's time after the engine moves
+pygame.font.init()
+gFont = pygame.font.Font(None, 26)
+
+#Takebacks and scrubbing through the game
+gHistoryKeys = {
+    pygame.K_LEFT: Board.Undo,
+    pygame.K_RIGHT: lambda board: AnimateRedo(),
+    pygame.K_HOME: lambda board: board.Seek(0),
+    pygame.K_END: lambda board: board.Seek(board.plies),
+}
+
+prevItems = []
+fullRedraw = True
+frameSeconds = 0.
 run = True
 while run:
     #print("Playout is:", ZigPlayOutBoard(state.handle))
-    for event in pygame.event.get():
+    engineBusy = gEngine.thinking or gEngine.pondering
+    idle = not gAnimator.busy and not gReplay and not fullRedraw and not engineBusy
+    events = [pygame.event.wait()] + pygame.event.get() if idle else pygame.event.get() #Sleep until something happens
+    if idle: clock.tick() #Time asleep is not frame time
+    for event in events:
         if event.type == pygame.QUIT:
+            ArchiveGame()
             pygame.quit()
             run = False
-        if not gIsAnimating and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+        if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            fullRedraw = True
+        if event.type == pygame.KEYDOWN and event.key in gHistoryKeys:
+            gAnimator.Finish()
+            gEngine.Cancel()
+            gReplay = False
+            gHistoryKeys[event.key](state) #Patches pieces, deco and board in place
+            moveInfo = []
+            gSelected = gHovered = None
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_SPACE: #Engine plays the side to move, once the turn in progress is finished
+                if not ZigHistoryMidTurn(state.history): gEngine.Start(state.handle, gEngineMs, history=state.history)
+            elif event.key == pygame.K_RETURN: #Move now
+                gEngine.Stop()
+            elif event.key == pygame.K_p:
+                gPonder = not gPonder
+                if not gPonder and gEngine.pondering: gEngine.Cancel()
+            elif event.key == pygame.K_r: #Replay the moves after this one
+                gReplay = not gReplay
+                if gReplay: gEngine.Cancel()
+        if not gAnimator.busy and gSelected is None and event.type == pygame.MOUSEMOTION:
+            square = HoverSquare(event.pos)
+            if square != gHovered:
+                gHovered = square
+                moveInfo = UpdatePotMoves(square, preview=True) if square is not None else []
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            gAnimator.Finish() #Clicks act on the board as it is, not as drawn mid animation
             mpos = [(event.pos[0]-latoff-40)/80, (event.pos[1]-veroff-40)/80]
             mposc = [round(x) for x in mpos]
-            mposf = [round(2*x)/2 for x in mpos]
-            if moveInfo == []:
-                if tuple(mposc) in board:
-                    moveInfo = UpdatePotMoves(11*mposc[1] + mposc[0])
+            mposh = tuple(round(2*x) for x in mpos) #Half cells, so edges are hit too
+            if gSelected is None:
+                square = HoverSquare(event.pos)
+                if square in state.moveIndex.byOrig:
+                    gSelected = square
+                    moveInfo = UpdatePotMoves(square)
             else:
-                for pos, rp, rend, move, zm in moveInfo:
-                    if mposf == pos:
-                        #print('f', move)
-                        break
-                    if mposc == pos:
-                        #print('c', move)
-                        break
-                else:
-                    moveInfo = []
-                    continue
-                print(zm, move)
-                print(rend[0], tuple(rend[1]), tuple(rend[2]))
-                #gAnimQueue = SetupAnimMove(rend[0], tuple(rend[1]), tuple(rend[2]))
-                state.ApplyMove(zm)
-                #state.ApplyMove(0xAAAAAAAA)
-                state.PullState()
-                pieces, deco, board = state.RegenRender()
+                byTarget = state.moveIndex.byTarget
+                zm = byTarget.get((gSelected, mposh)) or byTarget.get((gSelected, (2*mposc[0], 2*mposc[1])))
+                gSelected = gHovered = None
                 moveInfo = []
+                if zm is None: continue
+                gEngine.Cancel() #Whatever it was searching is stale now
+                gReplay = False
+                AnimateMove(zm) #Patches pieces, deco and board in place
+                #state.ApplyMove(0xAAAAAAAA)
     if not run: break
 
-    for col in range(9):
-        for row in range(9):
-            idx = (col ^ row) & 1
-            sprite = [light_cell, dark_cell][idx]
-            #color = (255, 255, 255)
-            screen.blit(sprite, (latoff + 80*col, veroff + 80*row))
-            #pygame.draw.rect(screen, color, , 80, 80))
-
-    pygame.draw.rect(screen, [40]*3, (latoff+80*3-3, veroff, 6, 80*9))
-    pygame.draw.rect(screen, [40]*3, (latoff+80*6-3, veroff, 6, 80*9))
-    pygame.draw.rect(screen, [40]*3, (latoff, veroff+80*3-3, 80*9, 6))
-    pygame.draw.rect(screen, [40]*3, (latoff, veroff+80*6-3, 80*9, 6))
-
-    DoAnimate()
-
-    for piece, pos, crown in pieces:
-        DrawPiece(psprites[piece], *pos)
-        if crown:
-            DrawPiece(regalia, *pos)
-
-    for piece, pos in deco:
-        DrawPiece(psprites[piece], *pos)
-
-    # for move in moves:
-    #     #print(move)
-    #     pos = list(divmod(move['dest'], 9))[::-1]
-    #     rp = tarsqr
-    #     if move['doAtk']:
-    #         rp = (vatktar, hatktar)[move['atkDir'] % 2]
-    #         pos[0] += (1, 0, -1, 0)[move['atkDir']]/2
-    #         pos[1] += (0, 1, 0, -1)[move['atkDir']]/2
-    #     DrawPiece(rp, *pos)
-    for pos, rp, _, _, _ in moveInfo:
-        DrawPiece(rp, *pos)
-
-    #DrawPiece(vlock, *(3.5, 0))
-    #DrawPiece(vatktar, *(3.5, 0))
-    #DrawPiece(tarsqr, *(5, 0))
-    #DrawPiece(tarsqr, *(6, 0))
-
-    pygame.display.update()
-    clock.tick(60)
\ No newline at end of file
+    result = None if gAnimator.busy else gEngine.Poll()
+    if result and result['move']:
+        #Both halves animate at once
+        AnimateMove(result['move'] & 0xFFFFFFFF)
+        AnimateMove(result['move'] >> 32)
+        moveInfo = []
+        gSelected = gHovered = None
+        if gPonder: gEngine.Ponder(state.handle)
+
+    if gReplay and not gAnimator.busy:
+        gReplay = state.ply < state.plies
+        AnimateRedo(REPLAY_SPEED)
+    gAnimator.Update(frameSeconds)
+
+    items = FrameItems()
+    if fullRedraw:
+        rects = [screenRect]
+        fullRedraw = False
+    else:
+        rects = DirtyRects(prevItems, items)
+    prevItems = items
+    if rects:
+        Redraw(items, rects)
+        pygame.display.update(rects)
+
+    if gAnimator.busy:
+        frameSeconds = clock.tick(60) / 1000
+    elif engineBusy:
+        clock.tick(20) #Only polling the engine
+
+gEngine.Close()
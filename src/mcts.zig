@@ -0,0 +1,230 @@
+const std = @import("std");
+const Engine = @import("engine2.zig");
+const Search = @import("search.zig");
+const PlayoutKernel = @import("playout.zig");
+const Stats = @import("stats.zig");
+const AssertEql = std.testing.expectEqual;
+
+const Board = Engine.Board;
+const FullMove = Engine.FullMove;
+
+///////////////////////////////////////////////////////////////////////////
+
+const EXPLORATION: f32 = 1.41;
+const MAXTREENODES = 1 << 20; //Per thread, expansion stops once reached
+const MAXPLAYOUTTURNS = PlayoutKernel.MAXTURNS; //Playouts this long are scored by material
+
+///////////////////////////////////////////////////////////////////////////
+
+pub const Limits = struct {
+    ns: u64,
+    threads: u32 = 0, //0 for one per core
+    seed: u64 = 0,
+};
+
+/// Visit counts of the root moves, summed over every thread's tree
+pub const RootStats = struct {
+    moves: []u64,
+    visits: []u32,
+    playouts: u64,
+
+    pub fn deinit(self: RootStats, allocator: std.mem.Allocator) void {
+        allocator.free(self.moves);
+        allocator.free(self.visits);
+    }
+
+    pub fn Best(self: RootStats) u64 {
+        var best: usize = 0;
+        for (self.visits, 0..) |visits, idx| if (visits > self.visits[best]) {
+            best = idx;
+        };
+        return if (self.moves.len == 0) 0 else self.moves[best];
+    }
+};
+
+/// Root parallel UCT: every thread grows its own tree from `board` with its own rng, the root visits are merged at the end. `allocator` is used from every thread
+pub fn Run(allocator: std.mem.Allocator, board: Board, limits: Limits) !RootStats {
+    const timer = Stats.Start();
+    defer Stats.Stop(.mcts, timer);
+    const threadCount: usize = if (limits.threads != 0) limits.threads else std.Thread.getCpuCount() catch 1;
+
+    const workers = try allocator.alloc(Worker, threadCount);
+    defer allocator.free(workers);
+    for (workers, 0..) |*worker, idx| {
+        worker.* = .{
+            .root = board,
+            .ns = limits.ns,
+            .rng = std.Random.Xoroshiro128.init(limits.seed +% idx *% 0x9E3779B97F4A7C15),
+            .nodes = std.ArrayList(Node).init(allocator),
+            .allocator = allocator,
+        };
+    }
+    defer for (workers) |*worker| worker.nodes.deinit();
+
+    const threads = try allocator.alloc(std.Thread, threadCount - 1);
+    defer allocator.free(threads);
+    var started: usize = 0;
+    for (threads, workers[1..]) |*thread, *worker| {
+        thread.* = std.Thread.spawn(.{}, Worker.Run, .{worker}) catch break;
+        started += 1;
+    }
+    workers[0].Run();
+    for (threads[0..started]) |thread| thread.join();
+
+    //Workers whose thread did not spawn never ran, the search goes on with fewer trees
+    const ran = workers[0 .. 1 + started];
+    for (ran) |worker| if (worker.failed) return error.OutOfMemory;
+
+    //Every tree expands the root identically, so children line up by index
+    const root = workers[0].nodes.items[0];
+    const stats = RootStats{
+        .moves = try allocator.alloc(u64, root.childCount),
+        .visits = try allocator.alloc(u32, root.childCount),
+        .playouts = 0,
+    };
+    var playouts: u64 = 0;
+    @memset(stats.visits, 0);
+    for (0..root.childCount) |idx| stats.moves[idx] = workers[0].nodes.items[root.firstChild + idx].move;
+    for (ran) |worker| {
+        const wroot = worker.nodes.items[0];
+        playouts += wroot.visits;
+        for (0..wroot.childCount) |idx| stats.visits[idx] += worker.nodes.items[wroot.firstChild + idx].visits;
+    }
+    var ret = stats;
+    ret.playouts = playouts;
+    Stats.Add(.playouts, playouts);
+    return ret;
+}
+
+const Node = struct {
+    move: u64, //Packed FullMove leading here
+    firstChild: u32 = 0,
+    childCount: u32 = 0,
+    visits: u32 = 0,
+    wins: f32 = 0, //From the perspective of the player who made `move`
+    expanded: bool = false,
+};
+
+const Worker = struct {
+    const Self = @This();
+
+    root: Board,
+    ns: u64,
+    rng: std.Random.Xoroshiro128,
+    nodes: std.ArrayList(Node),
+    allocator: std.mem.Allocator, //The caller's, shared by every thread so it must be thread safe
+    failed: bool = false,
+
+    fn Run(self: *Self) void {
+        self._Run() catch {
+            self.failed = true;
+        };
+    }
+
+    fn _Run(self: *Self) !void {
+        var timer = try std.time.Timer.start();
+        try self.nodes.append(.{ .move = 0 });
+        try self.Expand(0, &self.root);
+        if (self.nodes.items[0].childCount == 0) return;
+
+        var path = std.BoundedArray(u32, 2 * MAXPLAYOUTTURNS){};
+        while (timer.read() < self.ns) {
+            path.clear();
+            var board = self.root;
+            var nodeIdx: u32 = 0;
+            path.appendAssumeCapacity(0);
+
+            //Selection, expanding a leaf the second time it is reached
+            while (path.len < path.capacity()) {
+                const node = self.nodes.items[nodeIdx];
+                if (!node.expanded) {
+                    if (node.visits == 0 or board.IsTerminal() or self.nodes.items.len >= MAXTREENODES) break;
+                    try self.Expand(nodeIdx, &board);
+                    if (self.nodes.items[nodeIdx].childCount == 0) break;
+                }
+                nodeIdx = self.Select(nodeIdx);
+                board.ApplyFullMove(FullMove.Unpack(self.nodes.items[nodeIdx].move));
+                path.appendAssumeCapacity(nodeIdx);
+            }
+
+            const winner = Playout(board, self.rng.random());
+
+            //Node at depth d was reached by a move of the color that played d - 1 turns after the root
+            for (path.slice(), 0..) |idx, depth| {
+                const node = &self.nodes.items[idx];
+                node.visits += 1;
+                if (depth == 0) continue;
+                const mover: i2 = if ((self.root.toPlay + depth - 1) % 2 == 0) 1 else -1;
+                node.wins += if (winner == 0) 0.5 else if (winner == mover) 1 else 0;
+            }
+        }
+    }
+
+    fn Expand(self: *Self, nodeIdx: u32, board: *const Board) !void {
+        const start = self.nodes.items.len;
+        //Grown as moves come in, reserving the most full moves a board could have would keep the tree's capacity far past its size
+        const Sink = struct {
+            nodes: *std.ArrayList(Node),
+            failed: bool = false,
+
+            fn Push(sink: *@This(), move: FullMove) void {
+                sink.nodes.append(.{ .move = move.Pack() }) catch {
+                    sink.failed = true;
+                };
+            }
+        };
+        var sink = Sink{ .nodes = &self.nodes };
+        switch (board.toPlay) {
+            inline 0, 1 => |color| _ = try board.StreamUniqueFullMoves(self.allocator, color, &sink, Sink.Push),
+            else => unreachable,
+        }
+        if (sink.failed) return error.OutOfMemory;
+        const node = &self.nodes.items[nodeIdx];
+        node.firstChild = @intCast(start);
+        node.childCount = @intCast(self.nodes.items.len - start);
+        node.expanded = true;
+    }
+
+    /// UCT, unvisited children first
+    fn Select(self: *Self, nodeIdx: u32) u32 {
+        const node = self.nodes.items[nodeIdx];
+        const logVisits = @log(@as(f32, @floatFromInt(node.visits + 1)));
+        var best: u32 = node.firstChild;
+        var bestVal: f32 = -std.math.inf(f32);
+        for (node.firstChild..node.firstChild + node.childCount) |idx| {
+            const child = self.nodes.items[idx];
+            if (child.visits == 0) return @intCast(idx);
+            const visits: f32 = @floatFromInt(child.visits);
+            const val = child.wins / visits + EXPLORATION * @sqrt(logVisits / visits);
+            if (val > bestVal) {
+                bestVal = val;
+                best = @intCast(idx);
+            }
+        }
+        return best;
+    }
+};
+
+///////////////////////////////////////////////////////////////////////////
+
+/// Random game to the end, 1 if white wins, -1 if black wins, material decides games that run too long
+fn Playout(board: Board, rand: std.Random) i2 {
+    var state = board;
+    _ = PlayoutKernel.Run(&state, rand, MAXPLAYOUTTURNS);
+    if (state.IsTerminal()) return state.WinVal();
+    const material = Search.StaticValue(&state) * @as(i32, if (state.toPlay == 0) 1 else -1);
+    return if (material > 0) 1 else if (material < 0) -1 else 0;
+}
+
+///////////////////////////////////////////////////////////////////////////
+
+test "Parallel MCTS" {
+    const stats = try Run(std.testing.allocator, Board.default, .{ .ns = 50 * std.time.ns_per_ms, .threads = 2, .seed = 1 });
+    defer stats.deinit(std.testing.allocator);
+    try AssertEql(2735, stats.moves.len); //One child per distinct position
+    try std.testing.expect(stats.playouts > 0);
+    var total: u64 = 0;
+    for (stats.visits) |visits| total += visits;
+    try AssertEql(stats.playouts, total); //The root is expanded up front, every playout passes through a child
+    try std.testing.expect(stats.Best() != 0);
+}
@@ -0,0 +1,55 @@
+import numpy as np
+from zigtypes import MOVE_FIELDS, BOARD_WIDTHS
+
+# Vectorized packed move decoding/encoding. Layouts come from `zigtypes.MOVE_LAYOUTS` so the
+# same code serves both engines.
+
+_gDtypes = {}
+_gCoords = {}
+
+def MoveDtype(engine: str = 'engine2') -> np.dtype:
+    if engine not in _gDtypes:
+        fields = [(name, np.uint8) for name, _, _ in MOVE_FIELDS[engine]]
+        fields += [('orig_x', np.uint8), ('orig_y', np.uint8), ('dest_x', np.uint8), ('dest_y', np.uint8)]
+        _gDtypes[engine] = np.dtype(fields)
+    return _gDtypes[engine]
+
+def _CoordTables(engine: str) -> tuple[np.ndarray, np.ndarray]:
+    """(x, y) lookup tables indexed by square, so decoding needs no division"""
+    if engine not in _gCoords:
+        ys, xs = np.divmod(np.arange(128, dtype=np.uint8), BOARD_WIDTHS[engine])
+        _gCoords[engine] = (xs.astype(np.uint8), ys.astype(np.uint8))
+    return _gCoords[engine]
+
+def _AsU32(buf) -> np.ndarray:
+    """Packed moves as a flat uint32 array. uint64 arrays hold packed full moves and split into their (first, second) halves"""
+    if isinstance(buf, np.ndarray):
+        if buf.dtype == np.uint64:
+            return np.stack((buf & np.uint64(0xFFFFFFFF), buf >> np.uint64(32)), axis=-1).astype(np.uint32).ravel()
+        if buf.dtype != np.uint32: raise ValueError(f'packed moves must be uint32 or uint64, not {buf.dtype}')
+        return buf.ravel()
+    return np.frombuffer(buf, dtype=np.uint32)
+
+def DecodeMoves(buf, engine: str = 'engine2') -> np.ndarray:
+    """Decodes a buffer of packed moves into a structured array with one field per move field plus x/y of orig and dest"""
+    raw = _AsU32(buf)
+    out = np.empty(raw.shape[0], dtype=MoveDtype(engine))
+    for name, shift, mask in MOVE_FIELDS[engine]:
+        out[name] = (raw >> np.uint32(shift)) & np.uint32(mask)
+    xs, ys = _CoordTables(engine)
+    out['orig_x'] = xs[out['orig']]
+    out['orig_y'] = ys[out['orig']]
+    out['dest_x'] = xs[out['dest']]
+    out['dest_y'] = ys[out['dest']]
+    return out
+
+def DecodeFullMoves(buf, engine: str = 'engine2') -> np.ndarray:
+    """Decodes (first, second) pairs as written by `ZigGenFullMovesInto`, or packed uint64 full moves, into an (n, 2) structured array"""
+    return DecodeMoves(buf, engine).reshape(-1, 2)
+
+def EncodeMoves(moves: np.ndarray, engine: str = 'engine2') -> np.ndarray:
+    """Inverse of `DecodeMoves`, ignores the coordinate fields"""
+    out = np.zeros(moves.shape, dtype=np.uint32)
+    for name, shift, mask in MOVE_FIELDS[engine]:
+        out |= (moves[name].astype(np.uint32) & np.uint32(mask)) << np.uint32(shift)
+    return out
@@ -0,0 +1,265 @@
+const std = @import("std");
+const Engine = @import("engine2.zig");
+const Stats = @import("stats.zig");
+const AssertEql = std.testing.expectEqual;
+
+const Board = Engine.Board;
+const Move = Engine.Move;
+const FullMove = Engine.FullMove;
+const PackedMove = Engine.PackedMove;
+
+///////////////////////////////////////////////////////////////////////////
+
+/// What one ply of perft is: a single move (two per turn), a full double move, or a full move to each distinct position
+pub const Mode = enum(u8) {
+    single,
+    full,
+    unique,
+};
+
+/// A fixed position with its node counts, `expected[d - 1]` being perft(d)
+pub const Position = struct {
+    name: []const u8,
+    initStr: ?*const [162]u8, //Null for the default board
+    toPlay: u1 = 0,
+    single: []const u64,
+    full: []const u64,
+    unique: []const u64,
+
+    pub fn GetBoard(self: Position) Board {
+        var board = Board.default;
+        if (self.initStr) |initStr| board.InitFromStr(initStr.*, self.toPlay);
+        return board;
+    }
+
+    pub fn Expected(self: Position, mode: Mode) []const u64 {
+        return switch (mode) {
+            .single => self.single,
+            .full => self.full,
+            .unique => self.unique,
+        };
+    }
+};
+
+/// The others come from seeded random playouts of 6, 15 and 30 turns from the start
+pub const POSITIONS = [_]Position{
+    .{
+        .name = "start",
+        .initStr = null,
+        .single = &.{ 75, 5053, 379723, 25605113 },
+        .full = &.{ 5053, 25605113 },
+        .unique = &.{ 2735, 7500420 },
+    },
+    .{
+        .name = "opening",
+        .initStr = "zzaclczbzzzzbabzzzzzzazzzzzzzbazzazzzzzzezzzzzzzzzzzezzfzfzezfzzzzzezzzzzzegpgzfzaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa",
+        .single = &.{ 88, 6971, 758416, 73651507 },
+        .full = &.{ 6971, 73651507 },
+        .unique = &.{ 3693, 19985759 },
+    },
+    .{
+        .name = "opening-black",
+        .initStr = "zbczlcazazzzbabzzzzzzzazzzzazzzzzzzzzzzzzfzzzzzzzzzzzzzzfeeezzzzzzfzzefzzzzgpgzzzaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa",
+        .toPlay = 1,
+        .single = &.{ 103, 9435, 737985, 51239201 },
+        .full = &.{ 9435, 51239201 },
+        .unique = &.{ 4920, 14356951 },
+    },
+    .{
+        .name = "midgame-locks",
+        .initStr = "zzzclczzzzazzzzzazazzzezbbzbfzabzfezzzazzzzzzzzzzzzzzzzzzgzzzfezzfzeezzzzzzzpgzzzaaaaaaaaaaaaaaaaaaaaaacaccabeaaiaiiaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa",
+        .single = &.{ 69, 4046, 301454, 19426460 },
+        .full = &.{ 4046, 19426460 },
+        .unique = &.{ 2010, 5047841 },
+    },
+};
+
+///////////////////////////////////////////////////////////////////////////
+
+/// Leaf count `depth` plies below `board`. Game end is not checked, this measures move generation.
+/// `allocator` holds the dedup tables of `.unique`, the other modes allocate nothing.
+pub fn Perft(allocator: std.mem.Allocator, board: Board, depth: u32, mode: Mode) !u64 {
+    const timer = Stats.Start();
+    defer Stats.Stop(.perft, timer);
+    return switch (mode) {
+        .single => PerftSingle(&board, depth, null),
+        .full => PerftFull(&board, depth),
+        .unique => try PerftUnique(allocator, &board, depth),
+    };
+}
+
+/// `blocked` is the destination of the turn's first move, null when the next move starts a turn
+fn PerftSingle(board: *const Board, depth: u32, blocked: ?u7) u64 {
+    if (depth == 0) return 1;
+    const Locals = struct {
+        board: *const Board,
+        depth: u32,
+        blocked: ?u7,
+        nodes: *u64,
+
+        fn Handle(ctx: @This(), move: Move) void {
+            if (ctx.blocked == move.orig) return;
+            if (ctx.depth == 1) {
+                ctx.nodes.* += 1;
+                return;
+            }
+            var child = ctx.board.*;
+            child.ApplyMove(move);
+            if (ctx.blocked != null) child.EndTurn();
+            ctx.nodes.* += PerftSingle(&child, ctx.depth - 1, if (ctx.blocked == null) move.dest else null);
+        }
+    };
+    var nodes: u64 = 0;
+    switch (board.toPlay) {
+        inline 0, 1 => |color| board.StreamAllSingleMoves(color, Locals{ .board = board, .depth = depth, .blocked = blocked, .nodes = &nodes }, Locals.Handle) catch unreachable,
+        else => unreachable,
+    }
+    return nodes;
+}
+
+fn PerftFull(board: *const Board, depth: u32) u64 {
+    if (depth == 0) return 1;
+    const Locals = struct {
+        board: *const Board,
+        depth: u32,
+        nodes: *u64,
+
+        fn Handle(ctx: @This(), move: FullMove) void {
+            if (ctx.depth == 1) {
+                ctx.nodes.* += 1;
+                return;
+            }
+            var child = ctx.board.*;
+            child.ApplyFullMove(move);
+            ctx.nodes.* += PerftFull(&child, ctx.depth - 1);
+        }
+    };
+    var nodes: u64 = 0;
+    switch (board.toPlay) {
+        inline 0, 1 => |color| board.StreamAllFullMoves(color, Locals{ .board = board, .depth = depth, .nodes = &nodes }, Locals.Handle) catch unreachable,
+        else => unreachable,
+    }
+    return nodes;
+}
+
+/// `PerftFull` over `StreamUniqueFullMoves`, positions reached by several full moves of one turn counted once
+fn PerftUnique(allocator: std.mem.Allocator, board: *const Board, depth: u32) !u64 {
+    if (depth == 0) return 1;
+    const Locals = struct {
+        allocator: std.mem.Allocator,
+        board: *const Board,
+        depth: u32,
+        nodes: *u64,
+        failed: *bool,
+
+        fn Handle(ctx: @This(), move: FullMove) void {
+            if (ctx.depth == 1) {
+                ctx.nodes.* += 1;
+                return;
+            }
+            var child = ctx.board.*;
+            child.ApplyFullMove(move);
+            ctx.nodes.* += PerftUnique(ctx.allocator, &child, ctx.depth - 1) catch {
+                ctx.failed.* = true;
+                return;
+            };
+        }
+    };
+    var nodes: u64 = 0;
+    var failed = false;
+    const locals = Locals{ .allocator = allocator, .board = board, .depth = depth, .nodes = &nodes, .failed = &failed };
+    switch (board.toPlay) {
+        inline 0, 1 => |color| _ = try board.StreamUniqueFullMoves(allocator, color, locals, Locals.Handle),
+        else => unreachable,
+    }
+    if (failed) return error.OutOfMemory;
+    return nodes;
+}
+
+/// Perft of each root move, packed as a `PackedMove` in single mode and a `FullMove` in the full modes
+pub const DivideEntry = struct {
+    move: u64,
+    nodes: u64,
+};
+
+/// Caller frees the returned slice
+pub fn Divide(allocator: std.mem.Allocator, board: Board, depth: u32, mode: Mode) ![]DivideEntry {
+    var entries = std.ArrayList(DivideEntry).init(allocator);
+    errdefer entries.deinit();
+    if (depth == 0) return entries.toOwnedSlice();
+    const Locals = struct {
+        allocator: std.mem.Allocator,
+        board: *const Board,
+        depth: u32,
+        entries: *std.ArrayList(DivideEntry),
+        failed: *bool,
+
+        fn Single(ctx: @This(), move: Move) void {
+            var child = ctx.board.*;
+            child.ApplyMove(move);
+            const packed_: u32 = @bitCast(PackedMove.FromMove(move));
+            ctx.Add(packed_, PerftSingle(&child, ctx.depth - 1, move.dest));
+        }
+
+        fn Full(ctx: @This(), move: FullMove) void {
+            var child = ctx.board.*;
+            child.ApplyFullMove(move);
+            ctx.Add(move.Pack(), PerftFull(&child, ctx.depth - 1));
+        }
+
+        fn Unique(ctx: @This(), move: FullMove) void {
+            var child = ctx.board.*;
+            child.ApplyFullMove(move);
+            ctx.Add(move.Pack(), PerftUnique(ctx.allocator, &child, ctx.depth - 1) catch {
+                ctx.failed.* = true;
+                return;
+            });
+        }
+
+        fn Add(ctx: @This(), move: u64, nodes: u64) void {
+            ctx.entries.append(.{ .move = move, .nodes = nodes }) catch {
+                ctx.failed.* = true;
+            };
+        }
+    };
+    var failed = false;
+    const locals = Locals{ .allocator = allocator, .board = &board, .depth = depth, .entries = &entries, .failed = &failed };
+    switch (board.toPlay) {
+        inline 0, 1 => |color| switch (mode) {
+            .single => try board.StreamAllSingleMoves(color, locals, Locals.Single),
+            .full => try board.StreamAllFullMoves(color, locals, Locals.Full),
+            .unique => _ = try board.StreamUniqueFullMoves(allocator, color, locals, Locals.Unique),
+        },
+        else => unreachable,
+    }
+    if (failed) return error.OutOfMemory;
+    return entries.toOwnedSlice();
+}
+
+///////////////////////////////////////////////////////////////////////////
+
+test "Perft baselines" {
+    for (POSITIONS) |position| {
+        const board = position.GetBoard();
+        for (0..2) |depth| try AssertEql(position.single[depth], try Perft(std.testing.allocator, board, @intCast(depth + 1), .single));
+        try AssertEql(position.full[0], try Perft(std.testing.allocator, board, 1, .full));
+        try AssertEql(position.unique[0], try Perft(std.testing.allocator, board, 1, .unique));
+    }
+}
+
+test "Two single plies make a full ply" {
+    for (POSITIONS) |position| {
+        const board = position.GetBoard();
+        try AssertEql(try Perft(std.testing.allocator, board, 2, .single), try Perft(std.testing.allocator, board, 1, .full));
+    }
+}
+
+test "Divide sums to perft" {
+    const board = Board.default;
+    const entries = try Divide(std.testing.allocator, board, 2, .single);
+    defer std.testing.allocator.free(entries);
+    try AssertEql(75, entries.len);
+    var total: u64 = 0;
+    for (entries) |entry| total += entry.nodes;
+    try AssertEql(try Perft(std.testing.allocator, board, 2, .single), total);
+}
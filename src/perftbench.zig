@@ -0,0 +1,89 @@
+const std = @import("std");
+const Engine = @import("engine2.zig");
+const Perft = @import("perft.zig");
+const Reach = @import("reach.zig");
+
+const usage =
+    \\Usage: perftbench [--mode single|full|unique] [--depth N] [--divide]
+    \\Runs perft over the fixed positions and prints JSON with node counts, baselines and nodes/sec.
+    \\Defaults to single moves up to depth 3. Exits with 1 if a count differs from its baseline.
+    \\`pext` in the output tells which reach table index the build uses, set by the target cpu.
+    \\
+;
+
+const Result = struct {
+    position: []const u8,
+    mode: Perft.Mode,
+    depth: u32,
+    nodes: u64,
+    expected: ?u64,
+    ok: bool,
+    ns: u64,
+    nps: u64,
+    divide: ?[]const Perft.DivideEntry = null,
+};
+
+pub fn main() !void {
+    var gpa = std.heap.DebugAllocator(.{}){};
+    defer _ = gpa.deinit();
+    const allocator = gpa.allocator();
+
+    var mode: Perft.Mode = .single;
+    var maxDepth: u32 = 3;
+    var divide = false;
+
+    const args = try std.process.argsAlloc(allocator);
+    defer std.process.argsFree(allocator, args);
+    var idx: usize = 1;
+    while (idx < args.len) : (idx += 1) {
+        const arg = args[idx];
+        if (std.mem.eql(u8, arg, "--divide")) {
+            divide = true;
+        } else if (std.mem.eql(u8, arg, "--mode") and idx + 1 < args.len) {
+            idx += 1;
+            mode = std.meta.stringToEnum(Perft.Mode, args[idx]) orelse return Usage();
+        } else if (std.mem.eql(u8, arg, "--depth") and idx + 1 < args.len) {
+            idx += 1;
+            maxDepth = std.fmt.parseInt(u32, args[idx], 10) catch return Usage();
+        } else return Usage();
+    }
+
+    var arena = std.heap.ArenaAllocator.init(allocator);
+    defer arena.deinit();
+    var results = std.ArrayList(Result).init(arena.allocator());
+    var failed = false;
+
+    for (Perft.POSITIONS) |position| {
+        const board = position.GetBoard();
+        for (1..maxDepth + 1) |depth| {
+            var timer = try std.time.Timer.start();
+            const nodes = try Perft.Perft(allocator, board, @intCast(depth), mode);
+            const ns = timer.read();
+            const baselines = position.Expected(mode);
+            const expected: ?u64 = if (depth <= baselines.len) baselines[depth - 1] else null;
+            const ok = expected == null or expected.? == nodes;
+            failed = failed or !ok;
+            try results.append(.{
+                .position = position.name,
+                .mode = mode,
+                .depth = @intCast(depth),
+                .nodes = nodes,
+                .expected = expected,
+                .ok = ok,
+                .ns = ns,
+                .nps = if (ns == 0) 0 else nodes * std.time.ns_per_s / ns,
+                .divide = if (divide and depth == maxDepth) try Perft.Divide(arena.allocator(), board, @intCast(depth), mode) else null,
+            });
+        }
+    }
+
+    const stdout = std.io.getStdOut().writer();
+    try std.json.stringify(.{ .results = results.items, .pext = Reach.USEPEXT, .ok = !failed }, .{ .whitespace = .indent_2 }, stdout);
+    try stdout.writeByte('\n');
+    if (failed) std.process.exit(1);
+}
+
+fn Usage() !void {
+    try std.io.getStdErr().writeAll(usage);
+    std.process.exit(2);
+}
@@ -0,0 +1,174 @@
+const std = @import("std");
+const Engine = @import("engine2.zig");
+const Stats = @import("stats.zig");
+const AssertEql = std.testing.expectEqual;
+
+const Board = Engine.Board;
+const Move = Engine.Move;
+const FullMove = Engine.FullMove;
+
+///////////////////////////////////////////////////////////////////////////
+
+pub const MAXTURNS = 200; //Default cap, games running longer are left undecided
+const MAXREJECTIONS = 64; //Attempts before falling back to streaming every full move
+
+/// Totals over a batch of playouts, mirrored by `zigwrap.PlayoutStats`
+pub const BatchStats = extern struct {
+    whiteWins: u64 = 0,
+    blackWins: u64 = 0,
+    undecided: u64 = 0,
+    turns: u64 = 0,
+};
+
+/// Single item reservoir over a stream of unknown length, every item ends up kept with equal probability.
+/// Rather than drawing for every item it draws the gap to the next replacement (Li's algorithm L), so long streams cost O(log n) draws.
+fn Reservoir(comptime T: type) type {
+    return struct {
+        const Self = @This();
+
+        rand: std.Random,
+        item: T = undefined,
+        seen: u64 = 0,
+        next: u64 = 0,
+        weight: f64 = 1,
+
+        fn Offer(self: *Self, item: T) void {
+            defer self.seen += 1;
+            if (self.seen != self.next) return;
+            self.item = item;
+            self.weight *= self.Uniform();
+            const gap = @floor(@log(self.Uniform()) / std.math.log1p(-self.weight));
+            self.next = if (gap < 1 << 62) self.seen + 1 + @as(u64, @intFromFloat(gap)) else std.math.maxInt(u64);
+        }
+
+        /// In (0, 1], so the logs stay finite
+        fn Uniform(self: *Self) f64 {
+            return 1 - self.rand.float(f64);
+        }
+    };
+}
+
+/// Uniformly random single move for `color`
+fn RandomSingleMove(board: *const Board, comptime color: comptime_int, rand: std.Random) ?Move {
+    var reservoir = Reservoir(Move){ .rand = rand };
+    const Locals = struct {
+        fn Handle(res: *Reservoir(Move), move: Move) void {
+            res.Offer(move);
+        }
+    };
+    board.StreamAllSingleMoves(color, &reservoir, Locals.Handle) catch unreachable;
+    return if (reservoir.seen == 0) null else reservoir.item;
+}
+
+/// Uniformly random full move for the side to play, streamed without building a move list. Null when there is none.
+/// Draws a random first move, then a random second move out of the `n` that follow it, and keeps the pair with probability `n / MAXSINGLEMOVES`.
+/// That cancels the bias toward firsts with few replies while only generating two plies per attempt instead of every second of every first.
+pub fn RandomFullMove(board: *const Board, rand: std.Random) ?FullMove {
+    switch (board.toPlay) {
+        inline 0, 1 => |color| {
+            for (0..MAXREJECTIONS) |_| {
+                const first = RandomSingleMove(board, color, rand) orelse return null;
+                var state = board.*;
+                state.ApplyMove(first);
+                var reservoir = Reservoir(Move){ .rand = rand };
+                const Second = struct {
+                    first: Move,
+                    reservoir: *Reservoir(Move),
+
+                    fn Handle(ctx: @This(), second: Move) void {
+                        if (second.orig == ctx.first.dest) return;
+                        ctx.reservoir.Offer(second);
+                    }
+                };
+                state.StreamAllSingleMoves(color, Second{ .first = first, .reservoir = &reservoir }, Second.Handle) catch unreachable;
+                if (rand.uintLessThan(u64, Engine.MAXSINGLEMOVES) < reservoir.seen) return .{ .moves = .{ first, reservoir.item } };
+            }
+            return ExhaustiveRandomFullMove(board, rand);
+        },
+        else => unreachable,
+    }
+}
+
+/// Same distribution as `RandomFullMove` by offering every full move to one reservoir, for positions where nearly every first is a dead end
+fn ExhaustiveRandomFullMove(board: *const Board, rand: std.Random) ?FullMove {
+    var reservoir = Reservoir(FullMove){ .rand = rand };
+    const Locals = struct {
+        fn Handle(res: *Reservoir(FullMove), move: FullMove) void {
+            res.Offer(move);
+        }
+    };
+    switch (board.toPlay) {
+        inline 0, 1 => |color| board.StreamAllFullMoves(color, &reservoir, Locals.Handle) catch unreachable,
+        else => unreachable,
+    }
+    return if (reservoir.seen == 0) null else reservoir.item;
+}
+
+/// Plays uniformly random full moves on `board` until a king falls, no move is left, or `maxTurns` turns. Returns the turns played.
+pub fn Run(board: *Board, rand: std.Random, maxTurns: u32) u32 {
+    var turns: u32 = 0;
+    while (turns < maxTurns and !board.IsTerminal()) : (turns += 1) {
+        const move = RandomFullMove(board, rand) orelse break;
+        board.ApplyFullMove(move);
+    }
+    return turns;
+}
+
+/// `count` playouts from `board` seeded by `seed`
+pub fn Batch(board: Board, count: u64, seed: u64, maxTurns: u32) BatchStats {
+    const timer = Stats.Start();
+    defer Stats.Stop(.playout, timer);
+    Stats.Add(.playouts, count);
+    var prng = std.Random.Xoroshiro128.init(seed);
+    var stats = BatchStats{};
+    for (0..count) |_| {
+        var state = board;
+        stats.turns += Run(&state, prng.random(), maxTurns);
+        switch (state.WinVal()) {
+            1 => stats.whiteWins += 1,
+            -1 => stats.blackWins += 1,
+            else => stats.undecided += 1,
+        }
+    }
+    return stats;
+}
+
+///////////////////////////////////////////////////////////////////////////
+
+test "Reservoir is uniform" {
+    var prng = std.Random.Xoroshiro128.init(3);
+    var hits = [_]u32{0} ** 8;
+    for (0..8000) |_| {
+        var reservoir = Reservoir(usize){ .rand = prng.random() };
+        for (0..8) |idx| reservoir.Offer(idx);
+        hits[reservoir.item] += 1;
+    }
+    for (hits) |hit| try std.testing.expect(hit > 850 and hit < 1150);
+}
+
+test "Random full move is legal" {
+    var prng = std.Random.Xoroshiro128.init(5);
+    const board = Board.default;
+    const move = RandomFullMove(&board, prng.random()).?;
+    const exhaustive = ExhaustiveRandomFullMove(&board, prng.random()).?;
+    const Locals = struct {
+        target: u64,
+        found: *bool,
+
+        fn Handle(ctx: @This(), full: FullMove) void {
+            if (full.Pack() == ctx.target) ctx.found.* = true;
+        }
+    };
+    var found = false;
+    try board.StreamAllFullMoves(0, Locals{ .target = move.Pack(), .found = &found }, Locals.Handle);
+    try std.testing.expect(found);
+    found = false;
+    try board.StreamAllFullMoves(0, Locals{ .target = exhaustive.Pack(), .found = &found }, Locals.Handle);
+    try std.testing.expect(found);
+}
+
+test "Batch playouts" {
+    const stats = Batch(Board.default, 4, 11, MAXTURNS);
+    try AssertEql(4, stats.whiteWins + stats.blackWins + stats.undecided);
+    try std.testing.expect(stats.turns > 0 and stats.turns <= 4 * MAXTURNS);
+}
@@ -0,0 +1,114 @@
+const std = @import("std");
+const builtin = @import("builtin");
+const AssertEql = std.testing.expectEqual;
+
+const BitBoard = @import("engine2.zig").BitBoard;
+
+///////////////////////////////////////////////////////////////////////////
+
+//Move generation lookups for engine2's 11 wide padded board. What a piece reaches only depends on the blockers near it and shifting
+//a bitboard moves every square alike, so each table is built once around a fixed center square and shifted onto the piece.
+
+const WIDTH = 11;
+const ONE: BitBoard = 1;
+
+/// Whether `Reach2` looks its answer up by a BMI2 `pext` index or steps it out with shifts. Follows the target cpu, so `-mcpu=x86_64_v3` builds
+/// the table path and `-mcpu=x86_64_v2` the portable one. Gathering the index without `pext` costs more than the two steps it saves.
+pub const USEPEXT = builtin.cpu.arch == .x86_64 and std.Target.x86.featureSetHas(builtin.cpu.features, .bmi2);
+
+/// Square of the piece in a table entry and in the blocker window, high enough that every square within 2 steps has a positive offset
+const CENTER = 2 * WIDTH + 2;
+
+/// Offsets within two orthogonal steps, the squares a speed 2 piece's reach depends on. Bit `i` of a `Reach2` index is `RING2[i]`.
+const RING2 = [12]comptime_int{ -2 * WIDTH, -WIDTH - 1, -WIDTH, -WIDTH + 1, -2, -1, 1, 2, WIDTH - 1, WIDTH, WIDTH + 1, 2 * WIDTH };
+const RING2MASK: u64 = b: {
+    var mask: u64 = 0;
+    for (RING2) |offset| mask |= 1 << (CENTER + offset);
+    break :b mask;
+};
+
+/// Each square and its 4 neighbours, where a piece there moves or attacks one step
+pub const plus: [128]BitBoard = Footprints(Plus);
+
+/// Each square and its 8 neighbours, an artillary's capture zone
+pub const square: [128]BitBoard = Footprints(Square);
+
+/// Speed 2 reach from `CENTER` for each pattern of blockers on `RING2`. It spans `CENTER` +-22, so u64 entries keep the table at 32KB.
+const reach2: [1 << RING2.len]u64 = b: {
+    @setEvalBranchQuota(200000);
+    var table: [1 << RING2.len]u64 = undefined;
+    for (&table, 0..) |*entry, idx| {
+        var blockers: BitBoard = ONE << CENTER; //The piece itself
+        for (RING2, 0..) |offset, bit| blockers |= @as(BitBoard, (idx >> bit) & 1) << (CENTER + offset);
+        entry.* = @intCast(Steps2(ONE << CENTER, blockers));
+    }
+    break :b table;
+};
+
+///////////////////////////////////////////////////////////////////////////
+
+/// Squares a speed 2 piece on `pos` can end its move on, two orthogonal steps around `blockers` (which hold the piece) and `pos` itself
+pub inline fn Reach2(pos: u7, blockers: BitBoard) BitBoard {
+    if (!USEPEXT) return Steps2(ONE << pos, blockers);
+    const shift = @as(i8, pos) - CENTER;
+    const window: u64 = @truncate(std.math.shr(BitBoard, blockers, shift));
+    return std.math.shl(BitBoard, reach2[NativePext(window, RING2MASK)], shift);
+}
+
+/// Two steps from `bit` onto squares not in `blockers`, ending back on `bit` allowed
+inline fn Steps2(bit: BitBoard, blockers: BitBoard) BitBoard {
+    return Plus(Plus(bit) & ~blockers) & ~blockers | bit;
+}
+
+//Thanks to: https://gist.github.com/Validark/a45d57c18f290031cd41126ef142fe3e
+inline fn NativePext(src: u64, mask: u64) u64 {
+    return asm ("pext %[mask], %[src], %[ret]"
+        : [ret] "=r" (-> u64),
+        : [src] "r" (src),
+          [mask] "r" (mask),
+    );
+}
+
+fn Plus(x: BitBoard) BitBoard {
+    return x | x << 1 | x << WIDTH | x >> 1 | x >> WIDTH;
+}
+
+fn Square(x: BitBoard) BitBoard {
+    const row = x | x << 1 | x >> 1;
+    return row | row << WIDTH | row >> WIDTH;
+}
+
+fn Footprints(comptime Shape: fn (BitBoard) BitBoard) [128]BitBoard {
+    @setEvalBranchQuota(10000);
+    var table: [128]BitBoard = undefined;
+    for (&table, 0..) |*entry, pos| entry.* = Shape(ONE << pos);
+    return table;
+}
+
+///////////////////////////////////////////////////////////////////////////
+
+test "Reach2 matches two masked steps" {
+    const PLAYABLE = comptime b: {
+        var bb: BitBoard = 0;
+        for (0..9) |x| for (0..9) |y| {
+            bb |= 1 << (WIDTH * y + x);
+        };
+        break :b bb;
+    };
+    var prng = std.Random.Xoroshiro128.init(23);
+    for (0..200) |_| {
+        const blockers = (prng.random().int(BitBoard) & prng.random().int(BitBoard) & PLAYABLE) | ~PLAYABLE;
+        for (0..9) |x| for (0..9) |y| {
+            const pos: u7 = @intCast(WIDTH * y + x);
+            const bit = ONE << pos;
+            const expected = Plus(Plus(bit) & ~(blockers | bit)) & ~(blockers | bit) | bit;
+            try AssertEql(expected, Reach2(pos, blockers | bit));
+        };
+    }
+}
+
+test "Footprints" {
+    try AssertEql(ONE << 12 | ONE << 22 | ONE << 23 | ONE << 24 | ONE << 34, plus[23]);
+    try AssertEql(ONE | ONE << 1 | ONE << 11 | ONE << 12, square[0] & 0xFFFFFF);
+    try AssertEql(9, @popCount(square[60]));
+}
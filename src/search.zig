@@ -0,0 +1,393 @@
+const std = @import("std");
+const Engine = @import("engine2.zig");
+const TT = @import("ttable.zig");
+const Stats = @import("stats.zig");
+const AssertEql = std.testing.expectEqual;
+
+const Board = Engine.Board;
+const FullMove = Engine.FullMove;
+const MoveKind = Engine.MoveKind;
+
+///////////////////////////////////////////////////////////////////////////
+
+const MAXDEPTH = 64;
+const WINSCORE: i32 = 1_000_000;
+const INF: i32 = WINSCORE + 1;
+const MATESCORE: i32 = WINSCORE - MAXDEPTH; //Scores past this are a king capture at a known ply
+const ASPIRATIONWINDOW = 50;
+const NODESPERTIMECHECK = 1024;
+const MAXSINGLEMOVES = Engine.MAXSINGLEMOVES;
+const MAXFULLMOVES = MAXSINGLEMOVES * MAXSINGLEMOVES;
+
+///////////////////////////////////////////////////////////////////////////
+
+pub const Limits = struct {
+    ns: u64, //Wall clock budget
+    nodes: u64 = 0, //0 for unlimited
+    depth: u8 = MAXDEPTH,
+    progress: ?*Progress = null, //Reported to and polled for a stop request while searching
+};
+
+/// Live state of a search for another thread to watch, mirrored by `zigwrap.SearchProgress`.
+/// Written with atomics by the searcher, the reader sees each field as a whole but not the fields as one snapshot.
+pub const Progress = extern struct {
+    move: u64 = 0, //Best move of the last finished depth
+    score: i32 = 0,
+    depth: u32 = 0,
+    nodes: u64 = 0, //Updated every `NODESPERTIMECHECK` nodes
+    stop: u32 = 0, //Set nonzero from any thread to end the search, it then returns its best move so far
+    done: u32 = 0,
+};
+
+pub const Result = extern struct {
+    move: u64 = 0, //Packed FullMove
+    score: i32 = 0, //From the perspective of the side to play
+    depth: u32 = 0, //Last fully searched depth
+    nodes: u64 = 0,
+    nps: u64 = 0,
+    ns: u64 = 0,
+};
+
+/// Iterative deepening with aspiration windows. Always returns a move if one exists.
+pub fn Search(allocator: std.mem.Allocator, board: Board, tt: *TT.TransTable, limits: Limits) !Result {
+    const timer = Stats.Start();
+    defer Stats.Stop(.search, timer);
+    var searcher = Searcher{
+        .timer = try std.time.Timer.start(),
+        .limits = limits,
+        .tt = tt,
+        .moves = std.ArrayList(u64).init(allocator),
+    };
+    defer searcher.moves.deinit();
+    tt.NewSearch();
+
+    var result = Result{};
+    var prevScore: i32 = 0;
+    var depth: u8 = 1;
+    while (depth <= limits.depth) : (depth += 1) {
+        var delta: i32 = ASPIRATIONWINDOW;
+        var alpha: i32 = if (depth > 1) prevScore - delta else -INF;
+        var beta: i32 = if (depth > 1) prevScore + delta else INF;
+        var iteration: RootResult = undefined;
+        while (true) {
+            iteration = try searcher.Root(board, depth, alpha, beta);
+            if (searcher.stopped) break;
+            if (iteration.score <= alpha and alpha > -INF) {
+                delta *= 4;
+                alpha = if (delta > WINSCORE) -INF else iteration.score - delta;
+            } else if (iteration.score >= beta and beta < INF) {
+                delta *= 4;
+                beta = if (delta > WINSCORE) INF else iteration.score + delta;
+            } else break;
+        }
+
+        //A partial first iteration still beats having no move
+        if (searcher.stopped and depth > 1) break;
+        if (iteration.move != 0) {
+            result.move = iteration.move;
+            result.score = iteration.score;
+            result.depth = if (searcher.stopped) 0 else depth;
+            if (limits.progress) |progress| {
+                @atomicStore(u64, &progress.move, result.move, .release);
+                @atomicStore(i32, &progress.score, result.score, .release);
+                @atomicStore(u32, &progress.depth, result.depth, .release);
+            }
+        }
+        if (searcher.stopped or iteration.move == 0) break;
+        prevScore = iteration.score;
+        if (@abs(prevScore) >= MATESCORE) break; //Forced result found
+    }
+
+    result.nodes = searcher.nodes;
+    Stats.Add(.nodes, searcher.nodes);
+    result.ns = searcher.timer.read();
+    result.nps = if (result.ns == 0) 0 else searcher.nodes * std.time.ns_per_s / result.ns;
+    if (limits.progress) |progress| {
+        @atomicStore(u64, &progress.nodes, result.nodes, .release);
+        @atomicStore(u32, &progress.done, 1, .release);
+    }
+    return result;
+}
+
+const RootResult = struct {
+    move: u64,
+    score: i32,
+};
+
+const Searcher = struct {
+    const Self = @This();
+
+    timer: std.time.Timer,
+    limits: Limits,
+    tt: *TT.TransTable,
+    moves: std.ArrayList(u64), //Move stack shared by every ply
+    nodes: u64 = 0,
+    stopped: bool = false,
+
+    fn CheckLimits(self: *Self) void {
+        if (self.limits.nodes != 0 and self.nodes >= self.limits.nodes) self.stopped = true;
+        if (self.nodes % NODESPERTIMECHECK != 0) return;
+        if (self.timer.read() >= self.limits.ns) self.stopped = true;
+        if (self.limits.progress) |progress| {
+            @atomicStore(u64, &progress.nodes, self.nodes, .release);
+            if (@atomicLoad(u32, &progress.stop, .acquire) != 0) self.stopped = true;
+        }
+    }
+
+    /// Indices into the move stack, which may be reallocated by deeper plies
+    const MoveRange = struct {
+        start: usize,
+        end: usize,
+    };
+
+    fn Slice(self: *Self, range: MoveRange) []u64 {
+        return self.moves.items[range.start..range.end];
+    }
+
+    /// Pushes all full moves for the side to play onto the move stack
+    fn GenMoves(self: *Self, board: *const Board) !MoveRange {
+        const start = self.moves.items.len;
+        try self.moves.ensureUnusedCapacity(MAXFULLMOVES);
+        const Locals = struct {
+            fn Push(stack: *std.ArrayList(u64), move: FullMove) void {
+                stack.appendAssumeCapacity(move.Pack());
+            }
+        };
+        switch (board.toPlay) {
+            inline 0, 1 => |color| _ = try board.StreamUniqueFullMoves(self.moves.allocator, color, &self.moves, Locals.Push),
+            else => unreachable,
+        }
+        return .{ .start = start, .end = self.moves.items.len };
+    }
+
+    /// Pushes the single moves for `color`, packed, onto the move stack
+    fn GenSingles(self: *Self, board: *const Board, color: u1) !MoveRange {
+        const start = self.moves.items.len;
+        try self.moves.ensureUnusedCapacity(MAXSINGLEMOVES);
+        const Locals = struct {
+            fn Push(stack: *std.ArrayList(u64), move: Engine.Move) void {
+                stack.appendAssumeCapacity(@as(u32, @bitCast(Engine.PackedMove.FromMove(move))));
+            }
+        };
+        switch (color) {
+            inline 0, 1 => |comp| try board.StreamAllSingleMoves(comp, &self.moves, Locals.Push),
+        }
+        return .{ .start = start, .end = self.moves.items.len };
+    }
+
+    fn PopMoves(self: *Self, range: MoveRange) void {
+        self.moves.shrinkRetainingCapacity(range.start);
+    }
+
+    fn Root(self: *Self, board: Board, depth: u8, _alpha: i32, beta: i32) !RootResult {
+        var alpha = _alpha;
+        const moves = try self.GenMoves(&board);
+        defer self.PopMoves(moves);
+        OrderMoves(self.Slice(moves), if (self.tt.Probe(board.hash)) |entry| entry.move else 0);
+
+        var best = RootResult{ .move = 0, .score = -INF };
+        for (moves.start..moves.end) |idx| {
+            const move = self.moves.items[idx];
+            var child = board;
+            child.ApplyFullMove(FullMove.Unpack(move));
+            const score = -try self.NegaMax(&child, depth - 1, 1, -beta, -alpha);
+            if (self.stopped and best.move != 0) break;
+            if (score > best.score) best = .{ .move = move, .score = score };
+            if (self.stopped) break;
+            alpha = @max(alpha, score);
+            if (alpha >= beta) break;
+        }
+        if (!self.stopped and best.move != 0) self.tt.Store(board.hash, best.move, ScoreToTT(best.score, 0), depth, BoundFor(best.score, _alpha, beta));
+        return best;
+    }
+
+    fn NegaMax(self: *Self, board: *const Board, depth: u8, ply: u8, _alpha: i32, _beta: i32) !i32 {
+        self.nodes += 1;
+        self.CheckLimits();
+        if (self.stopped) return 0;
+
+        if (board.IsTerminal()) return -WINSCORE + ply; //The side to play has lost its king
+        if (depth == 0) return StaticValue(board);
+
+        var alpha = _alpha;
+        var beta = _beta;
+        var ttMove: u64 = 0;
+        if (self.tt.Probe(board.hash)) |entry| {
+            ttMove = entry.move;
+            const score = ScoreFromTT(entry.score, ply);
+            if (entry.depth >= depth) switch (entry.bound) {
+                .exact => return score,
+                .lower => alpha = @max(alpha, score),
+                .upper => beta = @min(beta, score),
+                .none => {},
+            };
+            if (alpha >= beta) return score;
+        }
+        const windowAlpha = alpha; //The window actually searched, after any narrowing by the table
+
+        //Staged generation, second moves are only generated for first moves we get to, so a cutoff skips most of the work
+        const color: u1 = @intCast(board.toPlay);
+        const firsts = try self.GenSingles(board, color);
+        defer self.PopMoves(firsts);
+        OrderSingles(self.Slice(firsts), @truncate(ttMove));
+
+        var best: i32 = -INF;
+        var bestMove: u64 = 0;
+        outer: for (firsts.start..firsts.end) |fidx| {
+            const first: Engine.PackedMove = @bitCast(@as(u32, @truncate(self.moves.items[fidx])));
+            var mid = board.*;
+            mid.ApplyMove(first.ToMove());
+
+            const seconds = try self.GenSingles(&mid, color);
+            defer self.PopMoves(seconds);
+            OrderSingles(self.Slice(seconds), if (@as(u32, @truncate(ttMove)) == @as(u32, @bitCast(first))) @truncate(ttMove >> 32) else 0);
+
+            for (seconds.start..seconds.end) |sidx| {
+                const second: Engine.PackedMove = @bitCast(@as(u32, @truncate(self.moves.items[sidx])));
+                if (second.orig == first.dest) continue;
+                var child = mid;
+                child.ApplyMove(second.ToMove());
+                child.EndTurn();
+                const score = -try self.NegaMax(&child, depth - 1, ply + 1, -beta, -alpha);
+                if (self.stopped) return 0;
+                if (score > best) {
+                    best = score;
+                    bestMove = @as(u64, @as(u32, @bitCast(second))) << 32 | @as(u32, @bitCast(first));
+                }
+                alpha = @max(alpha, score);
+                if (alpha >= beta) break :outer;
+            }
+        }
+        if (bestMove == 0) return StaticValue(board); //No full move exists
+
+        self.tt.Store(board.hash, bestMove, ScoreToTT(best, ply), depth, BoundFor(best, windowAlpha, beta));
+        return best;
+    }
+};
+
+/// Mate scores count plies from the root, the table keeps them counted from the node so they hold wherever it is reached again
+fn ScoreToTT(score: i32, ply: u8) i32 {
+    if (score >= MATESCORE) return score + ply;
+    if (score <= -MATESCORE) return score - ply;
+    return score;
+}
+
+fn ScoreFromTT(score: i32, ply: u8) i32 {
+    if (score >= MATESCORE) return score - ply;
+    if (score <= -MATESCORE) return score + ply;
+    return score;
+}
+
+fn BoundFor(score: i32, alpha: i32, beta: i32) TT.Bound {
+    if (score <= alpha) return .upper;
+    if (score >= beta) return .lower;
+    return .exact;
+}
+
+///////////////////////////////////////////////////////////////////////////
+
+/// The board's incremental evaluation from the perspective of the side to play
+pub fn StaticValue(board: *const Board) i32 {
+    const value = board.Evaluate();
+    return if (board.toPlay == 0) value else -value;
+}
+
+const KINDORDER = b: {
+    var order: [8]u8 = undefined;
+    order[@intFromEnum(MoveKind.null)] = 0;
+    order[@intFromEnum(MoveKind.sacrifice)] = 1;
+    order[@intFromEnum(MoveKind.move)] = 2;
+    order[@intFromEnum(MoveKind.train)] = 3;
+    order[@intFromEnum(MoveKind.swap)] = 4;
+    order[@intFromEnum(MoveKind.attack)] = 5;
+    order[@intFromEnum(MoveKind.kingweaken)] = 6;
+    order[@intFromEnum(MoveKind.capture)] = 7;
+    break :b order;
+};
+
+/// Captures and attacks first, by the kinds of both halves
+fn OrderKey(move: u64) u8 {
+    return KINDORDER[@as(u3, @truncate(move))] + KINDORDER[@as(u3, @truncate(move >> 32))];
+}
+
+fn OrderSingles(moves: []u64, ttMove: u32) void {
+    const Locals = struct {
+        fn Before(_: void, a: u64, b: u64) bool {
+            return KINDORDER[@as(u3, @truncate(a))] > KINDORDER[@as(u3, @truncate(b))];
+        }
+    };
+    std.sort.pdq(u64, moves, {}, Locals.Before);
+    PromoteMove(moves, ttMove);
+}
+
+fn OrderMoves(moves: []u64, ttMove: u64) void {
+    const Locals = struct {
+        fn Before(_: void, a: u64, b: u64) bool {
+            return OrderKey(a) > OrderKey(b);
+        }
+    };
+    std.sort.pdq(u64, moves, {}, Locals.Before);
+    PromoteMove(moves, ttMove);
+}
+
+fn PromoteMove(moves: []u64, move: u64) void {
+    if (move == 0) return;
+    for (moves, 0..) |candidate, idx| if (candidate == move) {
+        std.mem.swap(u64, &moves[0], &moves[idx]);
+        return;
+    };
+}
+
+///////////////////////////////////////////////////////////////////////////
+
+test "Search finds a move within budget" {
+    var tt = TT.TransTable{};
+    try tt.Init(std.testing.allocator, 12);
+    defer tt.DeInit(std.testing.allocator);
+
+    const result = try Search(std.testing.allocator, Board.default, &tt, .{ .ns = 50 * std.time.ns_per_ms, .depth = 2 });
+    try std.testing.expect(result.move != 0);
+    try std.testing.expect(result.depth >= 1);
+    try AssertEql(0, StaticValue(&Board.default));
+}
+
+test "Mate scores are kept relative to the node" {
+    //Lost at ply 7 of a search and stored at ply 3 is a loss 4 plies below the node
+    const stored = ScoreToTT(-WINSCORE + 7, 3);
+    try AssertEql(-WINSCORE + 4, stored);
+    try AssertEql(-WINSCORE + 7, ScoreFromTT(stored, 3));
+    try AssertEql(WINSCORE - 6, ScoreFromTT(ScoreToTT(WINSCORE - 4, 0), 2));
+    try AssertEql(123, ScoreFromTT(ScoreToTT(123, 9), 4));
+
+    try AssertEql(TT.Bound.upper, BoundFor(10, 20, 40));
+    try AssertEql(TT.Bound.exact, BoundFor(30, 20, 40));
+    try AssertEql(TT.Bound.lower, BoundFor(40, 20, 40));
+}
+
+test "Node budget" {
+    var tt = TT.TransTable{};
+    const result = try Search(std.testing.allocator, Board.default, &tt, .{ .ns = std.time.ns_per_s, .nodes = 100 });
+    try std.testing.expect(result.move != 0);
+    try std.testing.expect(result.nodes <= 100);
+}
+
+test "Stop flag ends the search" {
+    var tt = TT.TransTable{};
+    try tt.Init(std.testing.allocator, 12);
+    defer tt.DeInit(std.testing.allocator);
+
+    var progress = Progress{};
+    const Stopper = struct {
+        fn Run(target: *Progress) void {
+            std.time.sleep(20 * std.time.ns_per_ms);
+            @atomicStore(u32, &target.stop, 1, .release);
+        }
+    };
+    const thread = try std.Thread.spawn(.{}, Stopper.Run, .{&progress});
+    const result = try Search(std.testing.allocator, Board.default, &tt, .{ .ns = 60 * std.time.ns_per_s, .progress = &progress });
+    thread.join();
+    try std.testing.expect(result.move != 0);
+    try std.testing.expect(result.ns < 10 * std.time.ns_per_s);
+    try AssertEql(1, progress.done);
+    try AssertEql(result.nodes, progress.nodes);
+}
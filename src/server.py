@@ -0,0 +1,305 @@
+"""Many engine2 games in one process, played over a local socket in JSON lines.
+
+    python src/server.py --unix /tmp/regalia.sock --workers 4 --queue 16
+    python src/server.py --port 7777
+
+Each request is one line like `{"id": 1, "op": "play", "game": 3, "move": 12345}` and gets one line back with the
+same `id`, `"ok": true` and the op's fields, or `"ok": false` and an `error`. Ops:
+
+    new      {init?, budgetMs?}       a game from an init string (default board if empty), with `budgetMs` of engine time
+    state    {game}                   init string, side to play, winner and turns so far
+    moves    {game}                   the side to play's full moves, one per resulting position
+    play     {game, move}             applies a packed full move
+    think    {game, player?, ms?}     engine move in at most `ms` of the game's budget, played unless `play` is false
+    close    {game}                   frees the game, archiving it first with `--archive`
+    stats    {}                       queue depth, busy workers and per game latencies
+
+Board ops run inline on the event loop. `think` goes to a pool of `--workers` processes through a queue of `--queue`
+waiting searches. When the queue is full it answers `busy` at once, rather than letting waits grow without bound.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import time
+from zigwrap import *
+from archive import GameArchive, StartOf
+from tournament import ParsePlayer, gPlayers
+
+DEFAULT_BUDGET_MS = 60_000
+DEFAULT_THINK_MS = 1000
+
+# Per worker process, set by `_InitWorker`
+gHandle = None
+
+def _InitWorker():
+    global gHandle
+    ZigInitAlloc2()
+    gHandle = ZigNewBoardHandle2()
+
+def Think(record: bytes, spec: str, ms: int, seed: int) -> tuple[int, float]:
+    """Runs player `spec` on a `ZigBoardStore` record in a worker. Returns the full move and the seconds it took."""
+    start = time.perf_counter()
+    ZigBoardLoad(gHandle, record)
+    name, opts = ParsePlayer(spec)
+    if name != 'random': opts['ms'] = ms
+    move = gPlayers[name](gHandle, seed, **opts)
+    return move, time.perf_counter() - start
+
+class Latency:
+    """Count, mean and max of a stream of durations"""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def Add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def AsDict(self) -> dict:
+        return {'count': self.count, 'meanMs': round(1000 * self.total / self.count, 3) if self.count else 0., 'maxMs': round(1000 * self.max, 3)}
+
+class Game:
+    """A board handle owned by the server with the moves played on it and its engine time left"""
+    def __init__(self, gameId: int, init: bytes, budgetMs: int):
+        self.id = gameId
+        self.handle = ZigNewBoardHandle2()
+        try: ZigInitBoardFromStr2(self.handle, init)
+        except ValueError:
+            ZigFreeBoardHandle2(self.handle)
+            raise
+        self.start = StartOf(self.handle)
+        self.moves = []
+        self.budgetMs = budgetMs
+        self.thinking = False
+        self.closed = False
+        self.ops = Latency() #Inline ops on this game
+        self.waits = Latency() #Time `think` spent queued for a worker
+        self.searches = Latency()
+
+    def Legal(self) -> set[int]:
+        buf = ZigGenFullMoves(self.handle)
+        return {first | second << 32 for first, second in zip(buf[::2], buf[1::2])}
+
+    def Play(self, move: int):
+        ZigBoardApplyFullMove(self.handle, move)
+        self.moves.append(move)
+
+    def State(self) -> dict:
+        return {
+            'init': StartOf(self.handle).decode(),
+            'toPlay': ZigBoardToPlay(self.handle),
+            'winner': ZigBoardWinVal(self.handle),
+            'turns': len(self.moves),
+            'budgetMs': self.budgetMs,
+            'thinking': self.thinking,
+        }
+
+    def Stats(self) -> dict:
+        return {'ops': self.ops.AsDict(), 'waits': self.waits.AsDict(), 'searches': self.searches.AsDict(), 'budgetMs': self.budgetMs}
+
+    def Free(self):
+        ZigFreeBoardHandle2(self.handle)
+        self.closed = True
+
+class GameServer:
+    def __init__(self, workers: int, queueSize: int, archive: str | None = None):
+        self.games = {}
+        self.nextGame = 1
+        self.archive = archive
+        #Spawned, as forked workers would hold on to the client sockets open at the time and keep them from closing
+        self.pool = concurrent.futures.ProcessPoolExecutor(workers, multiprocessing.get_context('spawn'), _InitWorker)
+        self.queue = asyncio.Queue(queueSize)
+        self.busy = 0
+        self.thinks = 0
+        self.rejected = 0
+        self.dispatchers = [asyncio.create_task(self._Dispatch()) for _ in range(workers)]
+        self.ops = {
+            'new': self.New,
+            'state': self.State,
+            'moves': self.Moves,
+            'play': self.Play,
+            'think': self.Think,
+            'close': self.Close,
+            'stats': self.Stats,
+        }
+
+    def Shutdown(self):
+        for task in self.dispatchers: task.cancel()
+        self.pool.shutdown(cancel_futures=True)
+        for game in list(self.games.values()): self._Drop(game)
+
+    async def Handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves one connection. Inline ops are answered in order, `think` replies whenever its search ends."""
+        pending = set()
+        try:
+            while line := await reader.readline():
+                if not line.strip(): continue
+                try: request = json.loads(line)
+                except json.JSONDecodeError as err:
+                    await self._Reply(writer, {'ok': False, 'error': f'bad json: {err}'})
+                    continue
+                if not isinstance(request, dict):
+                    await self._Reply(writer, {'ok': False, 'error': 'request is not a json object'})
+                    continue
+                if request.get('op') == 'think':
+                    task = asyncio.create_task(self._Answer(writer, request))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                else:
+                    await self._Answer(writer, request)
+        except ConnectionError:
+            pass
+        finally:
+            for task in pending: task.cancel()
+            writer.close()
+
+    async def _Answer(self, writer: asyncio.StreamWriter, request: dict):
+        reply = {'id': request.get('id')}
+        start = time.perf_counter()
+        game = None
+        try:
+            op = self.ops.get(request.get('op'))
+            if op is None: raise ValueError(f'unknown op `{request.get("op")}`')
+            if 'game' in request: game = self._Game(request['game'])
+            result = op(game, request)
+            reply |= await result if asyncio.iscoroutine(result) else result
+            reply['ok'] = True
+        except (ValueError, KeyError, TypeError) as err:
+            reply |= {'ok': False, 'error': str(err)}
+        if game is not None and request.get('op') != 'think': game.ops.Add(time.perf_counter() - start)
+        await self._Reply(writer, reply)
+
+    async def _Reply(self, writer: asyncio.StreamWriter, reply: dict):
+        writer.write(json.dumps(reply, separators=(',', ':')).encode() + b'\n')
+        await writer.drain() #Slow readers hold up their own connection, not the server
+
+    def _Game(self, gameId) -> Game:
+        game = self.games.get(gameId)
+        if game is None: raise ValueError(f'no game {gameId}')
+        return game
+
+    def New(self, _, request: dict) -> dict:
+        init = request.get('init', '')
+        if not isinstance(init, str) or not init.isascii(): raise ValueError('init must be an ascii string')
+        game = Game(self.nextGame, init.encode(), int(request.get('budgetMs', DEFAULT_BUDGET_MS)))
+        self.nextGame += 1
+        self.games[game.id] = game
+        return {'game': game.id} | game.State()
+
+    def State(self, game: Game, _) -> dict:
+        if game is None: raise ValueError('missing game')
+        return game.State()
+
+    def Moves(self, game: Game, _) -> dict:
+        if game is None: raise ValueError('missing game')
+        buf, counts = ZigGenUniqueFullMoves(game.handle)
+        return {'moves': [first | second << 32 for first, second in zip(buf[::2], buf[1::2])], 'raw': counts['raw']}
+
+    def Play(self, game: Game, request: dict) -> dict:
+        if game is None: raise ValueError('missing game')
+        if game.thinking: raise ValueError('engine is thinking')
+        move = int(request['move'])
+        if move not in game.Legal(): raise ValueError(f'illegal move {move}')
+        game.Play(move)
+        return game.State()
+
+    async def Think(self, game: Game, request: dict) -> dict:
+        if game is None: raise ValueError('missing game')
+        if game.thinking: raise ValueError('engine is already thinking')
+        spec = request.get('player', 'search')
+        if not isinstance(spec, str): raise ValueError('player must be a string')
+        ParsePlayer(spec)
+        ms = min(int(request.get('ms', DEFAULT_THINK_MS)), game.budgetMs)
+        if ms <= 0: raise ValueError('time budget used up')
+        future = asyncio.get_running_loop().create_future()
+        try: self.queue.put_nowait((game, spec, ms, time.perf_counter(), future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ValueError(f'busy, {self.queue.qsize()} searches queued')
+        game.thinking = True
+        try: move, seconds = await future
+        finally: game.thinking = False
+        game.budgetMs = max(0, game.budgetMs - round(1000 * seconds))
+        if game.closed: raise ValueError('game closed while thinking')
+        if move and request.get('play', True): game.Play(move)
+        return {'move': move, 'seconds': round(seconds, 4)} | game.State()
+
+    async def _Dispatch(self):
+        """Feeds queued searches to one worker process at a time, so at most `workers` run and the rest wait in the queue"""
+        loop = asyncio.get_running_loop()
+        while True:
+            game, spec, ms, queued, future = await self.queue.get()
+            game.waits.Add(time.perf_counter() - queued)
+            self.busy += 1
+            try:
+                if future.cancelled(): continue
+                if game.closed:
+                    future.set_exception(ValueError('game closed while queued'))
+                    continue
+                result = await loop.run_in_executor(self.pool, Think, ZigBoardStore(game.handle), spec, ms, len(game.moves))
+                game.searches.Add(result[1])
+                self.thinks += 1
+                if not future.done(): future.set_result(result)
+            except Exception as err:
+                if not future.done(): future.set_exception(ValueError(f'search failed: {err!r}'))
+            finally:
+                self.busy -= 1
+
+    def Close(self, game: Game, _) -> dict:
+        if game is None: raise ValueError('missing game')
+        self._Drop(game)
+        return {}
+
+    def _Drop(self, game: Game):
+        del self.games[game.id]
+        if self.archive and game.moves:
+            winVal = ZigBoardWinVal(game.handle)
+            with GameArchive(self.archive, writable=True) as archive:
+                archive.Append(game.start, game.moves, winVal, 'king' if winVal else 'nomoves' if not game.Legal() else 'unfinished')
+        game.Free()
+
+    def Stats(self, _, request: dict) -> dict:
+        return {
+            'games': len(self.games),
+            'queued': self.queue.qsize(),
+            'queueSize': self.queue.maxsize,
+            'busy': self.busy,
+            'thinks': self.thinks,
+            'rejected': self.rejected,
+            'perGame': {gameId: game.Stats() for gameId, game in self.games.items()},
+        }
+
+async def Serve(args):
+    server = GameServer(args.workers, args.queue, args.archive)
+    if args.unix:
+        if os.path.exists(args.unix): os.unlink(args.unix)
+        listener = await asyncio.start_unix_server(server.Handle, args.unix)
+    else:
+        listener = await asyncio.start_server(server.Handle, args.host, args.port)
+    print(f'serving on {", ".join(str(sock.getsockname()) for sock in listener.sockets)}', flush=True)
+    try:
+        async with listener: await listener.serve_forever()
+    finally:
+        server.Shutdown()
+        if args.unix and os.path.exists(args.unix): os.unlink(args.unix)
+
+def Main():
+    parser = argparse.ArgumentParser(description='Serve many engine2 games over a local socket')
+    parser.add_argument('--unix', help='unix socket path, instead of TCP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='engine processes, one search each at a time')
+    parser.add_argument('--queue', type=int, default=16, help='searches waiting for a worker before `think` answers busy')
+    parser.add_argument('--archive', help='game archive closed games are appended to')
+    args = parser.parse_args()
+    ZigInitAlloc2()
+    try: asyncio.run(Serve(args))
+    except KeyboardInterrupt: pass
+
+if __name__ == '__main__':
+    Main()
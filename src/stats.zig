@@ -0,0 +1,102 @@
+const std = @import("std");
+const AssertEql = std.testing.expectEqual;
+
+///////////////////////////////////////////////////////////////////////////
+
+/// Counting is off by default, the hot paths then only pay a load and a branch
+pub var gEnabled: bool = false;
+pub var gLogLevel: LogLevel = .warn;
+
+/// Engine counters and per phase timers, mirrored by `zigwrap.EngineStats`. Updated with relaxed atomics since searches run on many threads.
+pub const Stats = extern struct {
+    nodes: u64 = 0, //Search nodes
+    playouts: u64 = 0, //Random playouts, batched or from MCTS
+    applies: u64 = 0, //Single moves applied
+    moves: [4]u64 = .{ 0, 0, 0, 0 }, //Single moves generated by the moving piece, infantry, cavalry, artillary, king
+    ttProbes: u64 = 0, //Copied from the transposition table on read
+    ttHits: u64 = 0,
+    ns: [@typeInfo(Phase).@"enum".fields.len]u64 = [1]u64{0} ** @typeInfo(Phase).@"enum".fields.len,
+};
+
+pub var gStats: Stats = .{};
+
+pub const Counter = enum {
+    nodes,
+    playouts,
+    applies,
+};
+
+/// Timed phases, each the whole of one top level call
+pub const Phase = enum(u8) {
+    generate,
+    search,
+    mcts,
+    playout,
+    perft,
+};
+
+pub const LogLevel = enum(u8) {
+    off,
+    err,
+    warn,
+    info,
+    debug,
+};
+
+///////////////////////////////////////////////////////////////////////////
+
+pub inline fn Enabled() bool {
+    return @atomicLoad(bool, &gEnabled, .monotonic);
+}
+
+pub fn Reset() void {
+    gStats = .{};
+}
+
+pub fn Add(comptime counter: Counter, count: u64) void {
+    if (!Enabled()) return;
+    _ = @atomicRmw(u64, &@field(gStats, @tagName(counter)), .Add, count, .monotonic);
+}
+
+/// `kind` is the piece id without color or regalia, 0 infantry through 3 king
+pub fn AddMoves(kind: u2, count: u64) void {
+    if (!Enabled()) return;
+    _ = @atomicRmw(u64, &gStats.moves[kind], .Add, count, .monotonic);
+}
+
+/// Start of a timed phase, null while counting is off. Pair with `Stop`.
+pub fn Start() ?std.time.Instant {
+    if (!Enabled()) return null;
+    return std.time.Instant.now() catch null;
+}
+
+pub fn Stop(comptime phase: Phase, start: ?std.time.Instant) void {
+    const begin = start orelse return;
+    const now = std.time.Instant.now() catch return;
+    _ = @atomicRmw(u64, &gStats.ns[@intFromEnum(phase)], .Add, now.since(begin), .monotonic);
+}
+
+/// `std.debug.print` if `level` is at or below the runtime log level
+pub fn Log(comptime level: LogLevel, comptime format: []const u8, args: anytype) void {
+    if (@intFromEnum(level) > @intFromEnum(@atomicLoad(LogLevel, &gLogLevel, .monotonic))) return;
+    std.debug.print(format, args);
+}
+
+///////////////////////////////////////////////////////////////////////////
+
+test "Counting only while enabled" {
+    Reset();
+    defer Reset();
+    Add(.applies, 3);
+    try AssertEql(0, gStats.applies);
+
+    gEnabled = true;
+    defer gEnabled = false;
+    Add(.applies, 3);
+    AddMoves(1, 5);
+    const timer = Start();
+    Stop(.search, timer);
+    try AssertEql(3, gStats.applies);
+    try AssertEql(5, gStats.moves[1]);
+    try std.testing.expect(timer != null);
+}
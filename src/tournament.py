@@ -0,0 +1,172 @@
+"""Headless self-play between engine2 players over a process pool.
+
+    python src/tournament.py random mcts:ms=50 search:ms=50 --games 100 --workers 8 --out games.jsonl
+
+Every pairing of the given players plays `--games` games with colors alternating. Each game is one
+JSON line in `--out` and, with `--archive`, one game in a `GameArchive`. With `--book` both sides play
+book moves while the position is in the book. A W/D/L table with Elo estimates and the overall games/sec are printed at the end.
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import time
+from zigwrap import *
+from archive import GameArchive, RESULTS
+from book import OpeningBook
+
+# Per worker process, set by `_InitWorker`
+gHandle = None
+gBook = None
+
+def ParsePlayer(spec: str) -> tuple[str, dict]:
+    """`name` or `name:key=val,key=val` into the name and integer options"""
+    name, _, opts = spec.partition(':')
+    if name not in gPlayers: raise ValueError(f'Unknown player `{name}`, expected one of {", ".join(gPlayers)}')
+    return name, {key: int(val) for key, val in (opt.split('=') for opt in opts.split(',') if opt)}
+
+def RandomPlayer(handle, seed: int) -> int:
+    return ZigRandomFullMove(handle, seed)
+
+def MctsPlayer(handle, seed: int, ms: int = 100, threads: int = 1) -> int:
+    best, _ = ZigMCTS(handle, ms, threads, seed)
+    return best
+
+def SearchPlayer(handle, seed: int, ms: int = 100, nodes: int = 0) -> int:
+    return ZigSearch(handle, ms, nodes)['move']
+
+gPlayers = {
+    'random': RandomPlayer,
+    'mcts': MctsPlayer,
+    'search': SearchPlayer,
+}
+
+def _InitWorker(bookPath: str | None = None):
+    global gHandle, gBook
+    ZigInitAlloc2()
+    gHandle = ZigNewBoardHandle2()
+    gBook = OpeningBook.Open(bookPath) if bookPath else None
+
+def PlayGame(task: tuple) -> dict:
+    """Plays one game on this worker's board. Games without a move or past `maxTurns` are drawn"""
+    idx, white, black, seed, maxTurns = task
+    players = [ParsePlayer(white), ParsePlayer(black)]
+    start = time.perf_counter()
+    ZigInitBoardFromStr2(gHandle, b'')
+    moves = []
+    reason = 'turns'
+    while len(moves) < maxTurns:
+        if ZigBoardWinVal(gHandle) != 0:
+            reason = 'king'
+            break
+        name, opts = players[ZigBoardToPlay(gHandle)]
+        moveSeed = seed * 1_000_003 + len(moves)
+        move = gBook.PickFor(gHandle, random.Random(moveSeed)) if gBook is not None else 0
+        if not move: move = gPlayers[name](gHandle, moveSeed, **opts)
+        if move == 0:
+            reason = 'nomoves'
+            break
+        ZigBoardApplyFullMove(gHandle, move)
+        moves.append(move)
+    else:
+        if ZigBoardWinVal(gHandle) != 0: reason = 'king'
+    winVal = ZigBoardWinVal(gHandle)
+    return {
+        'game': idx,
+        'white': white,
+        'black': black,
+        'result': {1: '1-0', -1: '0-1', 0: '1/2-1/2'}[winVal],
+        'reason': reason,
+        'turns': len(moves),
+        'seconds': round(time.perf_counter() - start, 4),
+        'moves': moves,
+    }
+
+def EloDiff(score: float, games: int) -> float:
+    """Elo difference implied by a score fraction, clamped half a game from 0% and 100%"""
+    if games == 0: return 0.0
+    score = min(max(score, .5 / games), 1 - .5 / games)
+    return -400 * math.log10(1 / score - 1)
+
+def Summarize(records: list[dict], players: list[str]) -> dict:
+    """W/D/L and Elo per ordered pairing (first player's view) and the overall score per player"""
+    table = {}
+    for a, b in itertools.combinations(players, 2):
+        wins = draws = losses = 0
+        for rec in records:
+            if {rec['white'], rec['black']} != {a, b}: continue
+            if rec['result'] == '1/2-1/2': draws += 1
+            elif (rec['result'] == '1-0') == (rec['white'] == a): wins += 1
+            else: losses += 1
+        games = wins + draws + losses
+        score = (wins + draws / 2) / games if games else 0.0
+        table[f'{a} vs {b}'] = {'wins': wins, 'draws': draws, 'losses': losses, 'score': round(score, 4), 'elo': round(EloDiff(score, games), 1)}
+    overall = {}
+    for player in players:
+        games = [rec for rec in records if player in (rec['white'], rec['black'])]
+        points = sum(1 if rec['result'] == ('1-0' if rec['white'] == player else '0-1') else .5 if rec['result'] == '1/2-1/2' else 0 for rec in games)
+        overall[player] = {'games': len(games), 'score': round(points / len(games), 4) if games else 0.0}
+    return {'pairings': table, 'players': overall}
+
+def RunTournament(players: list[str], games: int, workers: int, maxTurns: int, seed: int, out: str | None,
+                  archive: str | None = None, book: str | None = None) -> dict:
+    for player in players: ParsePlayer(player)
+    tasks = []
+    for a, b in itertools.combinations(players, 2):
+        for game in range(games):
+            white, black = (a, b) if game % 2 == 0 else (b, a)
+            tasks.append((len(tasks), white, black, seed + len(tasks), maxTurns))
+
+    records = []
+    start = time.perf_counter()
+    outFile = open(out, 'w') if out else None
+    gameArchive = GameArchive(archive, writable=True) if archive else None
+    try:
+        with multiprocessing.Pool(workers, initializer=_InitWorker, initargs=(book,)) as pool:
+            for rec in pool.imap_unordered(PlayGame, tasks):
+                records.append(rec)
+                if outFile:
+                    outFile.write(json.dumps(rec, separators=(',', ':')) + '\n')
+                    outFile.flush()
+                if gameArchive is not None: gameArchive.Append(b'', rec['moves'], RESULTS[rec['result']], rec['reason'])
+    finally:
+        if outFile: outFile.close()
+        if gameArchive is not None: gameArchive.Close()
+    elapsed = time.perf_counter() - start
+
+    summary = Summarize(records, players)
+    summary['games'] = len(records)
+    summary['seconds'] = round(elapsed, 3)
+    summary['gamesPerSec'] = round(len(records) / elapsed, 3) if elapsed else 0.0
+    return summary
+
+def PrintSummary(summary: dict):
+    print(f'{"pairing":<40} {"W":>5} {"D":>5} {"L":>5} {"score":>7} {"elo":>7}')
+    for pairing, row in summary['pairings'].items():
+        print(f'{pairing:<40} {row["wins"]:>5} {row["draws"]:>5} {row["losses"]:>5} {row["score"]:>7.3f} {row["elo"]:>+7.1f}')
+    for player, row in summary['players'].items():
+        print(f'{player:<40} {row["games"]:>5} games, score {row["score"]:.3f}')
+    print(f'{summary["games"]} games in {summary["seconds"]}s, {summary["gamesPerSec"]} games/sec')
+
+def Main():
+    parser = argparse.ArgumentParser(description='Headless engine2 self-play tournament')
+    parser.add_argument('players', nargs='+', help=f'player specs like `mcts:ms=50,threads=1`, players are {", ".join(gPlayers)}')
+    parser.add_argument('--games', type=int, default=10, help='games per pairing, colors alternate')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--max-turns', type=int, default=200, help='games reaching this many turns are drawn')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='JSON lines file for the game records')
+    parser.add_argument('--archive', help='game archive the games are appended to')
+    parser.add_argument('--book', help='opening book both sides play from while they can')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args()
+    if len(args.players) < 2: parser.error('need at least two players')
+    if len(set(args.players)) != len(args.players): parser.error('players must be distinct specs')
+    summary = RunTournament(args.players, args.games, args.workers, args.max_turns, args.seed, args.out, args.archive, args.book)
+    if args.json: print(json.dumps(summary, indent=2))
+    else: PrintSummary(summary)
+
+if __name__ == '__main__':
+    Main()
@@ -0,0 +1,124 @@
+const std = @import("std");
+const AssertEql = std.testing.expectEqual;
+
+///////////////////////////////////////////////////////////////////////////
+
+pub const Bound = enum(u2) {
+    none = 0,
+    exact = 1,
+    lower = 2, //Failed high, score is at least this
+    upper = 3, //Failed low, score is at most this
+};
+
+pub const Entry = struct {
+    key: u64 = 0,
+    move: u64 = 0, //Packed FullMove
+    score: i32 = 0,
+    depth: u8 = 0,
+    bound: Bound = .none,
+    age: u8 = 0,
+};
+
+/// Two entries per bucket, one kept for the deepest search and one always replaced
+const Bucket = struct {
+    deep: Entry = .{},
+    recent: Entry = .{},
+};
+
+pub const Stats = extern struct {
+    probes: u64 = 0,
+    hits: u64 = 0,
+    stores: u64 = 0,
+    overwrites: u64 = 0, //Stores that evicted a different position
+    buckets: u64 = 0,
+};
+
+/// Largest `sizeLog2` the engine's `PyTTInit` takes, far past any real memory already
+pub const MAXSIZELOG2 = 32;
+
+pub const TransTable = struct {
+    const Self = @This();
+
+    buckets: []Bucket = &.{},
+    age: u8 = 0,
+    stats: Stats = .{},
+
+    /// Allocates `1 << sizeLog2` buckets, freeing any previous table. On failure the previous table is kept.
+    pub fn Init(self: *Self, allocator: std.mem.Allocator, sizeLog2: u6) !void {
+        const buckets = try allocator.alloc(Bucket, @as(usize, 1) << sizeLog2);
+        self.DeInit(allocator);
+        self.buckets = buckets;
+        self.Clear();
+    }
+
+    pub fn DeInit(self: *Self, allocator: std.mem.Allocator) void {
+        if (self.buckets.len != 0) allocator.free(self.buckets);
+        self.buckets = &.{};
+    }
+
+    pub fn Clear(self: *Self) void {
+        @memset(self.buckets, .{});
+        self.age = 0;
+        self.stats = .{ .buckets = self.buckets.len };
+    }
+
+    /// Call once per root search so entries from older searches lose their depth priority
+    pub fn NewSearch(self: *Self) void {
+        self.age +%= 1;
+    }
+
+    fn BucketFor(self: *Self, key: u64) *Bucket {
+        return &self.buckets[key & (self.buckets.len - 1)];
+    }
+
+    pub fn Probe(self: *Self, key: u64) ?Entry {
+        if (self.buckets.len == 0) return null;
+        self.stats.probes += 1;
+        const bucket = self.BucketFor(key);
+        if (bucket.deep.bound != .none and bucket.deep.key == key) {
+            self.stats.hits += 1;
+            return bucket.deep;
+        }
+        if (bucket.recent.bound != .none and bucket.recent.key == key) {
+            self.stats.hits += 1;
+            return bucket.recent;
+        }
+        return null;
+    }
+
+    pub fn Store(self: *Self, key: u64, move: u64, score: i32, depth: u8, bound: Bound) void {
+        if (self.buckets.len == 0) return;
+        self.stats.stores += 1;
+        const bucket = self.BucketFor(key);
+        const entry = Entry{ .key = key, .move = move, .score = score, .depth = depth, .bound = bound, .age = self.age };
+
+        const deep = &bucket.deep;
+        const replaceDeep = deep.bound == .none or deep.key == key or deep.age != self.age or depth >= deep.depth;
+        const slot = if (replaceDeep) deep else &bucket.recent;
+        if (slot.bound != .none and slot.key != key) self.stats.overwrites += 1;
+        slot.* = entry;
+    }
+};
+
+///////////////////////////////////////////////////////////////////////////
+
+test "Store and probe" {
+    var tt = TransTable{};
+    try tt.Init(std.testing.allocator, 4);
+    defer tt.DeInit(std.testing.allocator);
+
+    tt.Store(0x10, 7, 30, 3, .exact);
+    try AssertEql(30, tt.Probe(0x10).?.score);
+    try AssertEql(null, tt.Probe(0x20));
+
+    //Same bucket, shallower, goes to the always replace slot and keeps the deep one
+    tt.Store(0x110, 8, 5, 1, .lower);
+    try AssertEql(7, tt.Probe(0x10).?.move);
+    try AssertEql(8, tt.Probe(0x110).?.move);
+
+    //Deeper search takes the depth preferred slot
+    tt.Store(0x210, 9, 1, 4, .upper);
+    try AssertEql(9, tt.Probe(0x210).?.move);
+    try AssertEql(null, tt.Probe(0x10));
+    try AssertEql(1, tt.stats.overwrites);
+}
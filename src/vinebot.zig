@@ -9,20 +9,30 @@ const gWinValue = std.math.maxInt(isize);
 pub fn RootNegaMax(board: *Board, depth: usize, color: u1) isize {
     const ncolor: i2 = if (color == 1) -1 else 1;
     var bmove: [2]Engine.Move = undefined;
-    const eval = PrunedNegaMax(board, true, &bmove, depth, std.math.minInt(isize)+2, std.math.maxInt(isize)-2, ncolor) catch unreachable;
+
+    //One move buffer per ply for the whole search, freed together at the end
+    var arena = std.heap.ArenaAllocator.init(Engine.gAllocator);
+    defer arena.deinit();
+    const buffers = arena.allocator().alloc(DoubleMoveBuffer, depth) catch unreachable;
+    for (buffers) |*buffer| {
+        buffer.* = .{};
+        buffer.Init(arena.allocator()) catch unreachable;
+    }
+
+    const eval = PrunedNegaMax(board, true, &bmove, buffers, depth, std.math.minInt(isize)+2, std.math.maxInt(isize)-2, ncolor) catch unreachable;
     std.debug.print("Best move is {any}\n", .{bmove});
     return eval;
 }
 
-fn PrunedNegaMax(board: *Board, isroot: bool, bmove: *[2]Engine.Move, depth: usize, _alpha: isize, beta: isize, color: i2) !isize {
+/// `buffers[depth - 1]` is this ply's scratch move buffer
+fn PrunedNegaMax(board: *Board, isroot: bool, bmove: *[2]Engine.Move, buffers: []DoubleMoveBuffer, depth: usize, _alpha: isize, beta: isize, color: i2) !isize {
     if (depth == 0 or board.IsTerminal()) return color * StaticValue(board);
     var alpha = _alpha;
 
-    var buffer = DoubleMoveBuffer{};
-    try buffer.Init();
-    defer buffer.DeInit();
+    const buffer = &buffers[depth - 1];
+    buffer.Clear();
     
-    try board.GenerateAllColorMoves(&buffer, @intCast(color&1));
+    try board.GenerateAllColorMoves(buffer, @intCast(color&1));
     var value: isize = std.math.minInt(isize);
     
     for (buffer.GetBuffer()) |_move| {
@@ -31,7 +41,7 @@ fn PrunedNegaMax(board: *Board, isroot: bool, bmove: *[2]Engine.Move, depth: usi
         defer board.* = copy; 
         board.ApplyDoubleMove(_move);
         if (depth == 0) std.debug.panic("Depth is 0!\n", .{});
-        const eval = try PrunedNegaMax(board, false, bmove, depth - 1, -beta, -alpha, -color);
+        const eval = try PrunedNegaMax(board, false, bmove, buffers, depth - 1, -beta, -alpha, -color);
         value = @max(value, -eval);
         if (isroot and -eval == value) {
             bmove.* = _move;
@@ -16,3 +16,44 @@ cStr = ctypes.c_char_p
 
 void = None
 
+
+
+# Bit layouts of the packed move for each engine, low bits first: (field, bits)
+MOVE_LAYOUTS = {
+    'engine': (
+        ('kind', 3),
+        ('orig', 7),
+        ('dest', 7),
+        ('atkDir', 2),
+        ('doRet', 1),
+        ('capPiece', 2),
+        ('capReg', 1),
+        ('origLock', 4),
+        ('destLock', 4),),
+    'engine2': (
+        ('kind', 3),
+        ('orig', 7),
+        ('dest', 7),
+        ('atkdir', 2),
+        ('doRet', 1),),
+}
+
+# Names of engine2's move kinds by value
+MOVE_KINDS = ('null', 'move', 'attack', 'capture', 'train', 'swap', 'kingweaken', 'sacrifice')
+
+# Row stride of a square index for each engine
+BOARD_WIDTHS = {
+    'engine': 9,
+    'engine2': 11,
+}
+
+def _FieldTable(layout):
+    table = []
+    shift = 0
+    for name, bits in layout:
+        table.append((name, shift, (1 << bits) - 1))
+        shift += bits
+    return tuple(table)
+
+# (field, shift, mask) per engine, computed once
+MOVE_FIELDS = {engine: _FieldTable(layout) for engine, layout in MOVE_LAYOUTS.items()}
@@ -1,4 +1,10 @@
 import ctypes
+import copy
+import logging
+import os
+import sys
+import threading
+from array import array
 from zigtypes import *
 import typing
 
@@ -20,22 +26,493 @@ def AutoAnnot(func):
 
 PyPtr = u64
 
-parent = '\\'.join(__file__.split('\\')[:-2])
-_enginelib = ctypes.CDLL(f'{parent}\\engine.dll')
-_enginelib2 = ctypes.CDLL(f'{parent}\\engine2.dll')
+log = logging.getLogger(__name__)
 
-_enginelib2.PyGenMoves.argtypes = (PyPtr, u8)
-_enginelib2.PyGenMoves.restype = POINTER(u32)
+LIB_DIR = os.environ.get('REGALIA_LIBDIR', os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LIB_SUFFIX = {'win32': '.dll', 'darwin': '.dylib'}.get(sys.platform, '.so')
+
+class _LazyFunc:
+    """Stands in for a library function until its first call, keeping the signature assigned to it at import"""
+    def __init__(self, backend: '_Backend', name: str):
+        self.backend = backend
+        self.name = name
+        self.signature = {}
+        self.func = None #Bound ctypes function, set by `_Backend._Resolve`
+
+    def __setattr__(self, attr, val):
+        if attr in ('argtypes', 'restype', 'errcheck'): self.signature[attr] = val
+        else: object.__setattr__(self, attr, val)
+
+    def __call__(self, *args):
+        return (self.func or self.backend._Resolve(self))(*args)
+
+class _Backend:
+    """An engine library that is only loaded on the first call into it, so importing this module costs no library loads.
+    Each function is bound once, after which calls go straight to ctypes."""
+    def __init__(self, stem: str):
+        self._stem = stem
+        self._lib = None
+        self._lock = threading.RLock() #Reentrant for load hooks that call into the library
+        self._onLoad = []
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'): raise AttributeError(name)
+        func = self.__dict__[name] = _LazyFunc(self, name)
+        return func
+
+    @property
+    def path(self) -> str:
+        """`<stem>.dll` on Windows, `<stem>.so` or the `lib<stem>.so` zig names it by default elsewhere"""
+        names = [self._stem + LIB_SUFFIX]
+        if LIB_SUFFIX != '.dll': names.append('lib' + names[0])
+        paths = [os.path.join(LIB_DIR, name) for name in names]
+        return next((path for path in paths if os.path.exists(path)), paths[0])
+
+    @property
+    def loaded(self) -> bool:
+        return self._lib is not None
+
+    def OnLoad(self, hook):
+        """Registers `hook()` to run right after the library loads, a failing hook fails the load"""
+        self._onLoad.append(hook)
+        return hook
+
+    def Load(self) -> ctypes.CDLL:
+        with self._lock:
+            if self._lib is None:
+                log.debug('Loading %s', self.path)
+                self._lib = ctypes.CDLL(self.path)
+                try:
+                    for hook in self._onLoad: hook()
+                except:
+                    self._lib = None
+                    raise
+        return self._lib
+
+    def _Resolve(self, stub: _LazyFunc):
+        """Binds `stub` once, under the lock so racing first calls agree. Stubs kept from before still work through `stub.func`."""
+        with self._lock:
+            if stub.func is None:
+                func = getattr(self.Load(), stub.name)
+                for attr, val in stub.signature.items(): setattr(func, attr, val)
+                stub.func = func
+                self.__dict__[stub.name] = func
+        return stub.func
+
+BACKENDS = {
+    'engine': _Backend('engine'),
+    'engine2': _Backend('engine2'),
+}
+
+def Backend(name: str) -> _Backend:
+    """The registered engine library `name`, loaded on first use"""
+    return BACKENDS[name]
+
+_enginelib = Backend('engine')
+_enginelib2 = Backend('engine2')
+
+class EvalTerms(ctypes.Structure):
+    """Mirror of engine2's `EvalTerms`, each white minus black"""
+    _fields_ = [
+        ('material', i16),
+        ('regalia', i8),
+        ('locked', i8),
+        ('zones', i8 * 9),]
+
+class EvalBreakdown(ctypes.Structure):
+    """Mirror of engine2's `EvalBreakdown`, the weighted terms of `ZigEval`"""
+    _fields_ = [
+        ('material', i32),
+        ('regalia', i32),
+        ('zones', i32),
+        ('locked', i32),
+        ('total', i32),]
+
+class BoardState(ctypes.Structure):
+    """Mirror of engine2's extern `Board`. Each u128 bitboard is a (low, high) pair of u64, bit 11 * row + col."""
+    _fields_ = [
+        ('_pieces', (u64 * 2) * 16),
+        ('_lockright', u64 * 2),
+        ('_lockup', u64 * 2),
+        ('hash', u64),
+        ('toPlay', u8),
+        ('terms', EvalTerms),
+        ('mailbox', u8 * 121), #Piece index by square, 0xFF when empty
+        ('_pad', u8 * 15),]
+
+    @classmethod
+    def Map(cls, ptr: PyPtr) -> 'BoardState':
+        """Live view of the board behind a handle, no copy"""
+        return cls.from_address(ptr)
+
+    @staticmethod
+    def _Join(pair) -> int:
+        return pair[0] | pair[1] << 64
+
+    @property
+    def pieces(self) -> list[int]:
+        return [self._Join(pair) for pair in self._pieces]
+
+    @property
+    def lockright(self) -> int:
+        return self._Join(self._lockright)
+
+    @property
+    def lockup(self) -> int:
+        return self._Join(self._lockup)
+
+BOARD_LAYOUT_VERSION = 3
+
+_enginelib2.PyBoardLayoutVersion.argtypes = ()
+_enginelib2.PyBoardLayoutVersion.restype = u32
+_enginelib2.PyBoardSize.argtypes = ()
+_enginelib2.PyBoardSize.restype = u32
+@_enginelib2.OnLoad
+def _CheckBoardLayout():
+    if (_enginelib2.PyBoardLayoutVersion(), _enginelib2.PyBoardSize()) != (BOARD_LAYOUT_VERSION, ctypes.sizeof(BoardState)):
+        raise ImportError(f'engine2 board layout v{_enginelib2.PyBoardLayoutVersion()} ({_enginelib2.PyBoardSize()} bytes) does not match BoardState v{BOARD_LAYOUT_VERSION} ({ctypes.sizeof(BoardState)} bytes), rebuild the engine')
+
+_enginelib2.PyBoardEval.argtypes = (PyPtr,)
+_enginelib2.PyBoardEval.restype = i32
+def ZigEval(ptr: PyPtr) -> int:
+    """Static score for white from the incrementally kept terms, cheap enough for every frame"""
+    return _enginelib2.PyBoardEval(ptr)
+
+_enginelib2.PyBoardEvalBreakdown.argtypes = (PyPtr, PyPtr)
+_enginelib2.PyBoardEvalBreakdown.restype = void
+def ZigEvalBreakdown(ptr: PyPtr) -> dict:
+    """Weighted score of each term for white and their total"""
+    breakdown = EvalBreakdown()
+    _enginelib2.PyBoardEvalBreakdown(ptr, ctypes.addressof(breakdown))
+    return {name: getattr(breakdown, name) for name, _ in EvalBreakdown._fields_}
+
+_enginelib2.PyBoardStore.argtypes = (PyPtr, PyPtr)
+_enginelib2.PyBoardStore.restype = void
+def ZigBoardStore(ptr: PyPtr) -> bytes:
+    """The board as `sizeof(BoardState)` bytes"""
+    state = BoardState()
+    _enginelib2.PyBoardStore(ptr, ctypes.addressof(state))
+    return bytes(state)
+
+_enginelib2.PyBoardLoad.argtypes = (PyPtr, PyPtr)
+_enginelib2.PyBoardLoad.restype = u8
+def ZigBoardLoad(ptr: PyPtr, data, index: int = 0) -> None:
+    """Loads record `index` of a buffer of back to back `ZigBoardStore` records. The hash, eval terms and mailbox are recomputed.
+    Raises ValueError, leaving the board as it was, if the record's pieces, locks or side to play are broken"""
+    size = ctypes.sizeof(BoardState)
+    raw = memoryview(data).cast('B')
+    if (index + 1) * size > raw.nbytes: raise IndexError(f'record {index} is past the end of {raw.nbytes} bytes')
+    if raw.readonly: state = BoardState.from_buffer_copy(raw, index * size)
+    else: state = BoardState.from_buffer(raw, index * size)
+    if not _enginelib2.PyBoardLoad(ptr, ctypes.addressof(state)): raise ValueError(f'record {index} is not a valid board')
+
+_enginelib2.PyBoardToPlay.argtypes = (PyPtr,)
+_enginelib2.PyBoardToPlay.restype = u8
 #@AutoAnnot
-def ZigGenMoves(ptr: PyPtr, pos: u8) -> list[int]:
-    print("Calling GenMoves")
-    retptr = _enginelib2.PyGenMoves(ptr, pos)
-    res = []
-    for i in range(10_000):
-        if (retptr[i] >> 0 % (1 << 3)) == 0:
-            break
-        res.append([DecodeMove(retptr[i]), retptr[i]])
-    return res
+def ZigBoardToPlay(ptr: PyPtr) -> int:
+    return _enginelib2.PyBoardToPlay(ptr)
+
+_enginelib2.PyBoardHash.argtypes = (PyPtr,)
+_enginelib2.PyBoardHash.restype = u64
+#@AutoAnnot
+def ZigBoardHash(ptr: PyPtr) -> int:
+    return _enginelib2.PyBoardHash(ptr)
+
+class TTStats(ctypes.Structure):
+    _fields_ = [
+        ('probes', u64),
+        ('hits', u64),
+        ('stores', u64),
+        ('overwrites', u64),
+        ('buckets', u64),]
+
+_enginelib2.PyTTInit.argtypes = (u8,)
+_enginelib2.PyTTInit.restype = u8
+#@AutoAnnot
+def ZigTTInit(sizeLog2: int = 18) -> None:
+    """Allocates 1 << sizeLog2 buckets of two entries each, raising ValueError for sizes the engine refuses or cannot allocate"""
+    if not 0 <= sizeLog2 <= 0xFF or not _enginelib2.PyTTInit(sizeLog2): raise ValueError(f'cannot allocate a transposition table of 1 << {sizeLog2} buckets')
+
+_enginelib2.PyTTClear.argtypes = ()
+_enginelib2.PyTTClear.restype = void
+#@AutoAnnot
+def ZigTTClear() -> None:
+    _enginelib2.PyTTClear()
+
+_enginelib2.PyTTStats.argtypes = (PyPtr,)
+_enginelib2.PyTTStats.restype = void
+def ZigTTStats() -> dict:
+    stats = TTStats()
+    _enginelib2.PyTTStats(ctypes.addressof(stats))
+    return {name: getattr(stats, name) for name, _ in TTStats._fields_}
+
+PIECE_KINDS = ('infantry', 'cavalry', 'artillary', 'king')
+STAT_PHASES = ('generate', 'search', 'mcts', 'playout', 'perft')
+
+class EngineStats(ctypes.Structure):
+    """Mirror of engine2's `Stats.Stats`"""
+    _fields_ = [
+        ('nodes', u64),
+        ('playouts', u64),
+        ('applies', u64),
+        ('moves', u64 * len(PIECE_KINDS)),
+        ('ttProbes', u64),
+        ('ttHits', u64),
+        ('ns', u64 * len(STAT_PHASES)),]
+
+_enginelib2.PyStatsEnable.argtypes = (u8,)
+_enginelib2.PyStatsEnable.restype = void
+#@AutoAnnot
+def ZigStatsEnable(enabled: bool = True) -> None:
+    """Counting is off until enabled, it costs a little on every generated and applied move"""
+    _enginelib2.PyStatsEnable(enabled)
+
+_enginelib2.PyStatsReset.argtypes = ()
+_enginelib2.PyStatsReset.restype = void
+#@AutoAnnot
+def ZigStatsReset() -> None:
+    _enginelib2.PyStatsReset()
+
+_enginelib2.PyStatsRead.argtypes = (PyPtr,)
+_enginelib2.PyStatsRead.restype = void
+def ZigStats() -> dict:
+    """Counters since the last reset, with moves split by piece and time in ns split by phase"""
+    stats = EngineStats()
+    _enginelib2.PyStatsRead(ctypes.addressof(stats))
+    return {
+        'nodes': stats.nodes,
+        'playouts': stats.playouts,
+        'applies': stats.applies,
+        'moves': dict(zip(PIECE_KINDS, stats.moves)),
+        'ttProbes': stats.ttProbes,
+        'ttHits': stats.ttHits,
+        'ns': dict(zip(STAT_PHASES, stats.ns)),}
+
+_enginelib2.PySetLogLevel.argtypes = (u8,)
+_enginelib2.PySetLogLevel.restype = void
+#@AutoAnnot
+def ZigSetLogLevel(level: int) -> None:
+    """Sets what the engine prints from a `logging` level, so one setting covers both sides"""
+    if level >= logging.CRITICAL + 1: engineLevel = 0
+    elif level > logging.WARNING: engineLevel = 1
+    elif level > logging.INFO: engineLevel = 2
+    elif level > logging.DEBUG: engineLevel = 3
+    else: engineLevel = 4
+    _enginelib2.PySetLogLevel(engineLevel)
+
+class SearchResult(ctypes.Structure):
+    _fields_ = [
+        ('move', u64),
+        ('score', i32),
+        ('depth', u32),
+        ('nodes', u64),
+        ('nps', u64),
+        ('ns', u64),]
+
+_enginelib2.PySearch.argtypes = (PyPtr, u32, u64, PyPtr)
+_enginelib2.PySearch.restype = void
+def ZigSearch(ptr: PyPtr, ms: int, nodes: int = 0) -> dict:
+    """Iterative deepening search of the side to play within `ms` milliseconds (and `nodes` nodes if nonzero)"""
+    result = SearchResult()
+    _enginelib2.PySearch(ptr, ms, nodes, ctypes.addressof(result))
+    ret = {name: getattr(result, name) for name, _ in SearchResult._fields_}
+    ret['moves'] = (result.move & 0xFFFFFFFF, result.move >> 32)
+    return ret
+
+class SearchProgress(ctypes.Structure):
+    """Mirror of `search.Progress`. The search writes it from its own thread, set `stop` to end the search early."""
+    _fields_ = [
+        ('move', u64),
+        ('score', i32),
+        ('depth', u32),
+        ('nodes', u64),
+        ('stop', u32),
+        ('done', u32),]
+
+_enginelib2.PySearchEx.argtypes = (PyPtr, u32, u64, PyPtr, PyPtr)
+_enginelib2.PySearchEx.restype = void
+def ZigSearchEx(ptr: PyPtr, ms: int, progress: SearchProgress, nodes: int = 0) -> dict:
+    """`ZigSearch` reporting into `progress`. Blocks, but ctypes releases the GIL so other threads can watch and stop it."""
+    result = SearchResult()
+    _enginelib2.PySearchEx(ptr, ms, nodes, ctypes.addressof(progress), ctypes.addressof(result))
+    ret = {name: getattr(result, name) for name, _ in SearchResult._fields_}
+    ret['moves'] = (result.move & 0xFFFFFFFF, result.move >> 32)
+    return ret
+
+_enginelib2.PyMCTS.argtypes = (PyPtr, u32, u32, u64, PyPtr, PyPtr, u32)
+_enginelib2.PyMCTS.restype = u32
+def ZigMCTS(ptr: PyPtr, ms: int, threads: int = 0, seed: int = 0) -> tuple[int, list[tuple[int, int]]]:
+    """Root parallel MCTS of the side to play on `threads` threads (0 for one per core). Returns the most visited full move and every (move, visits)"""
+    cap = max(1, len(ZigGenUniqueFullMoves(ptr)[0]) // 2) #The root's children, so the timed search runs once
+    moves = (u64 * cap)()
+    visits = (u32 * cap)()
+    count = min(cap, _enginelib2.PyMCTS(ptr, ms, threads, seed, ctypes.addressof(moves), ctypes.addressof(visits), cap))
+    pairs = list(zip(moves[:count], visits[:count]))
+    best = max(pairs, key=lambda pair: pair[1])[0] if pairs else 0
+    return best, pairs
+
+class PlayoutStats(ctypes.Structure):
+    _fields_ = [
+        ('whiteWins', u64),
+        ('blackWins', u64),
+        ('undecided', u64),
+        ('turns', u64),]
+
+_enginelib2.PyBatchPlayouts.argtypes = (PyPtr, u64, u64, PyPtr)
+_enginelib2.PyBatchPlayouts.restype = void
+def ZigBatchPlayouts(ptr: PyPtr, n: int, seed: int = 0) -> dict:
+    """`n` uniformly random playouts from the board, games still going after 200 turns count as undecided"""
+    stats = PlayoutStats()
+    _enginelib2.PyBatchPlayouts(ptr, n, seed, ctypes.addressof(stats))
+    return {name: getattr(stats, name) for name, _ in PlayoutStats._fields_}
+
+_enginelib2.PyPerft.argtypes = (PyPtr, u32, u8)
+_enginelib2.PyPerft.restype = u64
+def ZigPerft(ptr: PyPtr, depth: int, full: bool = False) -> int:
+    """Leaf count `depth` plies below the board, a ply being a single move or with `full` a whole turn"""
+    return _enginelib2.PyPerft(ptr, depth, int(full))
+
+_enginelib2.PyPerftDivide.argtypes = (PyPtr, u32, u8, PyPtr, PyPtr, u32)
+_enginelib2.PyPerftDivide.restype = u32
+def ZigPerftDivide(ptr: PyPtr, depth: int, full: bool = False) -> list[tuple[int, int]]:
+    """(root move, perft below it) pairs, the moves packed like `ZigGenSingleMoves` or `ZigGenFullMoves` entries"""
+    probe = array('I', bytes(8)) #Only the returned count is wanted, so the divide runs once with room for every root move
+    cap = max(1, ZigGenFullMovesInto(ptr, probe) if full else ZigGenSingleMovesInto(ptr, probe))
+    moves = (u64 * cap)()
+    nodes = (u64 * cap)()
+    count = min(cap, _enginelib2.PyPerftDivide(ptr, depth, int(full), ctypes.addressof(moves), ctypes.addressof(nodes), cap))
+    return list(zip(moves[:count], nodes[:count]))
+
+def _U32Buffer(buf) -> ctypes.Array:
+    """Zero-copy ctypes view of a writable contiguous buffer (array('I'), NumPy uint32, memoryview...)"""
+    raw = memoryview(buf).cast('B')
+    return (u32 * (raw.nbytes // 4)).from_buffer(raw)
+
+def _MoveColor(ptr: PyPtr, color: int | None) -> int:
+    """`color`, or the side to play if None. The engine only generates for 0 and 1, a u8 would wrap anything else"""
+    if color is None: return ZigBoardToPlay(ptr)
+    if color not in (0, 1): raise ValueError(f'color must be 0 or 1, not {color!r}')
+    return color
+
+_enginelib2.PyGenSingleMovesInto.argtypes = (PyPtr, u8, PyPtr, u32)
+_enginelib2.PyGenSingleMovesInto.restype = u32
+#@AutoAnnot
+def ZigGenSingleMovesInto(ptr: PyPtr, buf, color: int | None = None) -> int:
+    """Writes every single move for `color` (default side to play) into `buf`. Returns the move count, which may exceed the buffer"""
+    color = _MoveColor(ptr, color)
+    view = _U32Buffer(buf)
+    return _enginelib2.PyGenSingleMovesInto(ptr, color, ctypes.addressof(view), len(view))
+
+_enginelib2.PyGenFullMovesInto.argtypes = (PyPtr, u8, PyPtr, u32)
+_enginelib2.PyGenFullMovesInto.restype = u32
+#@AutoAnnot
+def ZigGenFullMovesInto(ptr: PyPtr, buf, color: int | None = None) -> int:
+    """Writes every full move for `color` (default side to play) into `buf` as (first, second) pairs. Returns the full move count, which may exceed half the buffer"""
+    color = _MoveColor(ptr, color)
+    view = _U32Buffer(buf)
+    return _enginelib2.PyGenFullMovesInto(ptr, color, ctypes.addressof(view), len(view))
+
+def ZigGenSingleMoves(ptr: PyPtr, color: int | None = None) -> array:
+    buf = array('I', bytes(4 * 256))
+    count = ZigGenSingleMovesInto(ptr, buf, color)
+    if count > len(buf):
+        buf = array('I', bytes(4 * count))
+        ZigGenSingleMovesInto(ptr, buf, color)
+    del buf[count:]
+    return buf
+
+def ZigGenFullMoves(ptr: PyPtr, color: int | None = None) -> array:
+    buf = array('I', bytes(4 * 2 * 8192))
+    count = ZigGenFullMovesInto(ptr, buf, color)
+    if 2 * count > len(buf):
+        buf = array('I', bytes(4 * 2 * count))
+        ZigGenFullMovesInto(ptr, buf, color)
+    del buf[2 * count:]
+    return buf
+
+class DedupCounts(ctypes.Structure):
+    """Mirror of engine2's `DedupCounts`"""
+    _fields_ = [
+        ('raw', u64),
+        ('unique', u64),
+        ('commuting', u64),]
+
+_enginelib2.PyGenUniqueFullMovesInto.argtypes = (PyPtr, u8, PyPtr, u32, PyPtr)
+_enginelib2.PyGenUniqueFullMovesInto.restype = u32
+def ZigGenUniqueFullMovesInto(ptr: PyPtr, buf, color: int | None = None, counts: DedupCounts | None = None) -> int:
+    """`ZigGenFullMovesInto` with one full move per resulting position, filling `counts` if given"""
+    color = _MoveColor(ptr, color)
+    view = _U32Buffer(buf)
+    return _enginelib2.PyGenUniqueFullMovesInto(ptr, color, ctypes.addressof(view), len(view), ctypes.addressof(counts) if counts is not None else 0)
+
+def ZigGenUniqueFullMoves(ptr: PyPtr, color: int | None = None) -> tuple[array, dict[str, int]]:
+    """The unique full moves as (first, second) pairs, and the raw, unique and commuting counts"""
+    buf = array('I', bytes(4 * 2 * 8192))
+    counts = DedupCounts()
+    count = ZigGenUniqueFullMovesInto(ptr, buf, color, counts)
+    if 2 * count > len(buf):
+        buf = array('I', bytes(4 * 2 * count))
+        ZigGenUniqueFullMovesInto(ptr, buf, color, counts)
+    del buf[2 * count:]
+    return buf, {name: getattr(counts, name) for name, _ in DedupCounts._fields_}
+
+class BatchResult(ctypes.Structure):
+    """Mirror of engine2's `BatchResult`, `np.dtype(BatchResult)` gives the matching NumPy dtype"""
+    _fields_ = [
+        ('eval', i32),
+        ('fullMoves', u32),
+        ('winner', i8),
+        ('terminal', u8),
+        ('invalid', u8),
+        ('_pad', u8),]
+
+def _BoardRecords(boards) -> ctypes.Array:
+    """ctypes view of back to back `ZigBoardStore` records, only copied when the buffer is read only"""
+    raw = memoryview(boards).cast('B')
+    size = ctypes.sizeof(BoardState)
+    if raw.nbytes % size: raise ValueError(f'{raw.nbytes} bytes is not a whole number of {size} byte board records')
+    records = BoardState * (raw.nbytes // size)
+    return records.from_buffer_copy(raw) if raw.readonly else records.from_buffer(raw)
+
+def _View(buf, ctype, count: int, writable: bool = True) -> ctypes.Array:
+    """Zero-copy ctypes view of the first `count` items of a contiguous buffer. An input, not `writable`, is copied when read only."""
+    raw = memoryview(buf).cast('B')
+    if raw.nbytes < count * ctypes.sizeof(ctype): raise ValueError(f'buffer of {raw.nbytes} bytes is too small for {count} {ctype.__name__}')
+    if raw.readonly and not writable: return (ctype * count).from_buffer_copy(raw)
+    return (ctype * count).from_buffer(raw)
+
+_enginelib2.PyAnalyzeBatch.argtypes = (PyPtr, u64, PyPtr, u32)
+_enginelib2.PyAnalyzeBatch.restype = void
+def ZigAnalyzeBatchInto(boards, out, threads: int = 1) -> int:
+    """Fills `out` with a `BatchResult` for every board record in `boards`, in one engine call. Returns the board count.
+    Broken records get `invalid` set instead of raising, like `ZigBoardLoad` would. `threads` 1 runs on the calling thread, 0 uses one per core."""
+    records = _BoardRecords(boards)
+    view = _View(out, BatchResult, len(records))
+    _enginelib2.PyAnalyzeBatch(ctypes.addressof(records), len(records), ctypes.addressof(view), threads)
+    return len(records)
+
+def ZigAnalyzeBatch(boards, threads: int = 1) -> ctypes.Array:
+    out = (BatchResult * (memoryview(boards).nbytes // ctypes.sizeof(BoardState)))()
+    ZigAnalyzeBatchInto(boards, out, threads)
+    return out
+
+_enginelib2.PyBatchFullMoves.argtypes = (PyPtr, u64, PyPtr, PyPtr, u32)
+_enginelib2.PyBatchFullMoves.restype = void
+def ZigBatchFullMovesInto(boards, offsets, buf, threads: int = 1) -> None:
+    """Writes the full moves of every board record into `buf` as (first, second) u32 pairs, board `i` from pair `offsets[i]` to `offsets[i + 1]`.
+    `offsets` holds board count + 1 u64, the running sum of `BatchResult.fullMoves` from 0. Invalid records write no moves."""
+    records = _BoardRecords(boards)
+    bounds = _View(offsets, u64, len(records) + 1, writable=False)
+    moves = _View(buf, u32, 2 * bounds[len(records)])
+    _enginelib2.PyBatchFullMoves(ctypes.addressof(records), len(records), ctypes.addressof(bounds), ctypes.addressof(moves), threads)
+
+def ZigGenMoves(ptr: PyPtr, pos: int) -> list:
+    """Decoded single moves of the piece on `pos`, generated for its color only"""
+    state = BoardState()
+    _enginelib2.PyBoardStore(ptr, ctypes.addressof(state))
+    piece = state.mailbox[pos]
+    if piece == 0xFF: return [] #Empty square
+    return [[DecodeMove(move), move] for move in ZigGenSingleMoves(ptr, piece >> 3) if (move >> 3) % (1 << 7) == pos]
 
 _enginelib.PyGenAllMoves.argtypes = (PyPtr, u8)
 _enginelib.PyGenAllMoves.restype = POINTER(u64)
@@ -47,7 +524,7 @@ def ZigGenAllMoves(ptr: PyPtr, pos: u8) -> list[int]:
         item = retptr[i]
         if (item >> 0 % (1 << 3)) == 0:
             break
-        res.append([DecodeMove(item), item])
+        res.append([DecodeMove(item, 'engine'), item])
     return res
 
 
@@ -64,6 +541,36 @@ _enginelib2.PyNewBoardHandle.restype = PyPtr
 def ZigNewBoardHandle2() -> PyPtr:
     return int(_enginelib2.PyNewBoardHandle())
 
+_enginelib.PyFreeBoardHandle.argtypes = (PyPtr,)
+_enginelib.PyFreeBoardHandle.restype = void
+def ZigFreeBoardHandle(ptr: PyPtr) -> None:
+    _enginelib.PyFreeBoardHandle(ptr)
+
+_enginelib2.PyFreeBoardHandle.argtypes = (PyPtr,)
+_enginelib2.PyFreeBoardHandle.restype = void
+def ZigFreeBoardHandle2(ptr: PyPtr) -> None:
+    _enginelib2.PyFreeBoardHandle(ptr)
+
+_enginelib.PyCloneBoardHandle.argtypes = (PyPtr,)
+_enginelib.PyCloneBoardHandle.restype = PyPtr
+def ZigCloneBoardHandle(ptr: PyPtr) -> PyPtr:
+    return int(_enginelib.PyCloneBoardHandle(ptr))
+
+_enginelib2.PyCloneBoardHandle.argtypes = (PyPtr,)
+_enginelib2.PyCloneBoardHandle.restype = PyPtr
+def ZigCloneBoardHandle2(ptr: PyPtr) -> PyPtr:
+    return int(_enginelib2.PyCloneBoardHandle(ptr))
+
+_enginelib.PyCopyBoardInto.argtypes = (PyPtr, PyPtr)
+_enginelib.PyCopyBoardInto.restype = void
+def ZigCopyBoardInto(dst: PyPtr, src: PyPtr) -> None:
+    _enginelib.PyCopyBoardInto(dst, src)
+
+_enginelib2.PyCopyBoardInto.argtypes = (PyPtr, PyPtr)
+_enginelib2.PyCopyBoardInto.restype = void
+def ZigCopyBoardInto2(dst: PyPtr, src: PyPtr) -> None:
+    _enginelib2.PyCopyBoardInto(dst, src)
+
 _enginelib.PyInitAlloc.argtypes = ()
 _enginelib.PyInitAlloc.restype = void
 #@AutoAnnot
@@ -82,9 +589,11 @@ def ZigInitBoardFromStr(ptr: PyPtr, board: str) -> None:
     _enginelib.PyInitBoardFromStr(ptr, cStr(bytes(board)))
 
 _enginelib2.PyInitBoardFromStr.argtypes = (PyPtr, cStr)
-_enginelib2.PyInitBoardFromStr.restype = void
+_enginelib2.PyInitBoardFromStr.restype = u8
 def ZigInitBoardFromStr2(ptr: PyPtr, board: str) -> None:
-    _enginelib2.PyInitBoardFromStr(ptr, cStr(bytes(board)))
+    """Sets the board from a 162 character init string, `w` or `b` appended for the side to play, or the default board for an empty one.
+    Raises ValueError, leaving the board as it was, for any other length, a character out of place or a broken board such as a lock to an empty square."""
+    if not _enginelib2.PyInitBoardFromStr(ptr, cStr(bytes(board))): raise ValueError(f'invalid init string of {len(board)} characters')
 
 _enginelib.PyGenInitStr.argtypes = (PyPtr, PyPtr)
 _enginelib.PyGenInitStr.restype = void
@@ -107,6 +616,103 @@ _enginelib2.PyBoardApplyMove.restype = void
 def ZigBoardApplyMove(ptr, move) -> None:
     _enginelib2.PyBoardApplyMove(ptr, move)
 
+_enginelib2.PyBoardApplyFullMove.argtypes = (PyPtr, u64)
+_enginelib2.PyBoardApplyFullMove.restype = void
+#@AutoAnnot
+def ZigBoardApplyFullMove(ptr: PyPtr, move: int) -> None:
+    _enginelib2.PyBoardApplyFullMove(ptr, move)
+
+_enginelib2.PyBoardWinVal.argtypes = (PyPtr,)
+_enginelib2.PyBoardWinVal.restype = i8
+#@AutoAnnot
+def ZigBoardWinVal(ptr: PyPtr) -> int:
+    return _enginelib2.PyBoardWinVal(ptr)
+
+_enginelib2.PyRandomFullMove.argtypes = (PyPtr, u64)
+_enginelib2.PyRandomFullMove.restype = u64
+#@AutoAnnot
+def ZigRandomFullMove(ptr: PyPtr, seed: int) -> int:
+    """Uniformly random packed full move for the side to play, 0 if there is none"""
+    return _enginelib2.PyRandomFullMove(ptr, seed)
+
+def _Delta(buf: ctypes.Array, count: int) -> list[tuple[int, int, int]]:
+    return [(x & 0xFF, (x >> 8) & 0xFF, (x >> 16) & 0xF) for x in buf[:count]]
+
+_enginelib2.PyBoardApplyMoveDelta.argtypes = (PyPtr, u32, PyPtr)
+_enginelib2.PyBoardApplyMoveDelta.restype = u32
+def ZigBoardApplyMoveDelta(ptr: PyPtr, move: int, buf: ctypes.Array | None = None) -> list[tuple[int, int, int]]:
+    """Applies `move` and returns (pos, cell, locks) for every square it changed, coded like `ZigGenInitStr2` characters minus 'a' (cell 0x10 when empty)"""
+    if buf is None: buf = (u32 * 121)()
+    return _Delta(buf, _enginelib2.PyBoardApplyMoveDelta(ptr, move, ctypes.addressof(buf)))
+
+_enginelib2.PyNewHistory.argtypes = ()
+_enginelib2.PyNewHistory.restype = PyPtr
+def ZigNewHistory() -> PyPtr:
+    return int(_enginelib2.PyNewHistory())
+
+_enginelib2.PyFreeHistory.argtypes = (PyPtr,)
+_enginelib2.PyFreeHistory.restype = void
+def ZigFreeHistory(hist: PyPtr) -> None:
+    _enginelib2.PyFreeHistory(hist)
+
+_enginelib2.PyHistoryClear.argtypes = (PyPtr,)
+_enginelib2.PyHistoryClear.restype = void
+def ZigHistoryClear(hist: PyPtr) -> None:
+    _enginelib2.PyHistoryClear(hist)
+
+_enginelib2.PyHistoryPush.argtypes = (PyPtr, PyPtr, u32, u8, PyPtr)
+_enginelib2.PyHistoryPush.restype = u32
+def ZigHistoryPush(hist: PyPtr, ptr: PyPtr, move: int, endTurn: bool = False, buf: ctypes.Array | None = None) -> list[tuple[int, int, int]]:
+    """Applies and records `move`, returning its delta like `ZigBoardApplyMoveDelta`"""
+    if buf is None: buf = (u32 * 121)()
+    return _Delta(buf, _enginelib2.PyHistoryPush(hist, ptr, move, endTurn, ctypes.addressof(buf)))
+
+_enginelib2.PyHistoryPushFull.argtypes = (PyPtr, PyPtr, u64)
+_enginelib2.PyHistoryPushFull.restype = void
+def ZigHistoryPushFull(hist: PyPtr, ptr: PyPtr, move: int) -> None:
+    _enginelib2.PyHistoryPushFull(hist, ptr, move)
+
+_enginelib2.PyHistoryUndo.argtypes = (PyPtr, PyPtr, PyPtr)
+_enginelib2.PyHistoryUndo.restype = u32
+def ZigHistoryUndo(hist: PyPtr, ptr: PyPtr, buf: ctypes.Array | None = None) -> list[tuple[int, int, int]]:
+    """Takes back one ply, empty at the start of the game"""
+    if buf is None: buf = (u32 * 121)()
+    return _Delta(buf, _enginelib2.PyHistoryUndo(hist, ptr, ctypes.addressof(buf)))
+
+_enginelib2.PyHistoryRedo.argtypes = (PyPtr, PyPtr, PyPtr)
+_enginelib2.PyHistoryRedo.restype = u32
+def ZigHistoryRedo(hist: PyPtr, ptr: PyPtr, buf: ctypes.Array | None = None) -> list[tuple[int, int, int]]:
+    if buf is None: buf = (u32 * 121)()
+    return _Delta(buf, _enginelib2.PyHistoryRedo(hist, ptr, ctypes.addressof(buf)))
+
+_enginelib2.PyHistorySeek.argtypes = (PyPtr, PyPtr, u32, PyPtr)
+_enginelib2.PyHistorySeek.restype = u32
+def ZigHistorySeek(hist: PyPtr, ptr: PyPtr, ply: int, buf: ctypes.Array | None = None) -> list[tuple[int, int, int]]:
+    """Undoes or redoes to `ply` in one call, returning the net delta"""
+    if buf is None: buf = (u32 * 121)()
+    return _Delta(buf, _enginelib2.PyHistorySeek(hist, ptr, ply, ctypes.addressof(buf)))
+
+_enginelib2.PyHistoryPly.argtypes = (PyPtr,)
+_enginelib2.PyHistoryPly.restype = u32
+def ZigHistoryPly(hist: PyPtr) -> int:
+    return _enginelib2.PyHistoryPly(hist)
+
+_enginelib2.PyHistoryLen.argtypes = (PyPtr,)
+_enginelib2.PyHistoryLen.restype = u32
+def ZigHistoryLen(hist: PyPtr) -> int:
+    return _enginelib2.PyHistoryLen(hist)
+
+_enginelib2.PyHistoryMidTurn.argtypes = (PyPtr,)
+_enginelib2.PyHistoryMidTurn.restype = u8
+def ZigHistoryMidTurn(hist: PyPtr) -> bool:
+    """Whether the last applied ply is the first half of a turn"""
+    return bool(_enginelib2.PyHistoryMidTurn(hist))
+
+_enginelib2.PyHistoryMove.argtypes = (PyPtr, u32)
+_enginelib2.PyHistoryMove.restype = u32
+def ZigHistoryMove(hist: PyPtr, idx: int) -> int:
+    return _enginelib2.PyHistoryMove(hist, idx)
+
 _enginelib.PyPlayOutBoard.argtypes = (PyPtr,)
 _enginelib.PyPlayOutBoard.restype = i8
 #@AutoAnnot
@@ -119,33 +725,37 @@ _enginelib.PyCompMove.restype = u64
 def ZigCompMove(ptr) -> int:
     return _enginelib.PyCompMove(ptr)
 
-def DecodeMove(move: int) -> int:
-    ret = {}
-    args = {
-        'kind': 3,
-        'orig': 7,
-        'dest': 7,
-        'atkDir': 2,
-        'doRet': 1,
-        'capPiece': 2 ,
-        'capReg': 1,
-        'origLock': 4,
-        'destLock': 4,}
-    vs = list(args.values())
-    vs = [(list(args.keys())[i], sum(vs[:i]), sum(vs[:1+i])) for i in range(len(vs))]
-
-    for v, l, u in vs:
-        ret[v] = (move>>l) % (1<<(u-l))
-
-    # ret['orig'] = (move >> 1) % (1<<7)
-    # ret['dest'] = (move >> 9) % (1<<7)
-    # ret['doRet'] = (move >> 0) % (1<<1)
-    # ret['doCap'] = (move >> 8) % (1<<1)
-    # ret['doAtk'] = (move >> 16) % (1<<1)
-    # if ret['doAtk'] or ret['doCap']:
-    #     ret['atkDir'] = (move >> 17) % (1<<3)
-    return ret
+def DecodeMove(move: int, engine: str = 'engine2') -> dict:
+    return {name: (move >> shift) & mask for name, shift, mask in MOVE_FIELDS[engine]}
+
+def EncodeMove(fields: dict, engine: str = 'engine2') -> int:
+    return sum((fields.get(name, 0) & mask) << shift for name, shift, mask in MOVE_FIELDS[engine])
+
+
+ATTACK_KINDS = (2, 6) #Moves that lock onto an edge of their destination rather than just landing on it
+EDGE_STEPS = ((1, 0), (0, 1), (-1, 0), (0, -1)) #Half cell offset of each attack direction
 
+def MoveTarget(fields: dict) -> tuple[int, int]:
+    """Where a move is clicked in half cells: (2 * col, 2 * row) for a cell, one off along an axis for an edge"""
+    row, col = divmod(fields['dest'], 11)
+    if fields['kind'] not in ATTACK_KINDS: return 2*col, 2*row
+    dx, dy = EDGE_STEPS[fields['atkdir']]
+    return 2*col + dx, 2*row + dy
+
+class MoveIndex:
+    """Legal single moves of the next ply from one engine call, keyed by origin square and by (origin, `MoveTarget`)"""
+    def __init__(self, board: 'Board'):
+        self.byOrig = {} #orig -> [(target, fields, move)]
+        self.byTarget = {} #(orig, target) -> move, the first generated when several share a target
+        blocked = None #The piece that moved this turn cannot move again
+        if ZigHistoryMidTurn(board.history):
+            blocked = DecodeMove(ZigHistoryMove(board.history, ZigHistoryPly(board.history) - 1))['dest']
+        for move in ZigGenSingleMoves(board.handle):
+            fields = DecodeMove(move)
+            if fields['orig'] == blocked: continue
+            target = MoveTarget(fields)
+            self.byOrig.setdefault(fields['orig'], []).append((target, fields, move))
+            self.byTarget.setdefault((fields['orig'], target), move)
 
 class Board:
     class Cell:
@@ -161,13 +771,68 @@ class Board:
             self.regalia = False
             self.comLocks = 0
             self.color = self.WHITE
+        EMPTY = 0x10 #Cell code of an empty square in a move delta
+
+        def SetCode(self, code: int):
+            if code == self.EMPTY:
+                self.piece = self.NONE
+                self.regalia = False
+                self.color = self.WHITE
+                return
+            self.piece = code % 4
+            self.color = code & 4 != 0
+            self.regalia = code & 8 != 0
+
     def __init__(self):
         self.body = [[self.Cell() for i in range(9)] for j in range(9)]
         self.handle = None
+        self.history = None #Engine move history, made with the handle
+        self._moveIndex = None
+        #Render structures, rebuilt by `RegenRender` and patched in place by `ApplyMove`
+        self.pieces = []
+        self.deco = []
+        self.board = {}
+        self._pieceAt = {}
+        self._decoAt = {}
+        self._deltaBuf = (u32 * 121)()
         
     def AddNewHandle(self):
         self.handle = ZigNewBoardHandle2()
-        pass
+        self.history = ZigNewHistory()
+
+    def __enter__(self):
+        if self.handle is None: self.AddNewHandle()
+        return self
+
+    def __exit__(self, *exc):
+        self.Free()
+
+    def Free(self):
+        """Returns the engine handle to the pool, the board has no handle afterwards"""
+        if self.handle is None: return
+        ZigFreeBoardHandle2(self.handle)
+        ZigFreeHistory(self.history)
+        self.handle = None
+        self.history = None
+
+    def Clone(self) -> 'Board':
+        """Independent copy with its own handle, an empty history and its own render structures, free it with `Free` or a `with` block"""
+        other = Board()
+        other.body = copy.deepcopy(self.body)
+        if self.handle is not None:
+            other.handle = ZigCloneBoardHandle2(self.handle)
+            other.history = ZigNewHistory()
+        other.RegenRender()
+        return other
+
+    def CopyFrom(self, other: 'Board'):
+        """Overwrites this board with `other` in place, reusing this board's handle. The history is cleared and the render structures rebuilt."""
+        if self.handle is None: self.AddNewHandle()
+        ZigCopyBoardInto2(self.handle, other.handle)
+        ZigHistoryClear(self.history)
+        self.body = copy.deepcopy(other.body)
+        self._moveIndex = None
+        self.RegenRender()
 
 
     def FromInitStr(self, initstr: str):
@@ -176,13 +841,59 @@ class Board:
         
     def PullState(self):
         initstr = ZigGenInitStr2(self.handle)
-        print(initstr)
+        log.debug('Pulled state %s', initstr)
         self.LocFromInitStr(initstr)
 
     def ApplyMove(self, move):
-        print(f'Apply move {move}')
-        ZigBoardApplyMove(self.handle, move)
-        #self.PullState() #Theoretically not needed
+        """Applies `move` in the engine, records it in the history and patches the cells and render structures of the squares it changed.
+        The turn is handed over after its second move."""
+        log.debug('Apply move %s', move)
+        endTurn = ZigHistoryMidTurn(self.history)
+        self._PatchDelta(ZigHistoryPush(self.history, self.handle, move, endTurn, self._deltaBuf))
+
+    def ApplyFullMove(self, move: int):
+        """Both halves of a packed full move, handing the turn over after the second"""
+        self._PatchDelta(ZigHistoryPush(self.history, self.handle, move & 0xFFFFFFFF, False, self._deltaBuf))
+        self._PatchDelta(ZigHistoryPush(self.history, self.handle, move >> 32, True, self._deltaBuf))
+
+    def Undo(self):
+        """Takes back the last move, nothing at the start of the history"""
+        self._PatchDelta(ZigHistoryUndo(self.history, self.handle, self._deltaBuf))
+
+    def Redo(self):
+        self._PatchDelta(ZigHistoryRedo(self.history, self.handle, self._deltaBuf))
+
+    def Seek(self, ply: int):
+        """Jumps to `ply` moves into the history, stepping through the moves in between rather than replaying from the start"""
+        self._PatchDelta(ZigHistorySeek(self.history, self.handle, ply, self._deltaBuf))
+
+    @property
+    def moveIndex(self) -> MoveIndex:
+        """Legal moves of the next ply, built on first use and dropped whenever the board changes"""
+        if self._moveIndex is None: self._moveIndex = MoveIndex(self)
+        return self._moveIndex
+
+    @property
+    def pieceAt(self) -> dict:
+        """Render entry of the piece on each square, kept in step with `pieces`"""
+        return self._pieceAt
+
+    @property
+    def ply(self) -> int:
+        return ZigHistoryPly(self.history)
+
+    @property
+    def plies(self) -> int:
+        return ZigHistoryLen(self.history)
+
+    def _PatchDelta(self, delta: list[tuple[int, int, int]]):
+        self._moveIndex = None
+        for pos, code, locks in delta:
+            row, col = divmod(pos, 11)
+            cCell = self.body[row][col]
+            cCell.SetCode(code)
+            cCell.comLocks = locks
+            self._RenderCell(col, row)
 
     def LocFromInitStr(self, initstr: str):
         self.body = [[self.Cell() for i in range(9)] for j in range(9)]
@@ -202,22 +913,38 @@ class Board:
             cCell.comLocks = bv
 
     def RegenRender(self):
-        pieces = []
-        deco = []
-        board = {}
+        self.pieces.clear()
+        self.deco.clear()
+        self.board.clear()
+        self._pieceAt.clear()
+        self._decoAt.clear()
         for col in range(9):
             for row in range(9):
-                cCell = self.body[row][col]
-                if cCell.piece != cCell.NONE:
-                    color = 'wb'[cCell.color]
-                    kind = 'icak'[cCell.piece]
-                    pos = (col, row)
-                    pieces.append([color+kind, pos, cCell.regalia])
-                    board[pos] = color+kind
-                    coml = cCell.comLocks
-                    for i, e in enumerate([1, 2]):
-                        if e & coml:
-                            off = [(1, 0), (0, 1), (-1, 0), (0, -1)][i]
-                            cs = ['vl', 'hl'][i % 2]
-                            deco.append((cs, (col + off[0]/2, row + off[1]/2)))
-        return pieces, deco, board
+                self._RenderCell(col, row)
+        return self.pieces, self.deco, self.board
+
+    def _RenderCell(self, col: int, row: int):
+        """Replaces the render entries of one square, each lock is drawn by the square on its left or bottom"""
+        pos = (col, row)
+        if pos in self._pieceAt:
+            self.pieces.remove(self._pieceAt.pop(pos))
+            del self.board[pos]
+        for entry in self._decoAt.pop(pos, ()):
+            self.deco.remove(entry)
+        cCell = self.body[row][col]
+        if cCell.piece == cCell.NONE: return
+        color = 'wb'[cCell.color]
+        kind = 'icak'[cCell.piece]
+        piece = [color+kind, pos, cCell.regalia]
+        self.pieces.append(piece)
+        self._pieceAt[pos] = piece
+        self.board[pos] = color+kind
+        coml = cCell.comLocks
+        decos = []
+        for i, e in enumerate([1, 2]):
+            if e & coml:
+                off = [(1, 0), (0, 1), (-1, 0), (0, -1)][i]
+                cs = ['vl', 'hl'][i % 2]
+                decos.append((cs, (col + off[0]/2, row + off[1]/2)))
+        self.deco.extend(decos)
+        if decos: self._decoAt[pos] = decos